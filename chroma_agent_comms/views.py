@@ -5,11 +5,15 @@
 
 import Queue
 import json
+import re
 import traceback
 import time
+import zlib
 
 from django.db import transaction
 from django.http import HttpResponseNotAllowed, HttpResponse, HttpResponseBadRequest
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 from functools import wraps
@@ -43,6 +47,20 @@ def log_exception(f):
     return wrapped
 
 
+_accepts_gzip_re = re.compile(r"\bgzip\b")
+
+
+def _accepts_gzip(request):
+    return bool(_accepts_gzip_re.search(request.META.get("HTTP_ACCEPT_ENCODING", "")))
+
+
+def _request_body(request):
+    """The request body, inflated if the agent sent it gzipped"""
+    if request.META.get("HTTP_CONTENT_ENCODING") == "gzip":
+        return zlib.decompress(request.body, 16 + zlib.MAX_WBITS)
+    return request.body
+
+
 class ValidatedClientView(View):
     @classmethod
     def valid_fqdn(cls, request):
@@ -165,7 +183,10 @@ class MessageView(ValidatedClientView):
         Handle a POST containing messages from the agent
         """
 
-        body = json.loads(request.body)
+        try:
+            body = json.loads(_request_body(request))
+        except zlib.error:
+            return HttpResponseBadRequest("Invalid gzip body")
         fqdn = self.valid_fqdn(request)
         if not fqdn:
             return HttpForbidden()
@@ -236,7 +257,7 @@ class MessageView(ValidatedClientView):
 
         return HttpResponse()
 
-    def _filter_valid_messages(self, fqdn, messages):
+    def _message_validator(self, fqdn):
         plugin_to_session_id = {}
 
         def is_valid(message):
@@ -256,7 +277,20 @@ class MessageView(ValidatedClientView):
 
             return True
 
-        return [m for m in messages if is_valid(m)]
+        return is_valid
+
+    def _messages_response(self, request, encoded_messages):
+        """Respond with messages already serialized by json.dumps, gzipped if the agent accepts it"""
+        content = '{"messages": [%s]}' % ", ".join(encoded_messages)
+
+        response = HttpResponse(content_type="application/json")
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if len(content) >= settings.AGENT_MESSAGE_GZIP_MIN_BYTES and _accepts_gzip(request):
+            content = compress_string(content)
+            response["Content-Encoding"] = "gzip"
+        response.content = content
+
+        return response
 
     @log_exception
     def get(self, request):
@@ -298,6 +332,12 @@ class MessageView(ValidatedClientView):
 
         log.debug("MessageView.get: composing messages for %s" % fqdn)
         queues = self.queues.get(fqdn)
+        is_valid = self._message_validator(fqdn)
+
+        # Messages are serialized as they are taken from the queue, so that the response
+        # can be capped by size without encoding anything twice.
+        encoded_messages = [json.dumps(m) for m in messages if is_valid(m)]
+        encoded_size = sum(len(m) for m in encoded_messages)
 
         # If this handler is sitting on the TX queue, draining messages, then
         # when a new session starts, *before* sending any TX messages, we have to
@@ -305,40 +345,40 @@ class MessageView(ValidatedClientView):
         # to an 'old' session (old session meaning TCP connection from a now-dead agent)
 
         with queues.tx_lock:
-            try:
-                first_message = queues.tx.get(block=True, timeout=self.LONG_POLL_TIMEOUT)
-                if first_message["type"] == "TX_BARRIER":
-                    if first_message["client_start_time"] != request.GET["client_start_time"]:
+            # Wait for the first message, then take whatever else is queued up to the
+            # count and size caps.  A message that would overflow the size cap is held
+            # back for the next GET, unless it is the only one (it has to go sometime).
+            block = True
+            while len(encoded_messages) < settings.AGENT_MESSAGE_BATCH_MAX_COUNT:
+                try:
+                    message = queues.get(block=block, timeout=self.LONG_POLL_TIMEOUT)
+                except Queue.Empty:
+                    break
+                block = False
+
+                if message["type"] == "TX_BARRIER":
+                    if message["client_start_time"] != request.GET["client_start_time"]:
                         log.warning(
                             "Cancelling GET due to barrier %s %s"
-                            % (first_message["client_start_time"], request.GET["client_start_time"])
+                            % (message["client_start_time"], request.GET["client_start_time"])
                         )
-                        return HttpResponse(json.dumps({"messages": []}), content_type="application/json")
-                else:
-                    messages.append(first_message)
-            except Queue.Empty:
-                pass
-            else:
-                # TODO: limit number of messages per response
-                while True:
-                    try:
-                        message = queues.tx.get(block=False)
-                        if message["type"] == "TX_BARRIER":
-                            if message["client_start_time"] != request.GET["client_start_time"]:
-                                log.warning(
-                                    "Cancelling GET due to barrier %s %s"
-                                    % (message["client_start_time"], request.GET["client_start_time"])
-                                )
-                                return HttpResponse(json.dumps({"messages": []}), content_type="application/json")
-                        else:
-                            messages.append(message)
-                    except Queue.Empty:
-                        break
-
-        messages = self._filter_valid_messages(fqdn, messages)
-
-        log.debug("MessageView.get: responding to %s with %s messages (%s)" % (fqdn, len(messages), client_start_time))
-        return HttpResponse(json.dumps({"messages": messages}), content_type="application/json")
+                        return self._messages_response(request, [])
+                    continue
+
+                if not is_valid(message):
+                    continue
+
+                encoded_message = json.dumps(message)
+                if encoded_messages and encoded_size + len(encoded_message) > settings.AGENT_MESSAGE_BATCH_MAX_BYTES:
+                    queues.hold(message)
+                    break
+                encoded_messages.append(encoded_message)
+                encoded_size += len(encoded_message)
+
+        log.debug(
+            "MessageView.get: responding to %s with %s messages (%s)" % (fqdn, len(encoded_messages), client_start_time)
+        )
+        return self._messages_response(request, encoded_messages)
 
 
 def validate_token(key, credits=1):
@@ -74,7 +74,12 @@ class CommandResource(ChromaModelResource):
     def dehydrate_logs(self, bundle):
         command = bundle.obj
         return "\n".join(
-            [stepresult.log for stepresult in StepResult.objects.filter(job__command=command).order_by("modified_at")]
+            [
+                stepresult.assembled("log")
+                for stepresult in StepResult.objects.filter(job__command=command)
+                .prefetch_related("chunks")
+                .order_by("modified_at")
+            ]
         )
 
     class Meta:
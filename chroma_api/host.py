@@ -3,8 +3,10 @@
 # license that can be found in the LICENSE file.
 
 import re
+import threading
 from collections import defaultdict
 from collections import namedtuple
+from collections import OrderedDict
 from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
 from chroma_core.services import log_register
 from tastypie.validation import Validation
@@ -420,11 +422,53 @@ class HostTestResource(Resource, BulkResourceOperation):
         self._bulk_operation(_test_host_contact, "command", bundle, bundle.request, **kwargs)
 
 
+class ProfileValidationCache(object):
+    """
+    Outcomes of server profile validation tests, keyed by the test and the JSON properties of
+    the host it was evaluated for.
+
+    safe_eval substitutes the properties into the text of a test before parsing it, so a test
+    cannot be compiled once for all hosts and give the same answers.  Hosts reporting the same
+    properties (usually most of them) share an outcome instead, and changing either the test
+    or the properties changes the key.
+    """
+
+    MAX_SIZE = 4096
+
+    def __init__(self):
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def evaluate(self, test, properties_json, properties):
+        """:return: (pass, error) for test against properties, which are properties_json decoded"""
+        key = (test, properties_json)
+
+        with self._lock:
+            result = self._results.pop(key, None)
+            if result is not None:
+                self._results[key] = result
+                return result
+
+        try:
+            result = (bool(safe_eval(test, properties)), "")
+        except Exception as error:
+            result = (False, str(error))
+
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.MAX_SIZE:
+                self._results.popitem(last=False)
+
+        return result
+
+
 class HostProfileResource(Resource, BulkResourceOperation):
     """
     Get and set profiles associated with hosts.
     """
 
+    validation_cache = ProfileValidationCache()
+
     class Meta:
         list_allowed_methods = ["get", "post"]
         detail_allowed_methods = ["get", "put"]
@@ -453,37 +497,34 @@ class HostProfileResource(Resource, BulkResourceOperation):
 
     HostProfiles = namedtuple("HostProfiles", ["profiles", "valid"])
 
-    def get_profiles(self, host, request):
-        properties = json.loads(host.properties)
-
+    def get_server_profiles(self, request):
+        """The server profiles (filtered by the request) with their validations, loaded once per request"""
         filters = {}
         for filter in request.GET:
             match = re.search("^server_profile__(.*)", filter)
             if match:
                 filters[match.group(1)] = request.GET[filter]
 
+        return list(
+            ServerProfile.objects.filter(**filter_fields_to_type(ServerProfile, filters)).prefetch_related(
+                "serverprofilevalidation_set"
+            )
+        )
+
+    def get_profiles(self, host, server_profiles):
+        properties = json.loads(host.properties)
+
         result = {}
-        for profile in ServerProfile.objects.filter(**filter_fields_to_type(ServerProfile, filters)):
+        for profile in server_profiles:
             tests = result[profile.name] = []
             for validation in profile.serverprofilevalidation_set.all():
-                error = ""
-
                 if properties == {}:
-                    test = False
-                    error = "Result unavailable while host agent starts"
+                    test, error = False, "Result unavailable while host agent starts"
                 else:
-                    try:
-                        test = safe_eval(validation.test, properties)
-                    except Exception as error:
-                        test = False
+                    test, error = self.validation_cache.evaluate(validation.test, host.properties, properties)
 
                 tests.append(
-                    {
-                        "pass": bool(test),
-                        "test": validation.test,
-                        "description": validation.description,
-                        "error": str(error),
-                    }
+                    {"pass": test, "test": validation.test, "description": validation.description, "error": error}
                 )
         return self.HostProfiles(result, properties != {})
 
@@ -505,8 +546,8 @@ class HostProfileResource(Resource, BulkResourceOperation):
 
         return map(dehydrate_command, commands)
 
-    def _host_profiles_object(self, host, request):
-        host_profiles = self.get_profiles(host, request)
+    def _host_profiles_object(self, host, server_profiles):
+        host_profiles = self.get_profiles(host, server_profiles)
 
         return {
             "host": host.id,
@@ -519,7 +560,7 @@ class HostProfileResource(Resource, BulkResourceOperation):
     def obj_get(self, bundle, pk=None):
         host = get_object_or_404(ManagedHost, pk=pk)
 
-        return self._host_profiles_object(host, bundle.request)
+        return self._host_profiles_object(host, self.get_server_profiles(bundle.request))
 
     def obj_get_list(self, bundle):
         ids = bundle.request.GET.getlist("id__in")
@@ -530,10 +571,11 @@ class HostProfileResource(Resource, BulkResourceOperation):
         filters = {"id__in": ids} if ids else {}
 
         result = []
+        server_profiles = self.get_server_profiles(bundle.request)
 
         for host in ManagedHost.objects.filter(**filters):
             result.append(
-                {"host_profiles": self._host_profiles_object(host, bundle.request), "error": None, "traceback": None}
+                {"host_profiles": self._host_profiles_object(host, server_profiles), "error": None, "traceback": None}
             )
 
         return result
@@ -2,6 +2,7 @@
 # Use of this source code is governed by a MIT-style
 # license that can be found in the LICENSE file.
 
+import re
 
 from chroma_core.lib.util import normalize_nid
 from chroma_api.utils import DateSerializer
@@ -12,6 +13,10 @@ from chroma_api.authentication import AnonymousAuthentication, PatchedDjangoAuth
 from chroma_core.models.log import LogMessage, MessageClass
 from chroma_api.chroma_model_resource import ChromaModelResource
 
+# TODO: detect other NID types (cray?)
+NID_REGEX = re.compile("(\d{1,3}\.){3}\d{1,3}@(tcp|ib)(_\d+)?")
+TARGET_REGEX = re.compile("[^\w](\w{1,8}-(MDT|OST)[\da-f]{4})")
+
 
 class LogAuthorization(PatchedDjangoAuthorization):
     """
@@ -33,6 +38,52 @@ class LogAuthorization(PatchedDjangoAuthorization):
             return object_list.filter(message_class__in=[MessageClass.LUSTRE, MessageClass.LUSTRE_ERROR])
 
 
+class SubstitutionLookups(object):
+    """
+    The hosts and targets that log messages may be decorated with.  Each lookup is loaded
+    with a single query when the first message that needs it is dehydrated, and is then
+    reused for every other message in the same request.
+    """
+
+    def __init__(self):
+        self._hosts_by_nid = None
+        self._targets_by_name = None
+
+    def host_by_nid(self, nid_string):
+        """Resolve a NID string to a ManagedHost, raising as ManagedHost.get_by_nid would"""
+        from chroma_core.models import ManagedHost, Nid
+
+        if self._hosts_by_nid is None:
+            self._hosts_by_nid = ManagedHost.get_hosts_by_nid()
+
+        nid = Nid.split_nid_string(nid_string)
+        host = self._hosts_by_nid.get((nid.nid_address, nid.lnd_type), ManagedHost.DoesNotExist)
+        if host is ManagedHost.DoesNotExist:
+            raise ManagedHost.DoesNotExist()
+        elif host is None:
+            raise ManagedHost.MultipleObjectsReturned()
+        return host
+
+    def target_by_name(self, name):
+        from chroma_core.models import ManagedTarget
+
+        if self._targets_by_name is None:
+            self._targets_by_name = {}
+            # Joining the subclasses means the targets come back downcast without a query each
+            for target in ManagedTarget.objects.select_related("managedmgs", "managedmdt", "managedost"):
+                self._targets_by_name.setdefault(target.name, target)
+
+        return self._targets_by_name.get(name)
+
+    @classmethod
+    def for_request(cls, request):
+        try:
+            return request.log_substitution_lookups
+        except AttributeError:
+            request.log_substitution_lookups = cls()
+            return request.log_substitution_lookups
+
+
 class LogResource(ChromaModelResource):
     """
     syslog messages collected by the manager server.
@@ -56,7 +107,7 @@ class LogResource(ChromaModelResource):
     )
 
     def dehydrate_substitutions(self, bundle):
-        return self._substitutions(bundle.obj)
+        return self._substitutions(bundle.obj, SubstitutionLookups.for_request(bundle.request))
 
     class Meta:
         queryset = LogMessage.objects.all()
@@ -100,13 +151,12 @@ class LogResource(ChromaModelResource):
 
         return super(LogResource, self).build_filters(filters, **kwargs)
 
-    def _substitutions(self, obj):
+    def _substitutions(self, obj, lookups):
         message = obj.message
         from chroma_api import api_log
         from chroma_api.urls import api
 
-        from chroma_core.models import ManagedHost, ManagedTarget
-        import re
+        from chroma_core.models import ManagedHost
 
         substitutions = []
 
@@ -121,14 +171,11 @@ class LogResource(ChromaModelResource):
                 }
             )
 
-        # TODO: detect other NID types (cray?)
-        nid_regex = re.compile("(\d{1,3}\.){3}\d{1,3}@(tcp|ib)(_\d+)?")
-        target_regex = re.compile("[^\w](\w{1,8}-(MDT|OST)[\da-f]{4})")
-        for match in nid_regex.finditer(message):
+        for match in NID_REGEX.finditer(message):
             nid = match.group(0)
             nid = normalize_nid(nid)
             try:
-                host = ManagedHost.get_by_nid(nid)
+                host = lookups.host_by_nid(nid)
             except ManagedHost.DoesNotExist:
                 api_log.warn("No host has NID %s" % nid)
                 continue
@@ -138,9 +185,9 @@ class LogResource(ChromaModelResource):
             if host.state != "removed":
                 substitute(host, match, 0)
 
-        for match in target_regex.finditer(message):
-            target_name = match.group(1)
-            for target in ManagedTarget.objects.filter(name=target_name)[:1]:
+        for match in TARGET_REGEX.finditer(message):
+            target = lookups.target_by_name(match.group(1))
+            if target is not None:
                 substitute(target, match)
 
         return sorted(substitutions, key=lambda sub: sub["start"])
@@ -24,7 +24,7 @@ class StepResource(ChromaModelResource):
     """
 
     class Meta:
-        queryset = StepResult.objects.all()
+        queryset = StepResult.objects.prefetch_related("chunks")
         resource_name = "step"
         authorization = PatchedDjangoAuthorization()
         authentication = AnonymousAuthentication()
@@ -48,3 +48,9 @@ class StepResource(ChromaModelResource):
 
     def dehydrate_args(self, bundle):
         return bundle.obj.args
+
+    def dehydrate_log(self, bundle):
+        return bundle.obj.assembled("log")
+
+    def dehydrate_console(self, bundle):
+        return bundle.obj.assembled("console")
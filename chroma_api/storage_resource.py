@@ -3,8 +3,9 @@
 # license that can be found in the LICENSE file.
 
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from django.contrib.contenttypes.models import ContentType
+from tastypie.paginator import Paginator
 from tastypie.validation import Validation
 from chroma_core.lib.storage_plugin.api import attributes
 from chroma_core.lib.storage_plugin.base_resource import BaseStorageResource
@@ -57,6 +58,18 @@ class StorageResourceValidation(Validation):
         return errors
 
 
+class StorageResourcePaginator(Paginator):
+    """Prefetch each page of records in bulk, see StorageResourceResource.prefetch_records"""
+
+    def get_slice(self, limit, offset):
+        records = list(super(StorageResourcePaginator, self).get_slice(limit, offset))
+        StorageResourceResource.prefetch_records(records)
+        return records
+
+
+PrefetchedRecord = namedtuple("PrefetchedRecord", ["resource", "alerts", "propagated_alerts"])
+
+
 class StorageResourceResource(ChromaModelResource):
     """
     Storage resources are objects within the storage plugin
@@ -120,7 +133,8 @@ class StorageResourceResource(ChromaModelResource):
     def get_list(self, request, **kwargs):
         if "ancestor_of" in request.GET:
             record = StorageResourceRecord.objects.get(id=request.GET["ancestor_of"])
-            ancestor_records = set(ResourceQuery().record_all_ancestors(record))
+            ancestor_records = list(set(ResourceQuery().record_all_ancestors(record)))
+            self.prefetch_records(ancestor_records)
 
             bundles = [self.build_bundle(obj=obj, request=request) for obj in ancestor_records]
             dicts = [self.full_dehydrate(bundle) for bundle in bundles]
@@ -163,21 +177,40 @@ class StorageResourceResource(ChromaModelResource):
         """Pass-through in favour of sorting done in obj_get_list"""
         return obj_list
 
+    @staticmethod
+    def prefetch_records(records):
+        """Load the storage resources and alerts for a list of records in bulk.
+
+        The results are kept on each record (which lives as long as the request), so
+        the several fields that need them don't each load them again.
+        """
+        record_ids = [record.id for record in records]
+        alerts = ResourceQuery().records_get_alerts(record_ids)
+        propagated_alerts = ResourceQuery().records_get_propagated_alerts(record_ids)
+
+        for record, resource in zip(records, StorageResourceRecord.to_resources(records)):
+            record.prefetched = PrefetchedRecord(resource, alerts[record.id], propagated_alerts[record.id])
+
+    def _prefetched(self, bundle):
+        if not hasattr(bundle.obj, "prefetched"):
+            self.prefetch_records([bundle.obj])
+        return bundle.obj.prefetched
+
     def dehydrate_propagated_alerts(self, bundle):
-        return [a.to_dict() for a in ResourceQuery().resource_get_propagated_alerts(bundle.obj.to_resource())]
+        return [a.to_dict() for a in self._prefetched(bundle).propagated_alerts]
 
     def dehydrate_deletable(self, bundle):
         return bundle.obj.resource_class.user_creatable
 
     def dehydrate_default_alias(self, bundle):
-        return bundle.obj.to_resource().get_label()
+        return self._prefetched(bundle).resource.get_label()
 
     def dehydrate_alias(self, bundle):
-        resource = bundle.obj.to_resource()
+        resource = self._prefetched(bundle).resource
         return bundle.obj.alias_or_name(resource)
 
     def dehydrate_alerts(self, bundle):
-        return [a.to_dict() for a in ResourceQuery().resource_get_alerts(bundle.obj.to_resource())]
+        return [a.to_dict() for a in self._prefetched(bundle).alerts]
 
     def dehydrate_content_type_id(self, bundle):
         return ContentType.objects.get_for_model(bundle.obj.__class__).pk
@@ -185,7 +218,7 @@ class StorageResourceResource(ChromaModelResource):
     def dehydrate_attributes(self, bundle):
         # a list of dicts, one for each attribute.  Excludes hidden attributes.
         result = {}
-        resource = bundle.obj.to_resource()
+        resource = self._prefetched(bundle).resource
         attr_props = resource.get_all_attribute_properties()
         for name, props in attr_props:
             # Exclude password hashes
@@ -211,8 +244,11 @@ class StorageResourceResource(ChromaModelResource):
         return result
 
     class Meta:
-        queryset = StorageResourceRecord.objects.filter(resource_class__id__in=filter_class_ids())
+        queryset = StorageResourceRecord.objects.filter(resource_class__id__in=filter_class_ids()).select_related(
+            "resource_class__storage_plugin"
+        )
         resource_name = "storage_resource"
+        paginator_class = StorageResourcePaginator
         filtering = {"class_name": ["exact"], "plugin_name": ["exact"]}
         authorization = PatchedDjangoAuthorization()
         authentication = AnonymousAuthentication()
@@ -190,7 +190,8 @@ class VolumeResource(ChromaModelResource):
         host_ids = set(lun.volumenode_set.filter(id__in=node_ids).values_list("host_id", flat=True))
 
         # Sanity-check the primary/failover relationships and save if OK
-        if not any(host_ids.issubset(host.id for host in cluster.peers) for cluster in HaCluster.all_clusters()):
+        ha_clusters = HaCluster.all_clusters()
+        if not any(host_ids.issubset(host.id for host in cluster.peers) for cluster in ha_clusters):
             error_msg = "Attempt to set primary/secondary VolumeNodes across HA clusters for Volume %s:%s\n" % (
                 lun.id,
                 lun.label,
@@ -199,7 +200,7 @@ class VolumeResource(ChromaModelResource):
                 [str(host) for host in ManagedHost.objects.filter(id__in=host_ids)]
             )
             error_msg += "\nKnown HA Clusters %s\n" % ", ".join(
-                ["(%s)" % ", ".join([str(host) for host in cluster.peers]) for cluster in HaCluster.all_clusters()]
+                ["(%s)" % ", ".join([str(host) for host in cluster.peers]) for cluster in ha_clusters]
             )
 
             raise ImmediateHttpResponse(response=HttpBadRequest(error_msg))
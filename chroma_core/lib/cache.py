@@ -17,7 +17,7 @@ class ObjectCache(object):
         from chroma_core.models import ManagedFilesystem, ManagedHost, LNetConfiguration, LustreClientMount
         from chroma_core.models import PacemakerConfiguration, CorosyncConfiguration, Corosync2Configuration
         from chroma_core.models import NTPConfiguration, StratagemConfiguration, Ticket
-        from chroma_core.models.target import ManagedTarget, ManagedTargetMount
+        from chroma_core.models.target import ManagedTarget, ManagedTargetMount, ManagedMdt, ManagedOst
         from chroma_core.models.copytool import Copytool
 
         self.objects = defaultdict(dict)
@@ -42,6 +42,30 @@ class ObjectCache(object):
             Ticket,
         ]
 
+        # Secondary indexes, maintained alongside self.objects.  Each attribute tuple maps
+        # to a dict of {attribute values: {pk: instance}}, see _get_candidates.  The keys
+        # an instance was indexed under are remembered so that it can be unindexed even
+        # if it has since been modified in place.
+        self._indexed_attrs = {
+            ManagedTargetMount: [("host_id",), ("target_id",), ("primary", "target_id")],
+            LustreClientMount: [("host_id",), ("filesystem_id",), ("filesystem_id", "host_id")],
+            Copytool: [("host_id",)],
+            LNetConfiguration: [("host_id",)],
+            PacemakerConfiguration: [("host_id",)],
+        }
+        self._indexes = defaultdict(lambda: defaultdict(lambda: defaultdict(dict)))
+        self._index_keys = {}
+
+        # Filesystem membership of MDTs and OSTs, as {filesystem id: {target id: target class}}.  Entries
+        # are not removed when a target leaves the cache, so lookups must check self.objects too.
+        self._filesystem_members = defaultdict(dict)
+        for klass in [ManagedMdt, ManagedOst]:
+            for member in klass.objects.values("id", "filesystem_id"):
+                self._filesystem_members[member["filesystem_id"]][member["id"]] = klass
+        self._member_filesystem = dict(
+            (target_id, fs_id) for fs_id, members in self._filesystem_members.items() for target_id in members
+        )
+
         for klass in self._cached_models:
             args = filter_args.get(klass, {})
             for obj in klass.objects.filter(**args):
@@ -52,16 +76,71 @@ class ObjectCache(object):
 
         log.debug("_add %s %s %s" % (instance.__class__, instance.id, id(instance)))
 
+        self._remove(klass, instance.pk)
         self.objects[klass][instance.pk] = instance
+        self._index(klass, instance)
+
+    def _remove(self, klass, pk):
+        if self.objects[klass].pop(pk, None) is None:
+            return
+
+        for attrs, key in self._index_keys.pop((klass, pk), []):
+            index = self._indexes[klass][attrs]
+            index[key].pop(pk, None)
+            if not index[key]:
+                del index[key]
+
+    def _index(self, klass, instance):
+        from chroma_core.models.target import ManagedTarget, FilesystemMember
+
+        index_keys = []
+        for attrs in self._indexed_attrs.get(klass, []):
+            key = tuple(getattr(instance, attr) for attr in attrs)
+            self._indexes[klass][attrs][key][instance.pk] = instance
+            index_keys.append((attrs, key))
+        if index_keys:
+            self._index_keys[(klass, instance.pk)] = index_keys
+
+        if klass == ManagedTarget and instance.pk not in self._member_filesystem:
+            target_class = instance.downcast_class
+            if issubclass(target_class, FilesystemMember):
+                fs_id = instance.downcast().filesystem_id
+                self._filesystem_members[fs_id][instance.pk] = target_class
+                self._member_filesystem[instance.pk] = fs_id
+
+    def _get_candidates(self, klass, attr_values):
+        """Return the cached instances of klass matching all of attr_values, using the
+        primary key or a secondary index where one covers the attributes."""
+        class_collection = self.objects[klass]
+
+        if not attr_values:
+            return class_collection.values()
+
+        pk = attr_values.get("pk", attr_values.get("id"))
+        if pk is not None and set(attr_values.keys()) <= set(["pk", "id"]):
+            return [class_collection[pk]] if pk in class_collection else []
+
+        attrs = tuple(sorted(attr_values.keys()))
+        if attrs in self._indexed_attrs.get(klass, []):
+            key = tuple(attr_values[attr] for attr in attrs)
+            candidates = self._indexes[klass][attrs].get(key, {}).values()
+        else:
+            candidates = class_collection.values()
+
+        # Check the values again: an instance may have been modified in place since it was indexed
+        return [o for o in candidates if all(getattr(o, attr) == value for attr, value in attr_values.items())]
 
     @classmethod
     def add(cls, klass, instance):
         cls.getInstance()._add(klass, instance)
 
     @classmethod
-    def get(cls, klass, filter=None):
+    def get(cls, klass, filter=None, **attr_values):
+        """Return cached instances of klass.  Attribute values given as keyword
+        arguments are looked up in the secondary indexes where possible, and `filter`
+        is applied to what remains."""
         assert klass in cls.getInstance()._cached_models
-        return [o for o in cls.getInstance().objects[klass].values() if not filter or filter(o)]
+        return [o for o in cls.getInstance()._get_candidates(klass, attr_values) if not filter or filter(o)]
 
     @classmethod
     def get_by_id(cls, klass, instance_id):
@@ -75,6 +154,14 @@ class ObjectCache(object):
     def get_targets_by_filesystem(cls, filesystem_id):
         return cls.getInstance()._get_targets_by_filesystem(filesystem_id)
 
+    @classmethod
+    def target_filesystem_id(cls, target):
+        """Return the ID of the filesystem which an MDT or OST belongs to, without downcasting if possible"""
+        try:
+            return cls.getInstance()._member_filesystem[target.id]
+        except KeyError:
+            return target.downcast().filesystem_id
+
     @classmethod
     def fs_targets(cls, fs_id):
         from chroma_core.models import ManagedMgs
@@ -87,30 +174,26 @@ class ObjectCache(object):
     def _get_targets_by_filesystem(self, filesystem_id):
         from chroma_core.models import ManagedTarget, ManagedMdt, ManagedOst, ManagedFilesystem
 
-        # FIXME: This is reasonably efficient but could be improved further by caching the filesystem membership of targets.
         targets = []
         mgs_id = self.objects[ManagedFilesystem][filesystem_id].mgs_id
         targets.append(self.objects[ManagedTarget][mgs_id])
 
-        targets.extend(
-            [
-                self.objects[ManagedTarget][mdt["id"]]
-                for mdt in ManagedMdt.objects.filter(filesystem=filesystem_id).values("id")
-            ]
-        )
-        targets.extend(
-            [
-                self.objects[ManagedTarget][ost["id"]]
-                for ost in ManagedOst.objects.filter(filesystem=filesystem_id).values("id")
-            ]
-        )
+        members = self._filesystem_members[filesystem_id]
+        for member_class in [ManagedMdt, ManagedOst]:
+            targets.extend(
+                [
+                    self.objects[ManagedTarget][target_id]
+                    for target_id in sorted(members.keys())
+                    if members[target_id] == member_class and target_id in self.objects[ManagedTarget]
+                ]
+            )
 
         return targets
 
     @classmethod
-    def get_one(cls, klass, filter=None):
+    def get_one(cls, klass, filter=None, **attr_values):
         assert klass in cls.getInstance()._cached_models
-        r = [o for o in cls.getInstance().objects[klass].values() if not filter or filter(o)]
+        r = cls.get(klass, filter, **attr_values)
         if len(r) > 1:
             raise klass.MultipleObjectsReturned
         elif not r:
@@ -122,7 +205,7 @@ class ObjectCache(object):
     def target_primary_server(cls, target):
         from chroma_core.models.target import ManagedTargetMount
 
-        primary_mtm = cls.get_one(ManagedTargetMount, lambda mtm: mtm.target.id == target.id and mtm.primary == True)
+        primary_mtm = cls.get_one(ManagedTargetMount, target_id=target.id, primary=True)
         return primary_mtm.host
 
     @classmethod
@@ -140,13 +223,13 @@ class ObjectCache(object):
     def host_client_mounts(cls, host_id):
         from chroma_core.models.client_mount import LustreClientMount
 
-        return cls.get(LustreClientMount, lambda hcm: hcm.host_id == host_id)
+        return cls.get(LustreClientMount, host_id=host_id)
 
     @classmethod
     def filesystem_client_mounts(cls, fs_id):
         from chroma_core.models.client_mount import LustreClientMount
 
-        return cls.get(LustreClientMount, lambda fcm: fcm.filesystem_id == fs_id)
+        return cls.get(LustreClientMount, filesystem_id=fs_id)
 
     @classmethod
     def client_mount_copytools(cls, cm_id):
@@ -154,10 +237,8 @@ class ObjectCache(object):
         from chroma_core.models.copytool import Copytool
 
         try:
-            client_mount = cls.get_one(LustreClientMount, lambda ccm: ccm.id == cm_id)
-            return cls.get(
-                Copytool, lambda ct: (client_mount.host_id == ct.host_id and client_mount.mountpoint == ct.mountpoint)
-            )
+            client_mount = cls.get_one(LustreClientMount, id=cm_id)
+            return cls.get(Copytool, lambda ct: client_mount.mountpoint == ct.mountpoint, host_id=client_mount.host_id)
         except LustreClientMount.DoesNotExist:
             return []
 
@@ -165,7 +246,7 @@ class ObjectCache(object):
     def host_targets(cls, host_id):
         from chroma_core.models.target import ManagedTargetMount, ManagedTarget
 
-        mtms = cls.get(ManagedTargetMount, lambda mtm: mtm.host_id == host_id)
+        mtms = cls.get(ManagedTargetMount, host_id=host_id)
 
         # FIXME: We have to explicitly restrict to non-deleted targets because ManagedTargetMount
         # instances aren't cleaned up on target deletion.
@@ -174,9 +255,9 @@ class ObjectCache(object):
 
     @classmethod
     def purge(cls, klass, filter):
-        cls.getInstance().objects[klass] = dict(
-            [(o.pk, o) for o in cls.getInstance().objects[klass].values() if not filter(o)]
-        )
+        instance = cls.getInstance()
+        for o in [o for o in instance.objects[klass].values() if filter(o)]:
+            instance._remove(klass, o.pk)
 
     def _update(self, obj):
         log.debug("update: %s %s" % (obj.__class__, obj.id))
@@ -188,7 +269,9 @@ class ObjectCache(object):
             except obj.__class__.DoesNotExist:
                 return None
             else:
+                self._remove(obj.__class__, obj.pk)
                 class_collection[obj.pk] = fresh_instance
+                self._index(obj.__class__, fresh_instance)
             return fresh_instance
 
     @classmethod
@@ -199,5 +282,5 @@ class ObjectCache(object):
     def mtm_targets(cls, mtm_id):
         from chroma_core.models.target import ManagedTargetMount, ManagedTarget
 
-        mtms = cls.get(ManagedTargetMount, lambda mtm: mtm.id == mtm_id)
+        mtms = cls.get(ManagedTargetMount, id=mtm_id)
         return [cls.getInstance().objects[ManagedTarget][mtm.target_id] for mtm in mtms]
@@ -7,6 +7,7 @@ import os
 import logging
 import settings
 import threading
+from collections import defaultdict
 
 from chroma_core.lib.storage_plugin.base_resource import BaseStorageResource
 from chroma_core.lib.storage_plugin.api import identifiers
@@ -24,6 +25,11 @@ class ResourceIndex(object):
         # Map (id_tuple, klass) to resource
         self._resource_id_to_resource = {}
 
+        # Map klass to (map of id_tuple to resource), and (klass, position in id_tuple, value) to set of
+        # id_tuples, so that find_by_attr can go straight to the candidates instead of scanning everything.
+        self._class_to_resources = defaultdict(dict)
+        self._id_value_to_id_tuples = defaultdict(set)
+
     def add(self, resource):
         self._local_id_to_resource[resource._handle] = resource
 
@@ -32,33 +38,60 @@ class ResourceIndex(object):
         # scannable will be in this ResourceIndex (index is per
         # plugin instance), and if it's a GlobalId then it doesn't
         # have a scope.
-        resource_id = (resource.id_tuple(), resource.__class__)
+        id_tuple = resource.id_tuple()
+        resource_id = (id_tuple, resource.__class__)
         if resource_id in self._resource_id_to_resource:
             raise RuntimeError("Duplicate resource added to index")
         self._resource_id_to_resource[resource_id] = resource
 
+        self._class_to_resources[resource.__class__][id_tuple] = resource
+        for position, value in enumerate(id_tuple):
+            self._id_value_to_id_tuples[(resource.__class__, position, value)].add(id_tuple)
+
     def remove(self, resource):
-        resource_id = (resource.id_tuple(), resource.__class__)
+        id_tuple = resource.id_tuple()
+        resource_id = (id_tuple, resource.__class__)
         if not resource_id in self._resource_id_to_resource:
             raise RuntimeError("Remove non-existent resource")
 
         del self._local_id_to_resource[resource._handle]
         del self._resource_id_to_resource[resource_id]
 
+        class_resources = self._class_to_resources[resource.__class__]
+        del class_resources[id_tuple]
+        if not class_resources:
+            del self._class_to_resources[resource.__class__]
+        for position, value in enumerate(id_tuple):
+            key = (resource.__class__, position, value)
+            self._id_value_to_id_tuples[key].discard(id_tuple)
+            if not self._id_value_to_id_tuples[key]:
+                del self._id_value_to_id_tuples[key]
+
     def get(self, klass, **attrs):
-        id_tuple = klass(**attrs).id_tuple()
+        # Straight from the attributes, there's no need to build a resource to find its id_tuple
+        id_tuple = klass.attrs_to_id_tuple(attrs, False)
         try:
             return self._resource_id_to_resource[(id_tuple, klass)]
         except KeyError:
             raise ResourceNotFound()
 
     def find_by_attr(self, klass, **attrs):
-        for resource_tuple in self._resource_id_to_resource:
-            # Must compare klass before values, because values will only be valid for that klass.
-            if resource_tuple[1] == klass and klass.compare_id_tuple(
-                resource_tuple[0], klass.attrs_to_id_tuple(attrs, True), True
-            ):
-                yield self._resource_id_to_resource[resource_tuple]
+        class_resources = self._class_to_resources.get(klass, {})
+        search_tuple = klass.attrs_to_id_tuple(attrs, True)
+
+        # Narrow down by the first attribute given: a missing (None) attribute on a resource
+        # matches any value, so include those as well.
+        candidates = class_resources.keys()
+        for position, value in enumerate(search_tuple):
+            if value is not None:
+                candidates = self._id_value_to_id_tuples.get((klass, position, value), set()) | (
+                    self._id_value_to_id_tuples.get((klass, position, None), set())
+                )
+                break
+
+        for id_tuple in list(candidates):
+            if klass.compare_id_tuple(id_tuple, search_tuple, True):
+                yield class_resources[id_tuple]
 
     def all(self):
         return self._local_id_to_resource.values()
@@ -94,6 +127,11 @@ class BaseStoragePlugin(object):
         self._delta_alerts = set()
         self._alerts = {}
 
+        # Resources with attribute or parent changes since the last update, so that an update need
+        # only visit those rather than every resource in the index.
+        self._dirty_lock = threading.Lock()
+        self._dirty_resources = set()
+
         # Should changes to resources be delta'd so that only changes are reported to the resource manager. This
         # required because it may be that at boot time (for example) we want all the changes everytime but once the
         # system is quiescent we only want the deltas.
@@ -108,6 +146,7 @@ class BaseStoragePlugin(object):
         root_resource = ResourceQuery().get_resource(scannable_id)
         root_resource._handle = self._generate_handle()
         root_resource._handle_global = False
+        root_resource._on_delta = self._mark_dirty
         self._root_resource = root_resource
 
     ##############################################################################################
@@ -193,7 +232,7 @@ class BaseStoragePlugin(object):
 
         # Creates, deletes, attrs, parents are all handled in session_open
         # the rest we do manually.
-        self._check_alert_conditions()
+        self._check_alert_conditions(self._index.all())
         self._commit_alerts()
 
     def _generate_handle(self):
@@ -209,14 +248,28 @@ class BaseStoragePlugin(object):
 
         # Resources created since last update
         with self._resource_lock:
+            dirty_resources = self._take_dirty_resources()
+
             self._commit_resource_deletes()
             self._commit_resource_creates()
-            self._commit_resource_updates()
-            self._check_alert_conditions()
+            self._commit_resource_updates(dirty_resources)
+            self._check_alert_conditions(dirty_resources)
             self._commit_alerts()
 
-    def _check_alert_conditions(self):
-        for resource in self._index.all():
+    def _mark_dirty(self, resource):
+        with self._dirty_lock:
+            self._dirty_resources.add(resource)
+
+    def _take_dirty_resources(self):
+        with self._dirty_lock:
+            dirty_resources = self._dirty_resources
+            self._dirty_resources = set()
+
+        return dirty_resources
+
+    def _check_alert_conditions(self, resources):
+        # Alert conditions only depend on the resource's own attributes, so unchanged resources can't have changed
+        for resource in resources:
             # Check if any AlertConditions are matched
             for ac in resource._meta.alert_conditions:
                 alert_list = ac.test(resource)
@@ -242,9 +295,9 @@ class BaseStoragePlugin(object):
             )
             self._delta_delete_global_resources = []
 
-    def _commit_resource_updates(self):
+    def _commit_resource_updates(self, resources):
         # Resources with changed attributes
-        for resource in self._index.all():
+        for resource in resources:
             deltas = resource.flush_deltas()
             # If there were changes to attributes
             if len(deltas["attributes"]) > 0:
@@ -301,9 +354,12 @@ class BaseStoragePlugin(object):
 
         resource._handle = self._generate_handle()
         resource._handle_global = False
+        resource._on_delta = self._mark_dirty
 
         self._index.add(resource)
         self._delta_new_resources.append(resource)
+        # So that its alert conditions are checked
+        self._mark_dirty(resource)
 
     ############################################################
     # Methods below are implemented by the plugins themselves. #
@@ -439,6 +495,8 @@ class BaseStoragePlugin(object):
         """
         with self._resource_lock:
             self._index.remove(resource)
+            with self._dirty_lock:
+                self._dirty_resources.discard(resource)
 
             if isinstance(resource.identifier, identifiers.BaseScopedId):
                 self._delta_delete_local_resources.append(resource)
@@ -114,6 +114,8 @@ class BaseStorageResource(object):
         self._delta_attrs = {}
         self._delta_parents = []
         self._calc_changes_delta = kwargs.pop("calc_changes_delta", lambda: True)
+        # Called with this resource whenever it records a delta, so that its owner can keep track of what changed
+        self._on_delta = None
 
         for k, v in kwargs.items():
             if not k in self._meta.storage_attributes:
@@ -202,6 +204,7 @@ class BaseStorageResource(object):
             self._storage_dict[key] = value
             with self._delta_lock:
                 self._delta_attrs[key] = value
+            self._delta_recorded()
 
         else:
             object.__setattr__(self, key, value)
@@ -267,19 +270,27 @@ class BaseStorageResource(object):
         else:
             return tuple1 == tuple2
 
+    def _delta_recorded(self):
+        if self._on_delta is not None:
+            self._on_delta(self)
+
     def add_parent(self, parent_resource):
         # TODO: lock _parents
         with self._delta_lock:
-            if parent_resource not in self._parents:
-                self._parents.append(parent_resource)
-                self._delta_parents.append(parent_resource)
+            if parent_resource in self._parents:
+                return
+            self._parents.append(parent_resource)
+            self._delta_parents.append(parent_resource)
+        self._delta_recorded()
 
     def remove_parent(self, parent_resource):
         # TODO: lock _parents
         with self._delta_lock:
-            if parent_resource in self._parents:
-                self._parents.remove(parent_resource)
-                self._delta_parents.append(parent_resource)
+            if parent_resource not in self._parents:
+                return
+            self._parents.remove(parent_resource)
+            self._delta_parents.append(parent_resource)
+        self._delta_recorded()
 
     def validate(self):
         """Call validate() on the BaseResourceAttribute for all _storage_dict items, and
@@ -59,6 +59,29 @@ class ResourceQuery(object):
             alerts.append(sap.alert_state)
         return alerts
 
+    def records_get_alerts(self, record_ids):
+        """Like resource_get_alerts for many records at once, returns a dict of record id to alert list"""
+        from chroma_core.models import StorageResourceAlert
+
+        alerts = dict((record_id, []) for record_id in record_ids)
+        for alert in StorageResourceAlert.objects.filter(
+            active=True,
+            alert_item_id__in=record_ids,
+            alert_item_type__model=StorageResourceRecord.__name__.lower(),
+            alert_item_type__app_label=StorageResourceRecord._meta.app_label,
+        ):
+            alerts[alert.alert_item_id].append(alert)
+        return alerts
+
+    def records_get_propagated_alerts(self, record_ids):
+        """Like resource_get_propagated_alerts for many records at once, returns a dict of record id to alert list"""
+        from chroma_core.models import StorageAlertPropagated
+
+        alerts = dict((record_id, []) for record_id in record_ids)
+        for sap in StorageAlertPropagated.objects.filter(storage_resource__in=record_ids).select_related("alert_state"):
+            alerts[sap.storage_resource_id].append(sap.alert_state)
+        return alerts
+
     def record_alert_message(self, record_id, alert_class):
         from chroma_core.lib.storage_plugin.manager import storage_plugin_manager
 
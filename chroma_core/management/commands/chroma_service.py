@@ -25,6 +25,8 @@ from chroma_core.services.rpc import RpcClientFactory
 from iml_common.lib.date_time import IMLDateTime
 import chroma_core.services.log
 
+import settings
+
 
 log = log_register(__name__.split(".")[-1])
 
@@ -167,6 +169,11 @@ class Command(BaseCommand):
             signal.signal(signal.SIGINT, signal_handler)
             signal.signal(signal.SIGTERM, signal_handler)
 
+        # Services notify the same alerts over and over, let them answer from memory where they can
+        from chroma_core.models.alert import AlertStateBase
+
+        AlertStateBase.active_index.enable(settings.ALERT_INDEX_REFRESH_INTERVAL, options["services"])
+
         service_mains = []
         for service_name in options["services"]:
             module_path = "chroma_core.services.%s" % service_name
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.27 on 2026-10-18 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chroma_core", "0016_action_queue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StepResultChunk",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("stream", models.CharField(choices=[("log", "log"), ("console", "console")], max_length=8)),
+                ("text", models.TextField()),
+                (
+                    "step_result",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chunks",
+                        to="chroma_core.StepResult",
+                    ),
+                ),
+            ],
+            options={"ordering": ["id"],},
+        ),
+    ]
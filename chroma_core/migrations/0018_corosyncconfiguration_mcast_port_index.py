@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.27 on 2026-10-18 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chroma_core", "0017_stepresultchunk"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="corosyncconfiguration",
+            name="mcast_port",
+            field=models.IntegerField(db_index=True, null=True),
+        ),
+    ]
@@ -4,20 +4,142 @@
 
 
 import logging
+import threading
+import time
 
 from django.db import models
 from django.db.models import CASCADE
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.utils import timezone
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 
 from chroma_core.models.sparse_model import SparseModel
 from chroma_core.models.utils import STR_TO_SEVERITY
 from chroma_core.lib.job import job_log
 
 
+class ActiveAlertIndex(object):
+    """Process-local index of the active alerts, so that notifying an alert into the state it
+    is already in (which the services do for every object on every cycle) needs no query.
+
+    Disabled unless a process enables it: services do so at startup, which loads it from the
+    database.  It follows every alert saved or deleted in this process, and is reloaded every
+    `refresh_interval` seconds to pick up changes made by other processes.
+
+    Other processes (and the rust services) write alerts too, so within a refresh interval the
+    index may be wrong about alerts it did not see written.  It is only trusted for classes raised
+    by one of the services of this process (raised_by_service), as nobody else notifies them:
+    anything else which lowers or removes them must call invalidate() or deleted().  For other
+    classes an alert it has as active is only a hint, which callers must check against the
+    database, and that an alert is not active can't be answered.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._enabled = False
+        self._refresh_interval = None
+        self._services = frozenset()
+        # Map of (record_type, alert_item_type_id, alert_item_id) to list of active alert states
+        self._alerts = None
+        # Map of alert state id to its key in _alerts, which may not match the instance after a cast
+        self._keys = None
+        self._loaded_at = None
+
+    def enable(self, refresh_interval, services=()):
+        """:param services: The names of the services running in this process"""
+        with self._lock:
+            self._enabled = True
+            self._refresh_interval = refresh_interval
+            self._services = frozenset(services)
+            self._load()
+
+    def disable(self):
+        with self._lock:
+            self._enabled = False
+            self._alerts = None
+
+    def invalidate(self):
+        """Forget everything, e.g. after updating alerts in bulk, and reload on next use"""
+        with self._lock:
+            self._alerts = None
+
+    @staticmethod
+    def _item_type_id(alert_item):
+        # Same content type as AlertStateBase.filter_by_item selects on
+        if hasattr(alert_item, "content_type"):
+            return alert_item.content_type_id
+        else:
+            return ContentType.objects.get_for_model(alert_item, for_concrete_model=False).id
+
+    def owns(self, alert_class):
+        """Whether alert_class is only notified by services of this process, so that the index is
+        up to date with every change to its alerts"""
+        return self._enabled and alert_class.raised_by_service in self._services
+
+    def _load_if_stale(self):
+        if self._alerts is None or time.time() - self._loaded_at >= self._refresh_interval:
+            self._load()
+
+    def _load(self):
+        self._alerts = {}
+        self._keys = {}
+        for alert_state in AlertState.objects.filter(active=True):
+            self._add(alert_state)
+        self._loaded_at = time.time()
+
+    def _add(self, alert_state):
+        key = (alert_state.record_type, alert_state.alert_item_type_id, alert_state.alert_item_id)
+        self._alerts.setdefault(key, []).append(alert_state)
+        self._keys[alert_state.id] = key
+
+    def _remove(self, alert_state):
+        try:
+            key = self._keys.pop(alert_state.id)
+        except KeyError:
+            return
+
+        alert_states = [a for a in self._alerts[key] if a.id != alert_state.id]
+        if alert_states:
+            self._alerts[key] = alert_states
+        else:
+            self._alerts.pop(key, None)
+
+    def find(self, alert_class, alert_item, filters):
+        """Look up the active `alert_class` alert on `alert_item` matching the field values in `filters`
+
+        :return: (known, alert_state) where known is False if the index can't answer and the database
+                 must be asked, otherwise alert_state is the matching active alert or None.  An
+                 alert_state returned may since have been lowered by another process.
+        """
+        if not self._enabled or any("__" in name for name in filters):
+            return False, None
+
+        key = (alert_class.__name__, self._item_type_id(alert_item), alert_item.pk)
+        with self._lock:
+            self._load_if_stale()
+            for alert_state in self._alerts.get(key, []):
+                if all(getattr(alert_state, name) == value for name, value in filters.items()):
+                    return True, alert_state
+
+        return self.owns(alert_class), None
+
+    def saved(self, alert_state):
+        with self._lock:
+            if self._alerts is not None:
+                self._remove(alert_state)
+                if alert_state.active:
+                    self._add(alert_state)
+
+    def deleted(self, alert_state):
+        with self._lock:
+            if self._alerts is not None:
+                self._remove(alert_state)
+
+
 class AlertStateBase(SparseModel):
     class Meta:
         unique_together = ("alert_item_type", "alert_item_id", "alert_type", "active")
@@ -70,6 +192,12 @@ class AlertStateBase(SparseModel):
     # Subclasses set this, used as a default in .notify()
     default_severity = logging.INFO
 
+    active_index = ActiveAlertIndex()
+
+    # The service that raises alerts of this class, for classes raised by only one. The active_index of the
+    # process running that service knows when none is active without asking the database.
+    raised_by_service = None
+
     # For historical compatibility anything called Alert will send and alert email and anything else won't.
     # This can obviously be overridden by any particular event but gives us a like for behaviour.
     @property
@@ -201,6 +329,45 @@ class AlertStateBase(SparseModel):
 
         return attrs_to_save
 
+    @classmethod
+    def _get_active(cls, alert_item, kwargs, from_index=True):
+        """The active alert on alert_item matching kwargs, raising DoesNotExist if there is none.
+
+        :param from_index: Return an instance held by the active_index if it has one, rather than loading
+                           it.  Unless the active_index owns this class, it may have been lowered by
+                           another process since.
+        """
+        known, alert_state = cls.active_index.find(cls, alert_item, kwargs)
+
+        if known and alert_state is None:
+            raise cls.DoesNotExist()
+        elif known and (from_index or cls.active_index.owns(cls)):
+            return alert_state
+        else:
+            return cls.filter_by_item(alert_item).get(**kwargs)
+
+    @classmethod
+    def _lower(cls, alert_state, end_time):
+        """Lower alert_state if it is still active in the database.
+
+        :return: True if it was lowered, False if it was no longer active.
+        """
+        # Only these fields, an instance from the active_index may be out of date in other respects
+        if not AlertState.objects.filter(id=alert_state.id, active=True).update(end=end_time, active=None):
+            return False
+
+        alert_state.end = end_time
+        alert_state.active = None
+        post_save.send(
+            sender=type(alert_state),
+            instance=alert_state,
+            created=False,
+            update_fields=frozenset(["end", "active"]),
+            raw=False,
+            using=alert_state._state.db,
+        )
+        return True
+
     @classmethod
     def high(cls, alert_item, **kwargs):
         if hasattr(alert_item, "not_deleted") and alert_item.not_deleted != True:
@@ -208,8 +375,12 @@ class AlertStateBase(SparseModel):
 
         attrs_to_save = cls._get_attrs_to_save(kwargs)
 
+        filters = dict(kwargs)
+
         try:
-            alert_state = cls.filter_by_item(alert_item).get(**kwargs)
+            # Raising an alert that is already active changes nothing, so it need only be checked
+            # against the database when another process may have lowered it
+            alert_state = cls._get_active(alert_item, filters, from_index=False)
         except cls.DoesNotExist:
             kwargs.update(attrs_to_save)
 
@@ -223,7 +394,9 @@ class AlertStateBase(SparseModel):
             )
             try:
                 alert_state._message = alert_state.alert_message()
-                alert_state.save()
+                # In a savepoint, so that a colliding insert does not break the caller's transaction
+                with transaction.atomic():
+                    alert_state.save()
                 job_log.info(
                     "AlertState: Raised %s on %s "
                     "at severity %s" % (cls, alert_state.alert_item, alert_state.severity)
@@ -232,10 +405,13 @@ class AlertStateBase(SparseModel):
                 job_log.warning(
                     "AlertState: IntegrityError %s saving %s : %s : %s" % (e, cls.__name__, alert_item, kwargs)
                 )
-                # Handle colliding inserts: drop out here, no need to update
-                # the .end of the existing record as we are logically concurrent
-                # with the creator.
-                return None
+                # Handle colliding inserts: no need to update the .end of the existing record as we are
+                # logically concurrent with the creator.  The active_index missed it, so forget what it knows.
+                cls.active_index.invalidate()
+                try:
+                    return cls.filter_by_item(alert_item).get(**filters)
+                except cls.DoesNotExist:
+                    return None
         return alert_state
 
     @classmethod
@@ -247,10 +423,13 @@ class AlertStateBase(SparseModel):
         cls._get_attrs_to_save(kwargs)
 
         try:
-            alert_state = cls.filter_by_item(alert_item).get(**kwargs)
-            alert_state.end = end_time
-            alert_state.active = None
-            alert_state.save()
+            alert_state = cls._get_active(alert_item, kwargs)
+            if not cls._lower(alert_state, end_time):
+                # Lowered by another process since the active_index loaded it
+                cls.active_index.deleted(alert_state)
+                alert_state = cls.filter_by_item(alert_item).get(**kwargs)
+                if not cls._lower(alert_state, end_time):
+                    raise cls.DoesNotExist()
 
             # We optionally emit an event when alerts are lowered: we don't do that
             # for the beginning because that is implicit in the alert itself, whereas
@@ -309,6 +488,18 @@ class AlertState(AlertStateBase):
         proxy = True
 
 
+@receiver(post_save)
+def _alert_saved(sender, instance, **kwargs):
+    if issubclass(sender, AlertStateBase):
+        AlertStateBase.active_index.saved(instance)
+
+
+@receiver(post_delete)
+def _alert_deleted(sender, instance, **kwargs):
+    if issubclass(sender, AlertStateBase):
+        AlertStateBase.active_index.deleted(instance)
+
+
 class AlertSubscription(models.Model):
     """Represents a user's election to be notified of specific alert classes"""
 
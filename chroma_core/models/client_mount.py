@@ -4,10 +4,10 @@
 
 
 from django.db import models
-from django.db.models import CASCADE
+from django.db.models import CASCADE, prefetch_related_objects
 from chroma_core.lib.cache import ObjectCache
 from chroma_core.models.utils import CHARFIELD_MAX_LENGTH
-from chroma_core.models.host import ManagedHost, HostOfflineAlert, HostContactAlert
+from chroma_core.models.host import ManagedHost, HostOfflineAlert, HostContactAlert, hosts_in_contact
 from chroma_core.models.jobs import DeletableStatefulObject
 from chroma_core.models.jobs import StateChangeJob
 from chroma_core.models.alert import AlertState
@@ -149,16 +149,16 @@ class MountLustreClientJob(StateChangeJob):
         return "Mount %s" % self.lustre_client_mount
 
     def get_steps(self):
-        host = ObjectCache.get_one(ManagedHost, lambda mh: mh.id == self.lustre_client_mount.host_id)
+        host = ObjectCache.get_one(ManagedHost, id=self.lustre_client_mount.host_id)
         from chroma_core.models.filesystem import ManagedFilesystem
 
-        filesystem = ObjectCache.get_one(ManagedFilesystem, lambda mf: mf.id == self.lustre_client_mount.filesystem_id)
+        filesystem = ObjectCache.get_one(ManagedFilesystem, id=self.lustre_client_mount.filesystem_id)
         args = dict(host=host, filesystems=[(filesystem.mount_path(), self.lustre_client_mount.mountpoint)])
         return [(MountLustreFilesystemsStep, args)]
 
     def get_deps(self):
         return DependOn(
-            ObjectCache.get_one(ManagedHost, lambda mh: mh.id == self.lustre_client_mount.host_id).lnet_configuration,
+            ObjectCache.get_one(ManagedHost, id=self.lustre_client_mount.host_id).lnet_configuration,
             "lnet_up",
         )
 
@@ -192,10 +192,10 @@ class UnmountLustreClientMountJob(StateChangeJob):
         return "Unmount %s" % self.lustre_client_mount
 
     def get_steps(self):
-        host = ObjectCache.get_one(ManagedHost, lambda mh: mh.id == self.lustre_client_mount.host_id)
+        host = ObjectCache.get_one(ManagedHost, id=self.lustre_client_mount.host_id)
         from chroma_core.models.filesystem import ManagedFilesystem
 
-        filesystem = ObjectCache.get_one(ManagedFilesystem, lambda mf: mf.id == self.lustre_client_mount.filesystem_id)
+        filesystem = ObjectCache.get_one(ManagedFilesystem, id=self.lustre_client_mount.filesystem_id)
         args = dict(host=host, filesystems=[(filesystem.mount_path(), self.lustre_client_mount.mountpoint)])
         return [(UnmountLustreFilesystemsStep, args)]
 
@@ -286,6 +286,19 @@ class MountLustreFilesystemsJob(AdvertisedJob):
             .exists()
         )
 
+    @classmethod
+    def can_run_many(cls, hosts):
+        prefetch_related_objects(hosts, "server_profile")
+
+        candidates = [
+            host
+            for host in hosts
+            if host.is_worker
+            and host.state not in ["removed", "undeployed", "unconfigured"]
+            and ObjectCache.get(LustreClientMount, lambda cm: cm.state == "unmounted", host_id=host.id)
+        ]
+        return set(hosts_in_contact(candidates))
+
     def description(self):
         return "Mount associated Lustre filesystem(s) on host %s" % self.host
 
@@ -346,6 +359,19 @@ class UnmountLustreFilesystemsJob(AdvertisedJob):
             .exists()
         )
 
+    @classmethod
+    def can_run_many(cls, hosts):
+        prefetch_related_objects(hosts, "server_profile")
+
+        candidates = [
+            host
+            for host in hosts
+            if host.is_worker
+            and host.state not in ["removed", "undeployed", "unconfigured"]
+            and ObjectCache.get(LustreClientMount, lambda cm: cm.state == "mounted", host_id=host.id)
+        ]
+        return set(hosts_in_contact(candidates))
+
     def description(self):
         return "Unmount associated Lustre filesystem(s) on host %s" % self.host
 
@@ -221,7 +221,7 @@ class Copytool(StatefulObject):
         if not state:
             state = self.state
 
-        client_mount = ObjectCache.get_one(LustreClientMount, lambda cm: cm.id == self.client_mount_id)
+        client_mount = ObjectCache.get_one(LustreClientMount, id=self.client_mount_id)
 
         deps = []
         if state == "started":
@@ -21,7 +21,7 @@ class CorosyncConfiguration(DeletableStatefulObject):
 
     host = models.OneToOneField("ManagedHost", related_name="_corosync_configuration", on_delete=CASCADE)
 
-    mcast_port = models.IntegerField(null=True)
+    mcast_port = models.IntegerField(null=True, db_index=True)
 
     # Up from the point of view of a peer in the corosync cluster for this node
     corosync_reported_up = models.BooleanField(
@@ -10,7 +10,7 @@ from collections import defaultdict
 
 from django.utils.timezone import now
 from django.db import models
-from django.db.models import CASCADE
+from django.db.models import CASCADE, Q
 from toolz import dicttoolz
 
 from chroma_core.lib.job import Step, DependAll
@@ -51,16 +51,39 @@ class Corosync2Configuration(CorosyncConfiguration):
         return "ConfigureCorosync2Job"
 
 
+class McastPortLocks(object):
+    """A lock per mcast port, created on first use.
+
+    Creating the locks is itself locked, so two nodes arriving together on a new port cannot each
+    end up holding a lock of their own.
+    """
+
+    def __init__(self):
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def __getitem__(self, mcast_port):
+        with self._locks_lock:
+            if mcast_port not in self._locks:
+                self._locks[mcast_port] = threading.RLock()
+
+            return self._locks[mcast_port]
+
+
 # Semaphore for operations so that when we configure corosync for each HA cluster we configure
-# one node at a time hence removing any race conditions.
-peer_mcast_ports_configuration_lock = defaultdict(lambda: threading.RLock())
+# one node at a time hence removing any race conditions. Only nodes sharing an mcast port serialize.
+peer_mcast_ports_configuration_lock = McastPortLocks()
 
 
 class AutoConfigureCorosyncStep(Step):
     idempotent = True
     database = True
     _pcs_password_length = 20
+
+    # fqdn -> mcast_port and its index mcast_port -> set(fqdn), kept in step under _peer_index_lock
     peer_mcast_ports = {}
+    mcast_port_peers = defaultdict(set)
+    _peer_index_lock = threading.Lock()
 
     def __init__(self, job, args, log_callback, console_callback, cancel_event):
         super(AutoConfigureCorosyncStep, self).__init__(job, args, log_callback, console_callback, cancel_event)
@@ -80,32 +103,60 @@ class AutoConfigureCorosyncStep(Step):
         :return: List of fqdns of the peers.
         """
 
-        # Need to keep in sync with the DB so update from the DB before anything else.
-        current_db_entries = {}
-        for corosync_configuration in Corosync2Configuration.objects.all():
-            current_db_entries[corosync_configuration.host.fqdn] = corosync_configuration.mcast_port
+        with cls._peer_index_lock:
+            remembered = set(cls.mcast_port_peers.get(mcast_port, ()))
 
-            if corosync_configuration.mcast_port is not None:
-                cls.peer_mcast_ports[corosync_configuration.host.fqdn] = corosync_configuration.mcast_port
+        # Need to keep in sync with the DB so update from the DB before anything else. Only the configurations
+        # on this port, and those we remember on it, can change the answer so only they are read.
+        live_ports, deleted_fqdns = cls._db_mcast_ports(mcast_port, remembered)
+
+        with cls._peer_index_lock:
+            for fqdn, port in live_ports.items():
+                if port is not None:
+                    cls._index_peer(fqdn, port)
 
-        # Now we need to remove any corosync configurations that have been deleted.
-        for corosync_configuration in Corosync2Configuration._base_manager.filter(not_deleted=None):
             # Only remove the entries that are not currently in the db - a host may be deleted and re-added
-            if corosync_configuration.host.fqdn not in current_db_entries:
-                cls.peer_mcast_ports.pop(corosync_configuration.host.fqdn, None)
+            for fqdn in deleted_fqdns - set(live_ports):
+                cls._unindex_peer(fqdn)
 
-        # Do this at the end because this could be different from the DB if this is an update.
-        cls.peer_mcast_ports[new_fqdn] = mcast_port
+            # Do this at the end because this could be different from the DB if this is an update.
+            cls._index_peer(new_fqdn, mcast_port)
 
-        # Return list of peers, but peers do not include ourselves.
-        peers = [
-            match_fqdn
-            for match_fqdn, match_mcast_port in cls.peer_mcast_ports.items()
-            if match_mcast_port == mcast_port
-        ]
-        peers.remove(new_fqdn)
+            # Return list of peers, but peers do not include ourselves.
+            return sorted(cls.mcast_port_peers[mcast_port] - {new_fqdn})
 
-        return peers
+    @classmethod
+    def _db_mcast_ports(cls, mcast_port, fqdns):
+        """Read the corosync configurations on mcast_port, or of any of fqdns, in one query on the mcast_port index.
+
+        :return: ({fqdn: mcast_port} of the live configurations, set of fqdns with a deleted configuration)
+        """
+        live_ports = {}
+        deleted_fqdns = set()
+
+        for fqdn, port, not_deleted in Corosync2Configuration._base_manager.filter(
+            Q(mcast_port=mcast_port) | Q(host__fqdn__in=fqdns)
+        ).values_list("host__fqdn", "mcast_port", "not_deleted"):
+            if not_deleted:
+                live_ports[fqdn] = port
+            else:
+                deleted_fqdns.add(fqdn)
+
+        return live_ports, deleted_fqdns
+
+    @classmethod
+    def _index_peer(cls, fqdn, mcast_port):
+        cls._unindex_peer(fqdn)
+        cls.peer_mcast_ports[fqdn] = mcast_port
+        cls.mcast_port_peers[mcast_port].add(fqdn)
+
+    @classmethod
+    def _unindex_peer(cls, fqdn):
+        mcast_port = cls.peer_mcast_ports.pop(fqdn, None)
+        if mcast_port is not None:
+            cls.mcast_port_peers[mcast_port].discard(fqdn)
+            if not cls.mcast_port_peers[mcast_port]:
+                del cls.mcast_port_peers[mcast_port]
 
     def _masking_console_callback(self, subprocess_output):
         """
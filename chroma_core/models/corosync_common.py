@@ -85,6 +85,7 @@ class CorosyncNoPeersAlert(AlertStateBase):
     # This is worse than INFO because it *could* indicate that
     # networking is misconfigured..
     default_severity = logging.WARNING
+    raised_by_service = "corosync"
 
     def alert_message(self):
         return "Host %s no failover peers" % self.alert_item.host
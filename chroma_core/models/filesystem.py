@@ -131,7 +131,7 @@ class ManagedFilesystem(StatefulObject):
 
         deps = []
 
-        mgs = ObjectCache.get_one(ManagedTarget, lambda t: t.id == self.mgs_id)
+        mgs = ObjectCache.get_one(ManagedTarget, id=self.mgs_id)
 
         remove_state = "forgotten" if self.immutable_state else "removed"
 
@@ -219,7 +219,7 @@ class RemoveFilesystemJob(StateChangeJob):
         if ticket:
             deps.append(DependOn(ticket, "revoked", fix_state="unavailable"))
 
-        mgs_target = ObjectCache.get_one(ManagedTarget, lambda t: t.id == self.filesystem.mgs_id)
+        mgs_target = ObjectCache.get_one(ManagedTarget, id=self.filesystem.mgs_id)
 
         # Can't start a MGT that hasn't made it past formatting.
         if mgs_target.state not in ["unformatted", "formatted"]:
@@ -229,7 +229,7 @@ class RemoveFilesystemJob(StateChangeJob):
     def get_steps(self):
         steps = []
 
-        mgs_target = ObjectCache.get_one(ManagedTarget, lambda t: t.id == self.filesystem.mgs_id)
+        mgs_target = ObjectCache.get_one(ManagedTarget, id=self.filesystem.mgs_id)
 
         # Only try to purge filesystem from MGT if the MGT has made it past
         # being formatted (case where a filesystem was created but is being
@@ -3,29 +3,81 @@
 # license that can be found in the LICENSE file.
 
 
+import threading
+
+from django.db.models import Count, Max
 from networkx import Graph, find_cliques
 from chroma_core.models.host import ManagedHost
 
 
+class HaClusterTopology(object):
+    """The HA clusters as lists of host ids, with an index of the first cluster each host is in.
+
+    Built from the peer relationships of not-deleted hosts, and stamped with the version of
+    those relationships (see current_version()) that it was built from.
+    """
+
+    def __init__(self, version, clusters):
+        self.version = version
+        self.clusters = clusters
+
+        self.cluster_by_host_id = {}
+        for cluster in clusters:
+            for host_id in cluster:
+                self.cluster_by_host_id.setdefault(host_id, cluster)
+
+    @staticmethod
+    def current_version():
+        """Changes whenever a peer relationship is added or removed, or a host is deleted: rows of
+        the peers table only ever get new ids, and deleting a host removes it from the hosts counted"""
+
+        peers = ManagedHost.ha_cluster_peers.through.objects.aggregate(count=Count("id"), last=Max("id"))
+        hosts = ManagedHost.objects.aggregate(count=Count("id"), last=Max("id"))
+
+        return peers["count"], peers["last"], hosts["count"], hosts["last"]
+
+    @classmethod
+    def build(cls, version):
+        graph = Graph()
+        graph.add_edges_from(
+            ManagedHost.ha_cluster_peers.through.objects.filter(
+                from_managedhost__not_deleted=True, to_managedhost__not_deleted=True
+            ).values_list("from_managedhost_id", "to_managedhost_id")
+        )
+
+        return cls(version, list(find_cliques(graph)))
+
+
 class HaCluster(object):
+    _topology = None
+    _topology_lock = threading.Lock()
+
+    @classmethod
+    def topology(cls):
+        """The current HaClusterTopology, rebuilt only when the peer relationships have changed"""
+        version = HaClusterTopology.current_version()
+
+        with cls._topology_lock:
+            if cls._topology is None or cls._topology.version != version:
+                cls._topology = HaClusterTopology.build(version)
+
+            return cls._topology
+
     @classmethod
     def all_clusters(cls):
-        graph = Graph()
-        for edges in [[(h, p) for p in h.ha_cluster_peers.all()] for h in ManagedHost.objects.all()]:
-            graph.add_edges_from(edges)
+        clusters = cls.topology().clusters
+        hosts = ManagedHost.objects.in_bulk(set(host_id for cluster in clusters for host_id in cluster))
 
-        clusters = []
-        for cluster_peers in find_cliques(graph):
-            clusters.append(cls(cluster_peers))
-        return clusters
+        return [cls([hosts[host_id] for host_id in cluster if host_id in hosts]) for cluster in clusters]
 
     @classmethod
     def host_peers(cls, host):
-        for clusters in cls.all_clusters():
-            if host in clusters.peers:
-                return clusters.peers
+        peer_ids = cls.topology().cluster_by_host_id.get(host.id)
+        if peer_ids is None:
+            return []
 
-        return []
+        hosts = ManagedHost.objects.in_bulk(peer_ids)
+        return [hosts[host_id] for host_id in peer_ids if host_id in hosts]
 
     def __init__(self, peer_list):
         self.peer_list = peer_list
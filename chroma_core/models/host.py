@@ -19,6 +19,8 @@ from django.utils.timezone import now as tznow
 from django.db.models.aggregates import Aggregate, Count
 
 from django.db.models.query_utils import Q
+from django.db.models import prefetch_related_objects
+from django.contrib.contenttypes.models import ContentType
 
 from chroma_core.lib.cache import ObjectCache
 from chroma_core.models import StateChangeJob
@@ -264,6 +266,26 @@ class ManagedHost(DeletableStatefulObject):
                     # If the hosts with this NID had different FQDNs, refuse to pick one
                     raise ManagedHost.MultipleObjectsReturned()
 
+    @classmethod
+    def get_hosts_by_nid(cls):
+        """Resolve every NID on a not-deleted host in one query, for callers with many NIDs to resolve.
+
+        :return: dict of {(nid address, lnd type): ManagedHost}, where the host is None for a NID
+                 that get_by_nid would refuse to resolve because several hosts have it.
+        """
+
+        from chroma_core.models import NetworkInterface
+
+        hosts_by_nid = {}
+        for interface in NetworkInterface.objects.filter(host__not_deleted=True).select_related("host"):
+            key = (interface.inet4_address, interface.type)
+            if key not in hosts_by_nid:
+                hosts_by_nid[key] = interface.host
+            elif hosts_by_nid[key] is not None and hosts_by_nid[key].id != interface.host.id:
+                hosts_by_nid[key] = None
+
+        return hosts_by_nid
+
     def set_profile(self, server_profile_id):
         """
         Set the profile for the given host to the given profile. If the host is configured
@@ -1331,6 +1353,31 @@ You should only perform this command if this server is permanently unavailable,
 successfully deployed using Integrated Manager for Lustre software."""
 
 
+def hosts_in_contact(hosts):
+    """The hosts without an active HostOfflineAlert or HostContactAlert, looked up in one query"""
+    if not hosts:
+        return []
+
+    out_of_contact = set(
+        AlertState.objects.filter(
+            active=True,
+            alert_type__in=[HostOfflineAlert.__name__, HostContactAlert.__name__],
+            alert_item_type=ContentType.objects.get_for_model(ManagedHost),
+            alert_item_id__in=[host.id for host in hosts],
+        ).values_list("alert_item_id", flat=True)
+    )
+
+    return [host for host in hosts if host.id not in out_of_contact]
+
+
+def _managed_hosts_in_contact(hosts):
+    prefetch_related_objects(hosts, "server_profile")
+
+    return hosts_in_contact(
+        [host for host in hosts if host.is_managed and host.state not in ["removed", "undeployed", "unconfigured"]]
+    )
+
+
 class RebootHostJob(AdvertisedJob):
     host = models.ForeignKey(ManagedHost, on_delete=CASCADE)
 
@@ -1365,6 +1412,10 @@ class RebootHostJob(AdvertisedJob):
             .exists()
         )
 
+    @classmethod
+    def can_run_many(cls, hosts):
+        return set(_managed_hosts_in_contact(hosts))
+
     def description(self):
         return "Initiate a reboot on host %s" % self.host
 
@@ -1420,6 +1471,10 @@ class ShutdownHostJob(AdvertisedJob):
             .exists()
         )
 
+    @classmethod
+    def can_run_many(cls, hosts):
+        return set(_managed_hosts_in_contact(hosts))
+
     def description(self):
         return "Initiate an orderly shutdown on host %s" % self.host
 
@@ -1746,6 +1801,7 @@ class HostContactAlert(AlertStateBase):
     # * Host can be offline entirely but filesystem remains available
     #   if failover servers are available.
     default_severity = logging.WARNING
+    raised_by_service = "http_agent"
 
     class Meta:
         app_label = "chroma_core"
@@ -1783,6 +1839,7 @@ class HostOfflineAlert(AlertStateBase):
     # * Host can be offline but filesystem remains available
     #   if failover servers are available.
     default_severity = logging.WARNING
+    raised_by_service = "corosync"
 
     class Meta:
         app_label = "chroma_core"
@@ -397,6 +397,12 @@ class Job(models.Model):
         """Return True if this Job can be run on the given instance"""
         return True
 
+    @classmethod
+    def can_run_many(cls, instances):
+        """Return the set of instances this Job can be run on.  Jobs whose can_run
+        queries the DB override this to answer for all the instances at once."""
+        return set(instance for instance in instances if cls.can_run(instance))
+
     def get_deps(self):
         return DependAll()
 
@@ -64,16 +64,19 @@ class LogMessage(models.Model):
     message = models.TextField()
     message_class = models.SmallIntegerField()
 
+    # Optional kernel timestamp, then the Lustre prefix.  LustreError is tried before Lustre.
+    _message_class_re = re.compile("(\[[\d\.]*\])? ?(LustreError|Lustre):")
+
     @classmethod
     def get_message_class(cls, message):
-        log_match = "(\[[\d\.]*\])? ?%s:"
+        match = cls._message_class_re.match(message)
 
-        if re.match(log_match % "LustreError", message):
+        if match is None:
+            return MessageClass.NORMAL
+        elif match.group(2) == "LustreError":
             return MessageClass.LUSTRE_ERROR
-        elif re.match(log_match % "Lustre", message):
-            return MessageClass.LUSTRE
         else:
-            return MessageClass.NORMAL
+            return MessageClass.LUSTRE
 
     def __str__(self):
         return "%s %s %s %s %s %s" % (self.datetime, self.fqdn, self.severity, self.facility, self.tag, self.message)
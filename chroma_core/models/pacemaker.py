@@ -66,6 +66,7 @@ class PacemakerConfiguration(DeletableStatefulObject):
 
 class StonithNotEnabledAlert(AlertStateBase):
     default_severity = logging.ERROR
+    raised_by_service = "corosync"
 
     class Meta:
         app_label = "chroma_core"
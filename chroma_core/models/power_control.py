@@ -4,6 +4,7 @@
 
 
 import logging
+from collections import defaultdict
 
 import settings
 from django.db import models
@@ -167,6 +168,7 @@ class PowerControlDeviceUnavailableAlert(AlertStateBase):
     # may be unable to participate in a failover operation, resulting
     # in a reduced level of filesystem availability.
     default_severity = logging.WARNING
+    raised_by_service = "power_control"
 
     class Meta:
         app_label = "chroma_core"
@@ -190,6 +192,7 @@ class IpmiBmcUnavailableAlert(AlertStateBase):
     # may be unable to participate in a failover operation, resulting
     # in a reduced level of filesystem availability.
     default_severity = logging.WARNING
+    raised_by_service = "power_control"
 
     class Meta:
         app_label = "chroma_core"
@@ -440,6 +443,17 @@ class PowerControlDeviceOutlet(DeletablePowerControlModel):
         unique_together = ("device", "identifier")
 
 
+def _outlet_power_states(hosts):
+    """{host id: [has_power of each of its outlets]} for hosts, looked up in one query"""
+    states = defaultdict(list)
+    for host_id, has_power in PowerControlDeviceOutlet.objects.filter(host__in=[host.id for host in hosts]).values_list(
+        "host_id", "has_power"
+    ):
+        states[host_id].append(has_power)
+
+    return states
+
+
 class PoweronHostJob(AdvertisedJob):
     host = models.ForeignKey(ManagedHost, on_delete=CASCADE)
     requires_confirmation = True
@@ -462,14 +476,23 @@ class PoweronHostJob(AdvertisedJob):
         if host.immutable_state:
             return False
 
+        return cls._can_power_on([o.has_power for o in host.outlets.all()])
+
+    @classmethod
+    def can_run_many(cls, hosts):
+        states = _outlet_power_states(hosts)
+        return set(host for host in hosts if not host.immutable_state and cls._can_power_on(states[host.id]))
+
+    @staticmethod
+    def _can_power_on(outlet_states):
         # We should only be able to issue a Poweron if:
         # 1. The host is associated with >= 1 outlet
         # 2. At least one associated outlet is in a known state (On or Off)
         # 3. None of the associated outlets are On
         return (
-            host.outlets.count()
-            and any([True if o.has_power in [True, False] else False for o in host.outlets.all()])
-            and not any([o.has_power for o in host.outlets.all()])
+            len(outlet_states) > 0
+            and any([True if has_power in [True, False] else False for has_power in outlet_states])
+            and not any(outlet_states)
         )
 
     @classmethod
@@ -509,14 +532,23 @@ class PoweroffHostJob(AdvertisedJob):
         if host.immutable_state:
             return False
 
+        return cls._can_power_off([o.has_power for o in host.outlets.all()])
+
+    @classmethod
+    def can_run_many(cls, hosts):
+        states = _outlet_power_states(hosts)
+        return set(host for host in hosts if not host.immutable_state and cls._can_power_off(states[host.id]))
+
+    @staticmethod
+    def _can_power_off(outlet_states):
         # We should only be able to issue a Poweroff if:
         # 1. The host is associated with >= 1 outlet
         # 2. All associated outlets are in a known state (On or Off)
         # 3. At least one of the associated outlets is On
         return (
-            host.outlets.count()
-            and all([True if o.has_power in [True, False] else False for o in host.outlets.all()])
-            and any([o.has_power for o in host.outlets.all()])
+            len(outlet_states) > 0
+            and all([True if has_power in [True, False] else False for has_power in outlet_states])
+            and any(outlet_states)
         )
 
     @classmethod
@@ -563,6 +595,11 @@ class PowercycleHostJob(AdvertisedJob):
         # switched On, so we can rely on this to get into a known state.
         return host.outlets.count() > 0
 
+    @classmethod
+    def can_run_many(cls, hosts):
+        states = _outlet_power_states(hosts)
+        return set(host for host in hosts if not host.immutable_state and len(states[host.id]) > 0)
+
     @classmethod
     def long_description(cls, stateful_object):
         return help_text["powercycle_host"]
@@ -45,8 +45,26 @@ class StepResult(models.Model):
 
     result = models.TextField(null=True, help_text="Arbitrary result data.")
 
+    # Output streams which are appended to as StepResultChunks while the step runs
+    OUTPUT_STREAMS = ("log", "console")
+
     _step_types = {}
 
+    def assembled(self, stream):
+        """
+        The `log` or `console` of this step, including any chunks appended since the
+        step completed, or all of them while it is still running.  Use
+        prefetch_related("chunks") when assembling many steps.
+        """
+        return getattr(self, stream) + "".join(c.text for c in self.chunks.all() if c.stream == stream)
+
+    def fold_chunks(self):
+        """Move appended chunks into the `log` and `console` fields, the caller saves this StepResult"""
+        chunks = list(self.chunks.order_by("id"))
+        for stream in self.OUTPUT_STREAMS:
+            setattr(self, stream, getattr(self, stream) + "".join(c.text for c in chunks if c.stream == stream))
+        StepResultChunk.objects.filter(id__in=[c.id for c in chunks]).delete()
+
     @property
     def step_class(self):
         """
@@ -89,3 +107,19 @@ class StepResult(models.Model):
     class Meta:
         app_label = "chroma_core"
         ordering = ["id"]
+
+
+class StepResultChunk(models.Model):
+    """
+    A piece of the log or console output of a running step.  Output is appended as
+    chunks so that a chatty step doesn't rewrite its whole StepResult each time, and
+    is folded into the StepResult when the step completes.
+    """
+
+    step_result = models.ForeignKey("StepResult", related_name="chunks", on_delete=CASCADE)
+    stream = models.CharField(max_length=8, choices=[(s, s) for s in StepResult.OUTPUT_STREAMS])
+    text = models.TextField()
+
+    class Meta:
+        app_label = "chroma_core"
+        ordering = ["id"]
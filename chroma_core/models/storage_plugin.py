@@ -161,21 +161,47 @@ class StorageResourceRecord(models.Model):
             yield (i.key, i.value)
 
     def to_resource(self):
+        return StorageResourceRecord.to_resources([self])[0]
+
+    @classmethod
+    def to_resources(cls, records):
+        """Hydrate the BaseStorageResource instances for a list of records, in the same order.
+
+        Attributes are loaded with one query per attribute model for all the records
+        together, rather than per record.
+        """
         from chroma_core.lib.storage_plugin.manager import storage_plugin_manager
 
-        klass = storage_plugin_manager.get_resource_class_by_id(self.resource_class_id)
-        attr_model_to_keys = defaultdict(list)
-        for attr, attr_props in klass._meta.storage_attributes.items():
-            attr_model_to_keys[attr_props.model_class].append(attr)
-        storage_dict = {}
-        for attr_model, keys in attr_model_to_keys.items():
-            for attr in attr_model.objects.filter(resource=self, key__in=keys):
-                storage_dict[attr.key] = attr_model.decode(attr.value)
+        klasses = {}
+        attr_model_to_keys = defaultdict(set)
+        for record in records:
+            klass = storage_plugin_manager.get_resource_class_by_id(record.resource_class_id)
+            klasses[record.id] = klass
+            for attr, attr_props in klass._meta.storage_attributes.items():
+                attr_model_to_keys[attr_props.model_class].add(attr)
 
-        resource = klass(**storage_dict)
-        resource._handle = self.id
-        resource._handle_global = True
-        return resource
+        storage_dicts = defaultdict(dict)
+        for attr_model, keys in attr_model_to_keys.items():
+            attrs = []
+            stored = attr_model.objects.filter(resource_id__in=klasses.keys(), key__in=keys)
+            for resource_id, key, value in stored.values_list("resource_id", "key", "value"):
+                # Only the keys stored in this model for this record's class, as another class
+                # may have an attribute of the same name
+                attr_props = klasses[resource_id]._meta.storage_attributes.get(key)
+                if attr_props is not None and attr_props.model_class is attr_model:
+                    attrs.append((resource_id, key, value))
+
+            decoded = attr_model.decode_many([value for _, _, value in attrs])
+            for (resource_id, key, _), value in zip(attrs, decoded):
+                storage_dicts[resource_id][key] = value
+
+        resources = []
+        for record in records:
+            resource = klasses[record.id](**storage_dicts[record.id])
+            resource._handle = record.id
+            resource._handle_global = True
+            resources.append(resource)
+        return resources
 
     def alias_or_name(self, resource=None):
         if self.alias:
@@ -212,6 +238,11 @@ class StorageResourceAttribute(models.Model):
     def decode(cls, value):
         return value
 
+    @classmethod
+    def decode_many(cls, values):
+        """Decode a list of stored values, as loaded by values_list"""
+        return [cls.decode(value) for value in values]
+
     resource = models.ForeignKey(StorageResourceRecord, on_delete=CASCADE)
     # TODO: normalize this field (store a list of attributes
     # with StorageResourceClass, that list would also be useful
@@ -266,6 +297,13 @@ class StorageResourceAttributeReference(StorageResourceAttribute):
         else:
             return None
 
+    @classmethod
+    def decode_many(cls, values):
+        # values_list gives us the referenced record ids: hydrate them together
+        records = StorageResourceRecord.objects.in_bulk([value for value in values if value])
+        resources = dict(zip(records.keys(), StorageResourceRecord.to_resources(records.values())))
+        return [resources.get(value) for value in values]
+
 
 class StorageResourceOffline(AlertStateBase):
     # Inability to contact a storage controller
@@ -149,9 +149,7 @@ class ManagedTarget(StatefulObject):
 
         try:
             job_log.debug("Started %s on %s" % (self.ha_label, started_on))
-            target_mount = ObjectCache.get_one(
-                ManagedTargetMount, lambda mtm: mtm.target_id == self.id and mtm.host_id == started_on.id
-            )
+            target_mount = ObjectCache.get_one(ManagedTargetMount, target_id=self.id, host_id=started_on.id)
             self.active_mount = target_mount
         except ManagedTargetMount.DoesNotExist:
             job_log.error(
@@ -228,7 +226,7 @@ class ManagedTarget(StatefulObject):
         """
         :return: A host which is available for actions, preferably the primary.
         """
-        mounts = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target.id == self.id)
+        mounts = ObjectCache.get(ManagedTargetMount, target_id=self.id)
         for mount in sorted(mounts, lambda a, b: cmp(b.primary, a.primary)):
             if HostContactAlert.filter_by_item(mount.host).count() == 0:
                 return mount.host
@@ -272,7 +270,7 @@ class ManagedTarget(StatefulObject):
             # Depend on the active mount's host having LNet up, so that if
             # LNet is stopped on that host this target will be stopped first.
             target_mount = self.active_mount
-            host = ObjectCache.get_one(ManagedHost, lambda mh: mh.id == target_mount.host_id)
+            host = ObjectCache.get_one(ManagedHost, id=target_mount.host_id)
 
             lnet_configuration = ObjectCache.get_by_id(LNetConfiguration, host.lnet_configuration.id)
             deps.append(DependOn(lnet_configuration, "lnet_up", fix_state="unmounted"))
@@ -302,7 +300,7 @@ class ManagedTarget(StatefulObject):
         if state not in ["removed", "forgotten"]:
             from chroma_core.models import LNetConfiguration
 
-            target_mounts = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == self.id)
+            target_mounts = ObjectCache.get(ManagedTargetMount, target_id=self.id)
             for tm in target_mounts:
                 host = ObjectCache.get_by_id(ManagedHost, tm.host_id)
                 fix_state = "forgotten" if self.immutable_state else "removed"
@@ -722,7 +720,7 @@ class RemoveTargetJob(StateChangeJob):
         return True
 
     def on_success(self):
-        mounts = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target.id == self.target.id)
+        mounts = ObjectCache.get(ManagedTargetMount, target_id=self.target.id)
 
         _delete_target(self.target)
 
@@ -767,7 +765,7 @@ class ForgetTargetJob(StateChangeJob):
         return DependAll(deps)
 
     def on_success(self):
-        mounts = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target.id == self.target.id)
+        mounts = ObjectCache.get(ManagedTargetMount, target_id=self.target.id)
 
         _delete_target(self.target)
 
@@ -1114,9 +1112,7 @@ class ConfigureTargetJob(StateChangeJob):
     def get_deps(self):
         deps = []
 
-        prim_mtm = ObjectCache.get_one(
-            ManagedTargetMount, lambda mtm: mtm.primary is True and mtm.target_id == self.target.id
-        )
+        prim_mtm = ObjectCache.get_one(ManagedTargetMount, target_id=self.target.id, primary=True)
         deps.append(DependOn(prim_mtm.host.lnet_configuration, "lnet_up"))
 
         for target_mount in self.target.managedtargetmount_set.all().order_by("-primary"):
@@ -1189,19 +1185,19 @@ class RegisterTargetJob(StateChangeJob):
         deps.append(DependOn(ObjectCache.target_primary_server(self.target).lnet_configuration, "lnet_up"))
 
         if issubclass(self.target.downcast_class, FilesystemMember):
-            # FIXME: spurious downcast, should cache filesystem associaton in objectcache
-            mgs = ObjectCache.get_by_id(ManagedTarget, self.target.downcast().filesystem.mgs_id)
+            from chroma_core.models import ManagedFilesystem
+
+            filesystem_id = ObjectCache.target_filesystem_id(self.target)
+            mgs = ObjectCache.get_by_id(ManagedTarget, ObjectCache.get_by_id(ManagedFilesystem, filesystem_id).mgs_id)
 
             deps.append(DependOn(mgs, "mounted"))
 
         if issubclass(self.target.downcast_class, ManagedOst):
-            # FIXME: spurious downcast, should cache filesystem associaton in objectcache
-            filesystem_id = self.target.downcast().filesystem_id
-            mdts = ObjectCache.get(
-                ManagedTarget,
-                lambda target: issubclass(target.downcast_class, ManagedMdt)
-                and target.downcast().filesystem_id == filesystem_id,
-            )
+            mdts = [
+                target
+                for target in ObjectCache.get_targets_by_filesystem(filesystem_id)
+                if issubclass(target.downcast_class, ManagedMdt)
+            ]
 
             for mdt in mdts:
                 deps.append(DependOn(mdt, "mounted"))
@@ -1252,17 +1248,15 @@ class StartTargetJob(StateChangeJob):
 
         deps = []
         # Depend on at least one targetmount having lnet up
-        mtms = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == self.target_id)
+        mtms = ObjectCache.get(ManagedTargetMount, target_id=self.target_id)
         for target_mount in mtms:
             from chroma_core.models import LNetConfiguration
 
-            lnet_configuration = ObjectCache.get_one(LNetConfiguration, lambda l: l.host_id == target_mount.host_id)
+            lnet_configuration = ObjectCache.get_one(LNetConfiguration, host_id=target_mount.host_id)
             deps.append(DependOn(lnet_configuration, "lnet_up", fix_state="unmounted"))
 
             try:
-                pacemaker_configuration = ObjectCache.get_one(
-                    PacemakerConfiguration, lambda pm: pm.host_id == target_mount.host_id
-                )
+                pacemaker_configuration = ObjectCache.get_one(PacemakerConfiguration, host_id=target_mount.host_id)
                 deps.append(DependOn(pacemaker_configuration, "started", fix_state="unmounted"))
             except PacemakerConfiguration.DoesNotExist:
                 pass
@@ -1525,7 +1519,7 @@ class FormatTargetJob(StateChangeJob):
         deps = []
 
         hosts = set()
-        for tm in ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == self.target_id):
+        for tm in ObjectCache.get(ManagedTargetMount, target_id=self.target_id):
             hosts.add(tm.host)
 
         for host in hosts:
@@ -1538,7 +1532,7 @@ class FormatTargetJob(StateChangeJob):
             mgt_id = filesystem.mgs_id
 
             mgs_hosts = set()
-            for tm in ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == mgt_id):
+            for tm in ObjectCache.get(ManagedTargetMount, target_id=mgt_id):
                 mgs_hosts.add(tm.host)
 
             for host in mgs_hosts:
@@ -1897,6 +1891,7 @@ class TargetRecoveryAlert(AlertStateBase):
     # from clients may block until recovery completes, effectively degrading performance.
     # Therefore it's WARNING.
     default_severity = logging.WARNING
+    raised_by_service = "lustre_audit"
 
     def alert_message(self):
         return "Target %s in recovery" % self.alert_item
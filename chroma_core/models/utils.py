@@ -75,6 +75,7 @@ def _make_deletable(metaclass, dct):
             from chroma_core.models.alert import AlertState
 
             updated = AlertState.filter_by_item_id(self.__class__, self.id).update(active=None)
+            AlertState.active_index.invalidate()
             job_log.info("Lowered %d alerts while deleting %s %s" % (updated, self.__class__, self.id))
 
         signals.post_delete.send(sender=self.__class__, instance=self)
@@ -306,7 +306,7 @@ class Linux(Plugin):
 
             # Create ScsiDevices
             res_by_serial = {}
-            scsi_device_identifiers = []
+            scsi_device_identifiers = set()
 
             for bdev in devices["devs"].values():
                 serial = preferred_serial(bdev)
@@ -318,7 +318,7 @@ class Linux(Plugin):
                             ScsiDevice, serial=serial, size=bdev["size"], filesystem_type=bdev["filesystem_type"]
                         )
                         res_by_serial[serial] = node
-                        scsi_device_identifiers.append(node.id_tuple())
+                        scsi_device_identifiers.add(node.id_tuple())
 
             # Map major:minor string to LinuxDeviceNode
             self.major_minor_to_node_resource = {}
@@ -448,7 +448,7 @@ class Linux(Plugin):
                     self.update_or_create(LocalMount, parents=[bdev_resource], mount_point=mntpnt, fstype=fstype)
 
             # Create Partitions (devices that have 'parent' set)
-            partition_identifiers = []
+            partition_identifiers = set()
 
             for bdev in [x for x in devices["devs"].values() if x["parent"]]:
                 this_node = self.major_minor_to_node_resource[bdev["major_minor"]]
@@ -470,7 +470,7 @@ class Linux(Plugin):
                 )
 
                 this_node.add_parent(partition)
-                partition_identifiers.append(partition.id_tuple())
+                partition_identifiers.add(partition.id_tuple())
 
             # Finally remove any of the partitions that are no longer present.
             initiate_device_poll |= self.remove_missing_devices(host_id, Partition, partition_identifiers)
@@ -501,7 +501,7 @@ class Linux(Plugin):
         self, devices, host_id, device_type, klass, attributes_list, reported_device_node_paths
     ):
         resources_changed = False
-        device_identifiers = []
+        device_identifiers = set()
 
         for device_uuid, device_info in devices[device_type].items():
             block_device = devices["devs"][device_info["block_device"]]
@@ -526,7 +526,7 @@ class Linux(Plugin):
             )
 
             reported_device_node_paths.append(device_info["path"])
-            device_identifiers.append(device_res.id_tuple())
+            device_identifiers.add(device_res.id_tuple())
 
             for drive_bd in device_info["drives"]:
                 drive_res = self.major_minor_to_node_resource[drive_bd]
@@ -10,9 +10,15 @@ This lib provide useful features related to the database.
 """
 
 import os
+import threading
 import traceback
+from contextlib import contextmanager
 
-from django.db import transaction, close_old_connections
+from django.db import transaction, close_old_connections, connections, DEFAULT_DB_ALIAS
+
+from chroma_core.services.log import log_register
+
+log = log_register(__name__)
 
 
 def exit_if_in_transaction(log):
@@ -23,3 +29,111 @@ def exit_if_in_transaction(log):
 
         log.error("Tried to cross a process boundary while in a transaction: {}".format(stack))
         os._exit(-1)
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of persistent database connections, shared by a population of
+    threads which dip into the database and out again (job steps, RPC handlers).
+
+    check_out() hands the calling thread's django connection one of the pool's idle
+    connections, once it has checked that it still works, or leaves django to open a
+    new one when none are idle.  check_in() takes the connection back for the next
+    thread, unless it was left in a transaction or has failed, when it is closed.
+
+    At most `max_connections` are checked out at once, `reserved` of which are kept
+    for check_out(priority=True) so that a key thread is never starved by the rest.
+    """
+
+    def __init__(self, max_connections, reserved=0, alias=DEFAULT_DB_ALIAS):
+        self.max_connections = max_connections
+        self.reserved = reserved
+        self._alias = alias
+
+        self._cond = threading.Condition(threading.Lock())
+        self._checked_out = 0
+        self._idle = []
+
+    def check_out(self, priority=False):
+        limit = self.max_connections if priority else self.max_connections - self.reserved
+        with self._cond:
+            while self._checked_out >= limit:
+                self._cond.wait()
+            self._checked_out += 1
+
+        wrapper = connections[self._alias]
+        while True:
+            with self._cond:
+                raw = self._idle.pop() if self._idle else None
+
+            if raw is None:
+                # Django connects when the connection is first used
+                wrapper.connection = None
+                return
+
+            self._attach(wrapper, raw)
+            if wrapper.is_usable():
+                return
+
+            log.info("ConnectionPool: discarding unusable database connection")
+            self._close(raw)
+
+    def check_in(self):
+        wrapper = connections[self._alias]
+        raw = wrapper.connection
+        if raw is not None and not self._reusable(wrapper):
+            self._close(raw)
+            raw = None
+        wrapper.connection = None
+
+        with self._cond:
+            if raw is not None:
+                self._idle.append(raw)
+            self._checked_out -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def connection(self, priority=False):
+        self.check_out(priority)
+        try:
+            yield
+        finally:
+            self.check_in()
+
+    def close_idle(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for raw in idle:
+            self._close(raw)
+
+    @property
+    def idle_count(self):
+        with self._cond:
+            return len(self._idle)
+
+    def _attach(self, wrapper, raw):
+        """Give `wrapper` the pooled connection `raw`, resetting the state django keeps about it"""
+        wrapper.connection = raw
+        wrapper.autocommit = wrapper.settings_dict["AUTOCOMMIT"]
+        wrapper.in_atomic_block = False
+        wrapper.savepoint_ids = []
+        wrapper.needs_rollback = False
+        wrapper.closed_in_transaction = False
+        wrapper.errors_occurred = False
+        wrapper.close_at = None
+        wrapper.run_on_commit = []
+
+    def _reusable(self, wrapper):
+        if wrapper.in_atomic_block or wrapper.get_autocommit() != wrapper.settings_dict["AUTOCOMMIT"]:
+            log.warning("ConnectionPool: closing database connection left in a transaction")
+            return False
+        elif wrapper.errors_occurred:
+            return wrapper.is_usable()
+        else:
+            return True
+
+    def _close(self, raw):
+        try:
+            raw.close()
+        except Exception as e:
+            log.debug("ConnectionPool: error closing database connection: %s" % e)
@@ -26,7 +26,7 @@ log = log_register(__name__)
 
 
 class HttpAgentRpc(ServiceRpcInterface):
-    methods = ["reset_session", "remove_host", "reset_plugin_sessions"]
+    methods = ["reset_session", "remove_host", "reset_plugin_sessions", "get_rx_stats"]
 
 
 # TODO: interesting tests:
@@ -44,6 +44,9 @@ class Service(ChromaService):
     def reset_plugin_sessions(self, plugin):
         return self.sessions.reset_plugin_sessions(plugin)
 
+    def get_rx_stats(self):
+        return self.amqp_rx_forwarder.stats()
+
     def remove_host(self, fqdn):
         log.info("remove_host: %s" % fqdn)
 
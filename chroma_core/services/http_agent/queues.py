@@ -5,8 +5,10 @@
 
 import Queue
 import threading
-from chroma_core.services import _amqp_connection, log_register
-from chroma_core.services.queue import ServiceQueue
+import time
+from collections import OrderedDict, deque
+from chroma_core.services import log_register
+from chroma_core.services.queue import ServiceQueue, AgentRxQueue
 
 
 class AgentTxQueue(ServiceQueue):
@@ -47,37 +49,128 @@ class HostQueueCollection(object):
         self.plugin_rx_queue.put(message)
 
 
+def _tx_queue():
+    """
+    When the http_agent runs under gevent, long-polling GETs wait on a gevent queue: its
+    timed get parks the greenlet on the hub, where Queue.Queue polls with sleeps, so many
+    idle agents cost nothing until a message arrives or the poll times out.
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return Queue.Queue()
+
+    if monkey.is_module_patched("threading"):
+        import gevent.queue
+
+        return gevent.queue.Queue()
+    else:
+        return Queue.Queue()
+
+
 class HostQueues(object):
     """Outgoing messages for a single host"""
 
     def __init__(self, fqdn):
         self.fqdn = fqdn
-        self.tx = Queue.Queue()
+        self.tx = _tx_queue()
         self.tx_lock = threading.Lock()
+        # Messages taken from tx that did not fit in a response, sent
+        # ahead of tx by the next GET.  Only touched with tx_lock held.
+        self.tx_held = deque()
+
+    def get(self, block=True, timeout=None):
+        if self.tx_held:
+            return self.tx_held.popleft()
+        return self.tx.get(block=block, timeout=timeout)
+
+    def hold(self, message):
+        self.tx_held.appendleft(message)
 
 
 class AmqpRxForwarder(object):
+    """Forward messages from plugin_rx_queue to the AMQP queue for each plugin.
+
+    Each wakeup drains up to MAX_BATCH_SIZE messages and publishes them with
+    one producer checkout per plugin, using an AgentRxQueue cached per plugin.
+    """
+
+    MAX_BATCH_SIZE = 100
+    RATE_WINDOW = 60
+
     def __init__(self, queue_collection):
         self._stopping = threading.Event()
         self._queue_collection = queue_collection
+        self._rx_queues = {}
+
+        self._stats_lock = threading.Lock()
+        self._forwarded_count = 0
+        self._batch_count = 0
+        self._last_batch_size = 0
+        self._recent_batches = deque()  # (time, size) of batches forwarded within RATE_WINDOW
+
+    def _rx_queue(self, plugin_name):
+        try:
+            return self._rx_queues[plugin_name]
+        except KeyError:
+            queue = AgentRxQueue(plugin_name)
+            self._rx_queues[plugin_name] = queue
+            return queue
+
+    def _get_batch(self):
+        plugin_rx_queue = self._queue_collection.plugin_rx_queue
+
+        batch = [plugin_rx_queue.get(block=True, timeout=1)]
+        while len(batch) < self.MAX_BATCH_SIZE:
+            try:
+                batch.append(plugin_rx_queue.get_nowait())
+            except Queue.Empty:
+                break
+
+        return batch
+
+    def _forward(self, batch):
+        plugin_messages = OrderedDict()
+        for msg in batch:
+            plugin_messages.setdefault(msg["plugin"], []).append(msg)
+
+        for plugin_name, messages in plugin_messages.items():
+            self._rx_queue(plugin_name).put_many(messages)
+
+        now = time.time()
+        with self._stats_lock:
+            self._forwarded_count += len(batch)
+            self._batch_count += 1
+            self._last_batch_size = len(batch)
+            self._recent_batches.append((now, len(batch)))
+            self._expire_recent_batches(now)
+
+    def _expire_recent_batches(self, now):
+        while self._recent_batches and self._recent_batches[0][0] < now - self.RATE_WINDOW:
+            self._recent_batches.popleft()
+
+    def stats(self):
+        """Counters for monitoring: rates are averaged over the last RATE_WINDOW seconds"""
+        with self._stats_lock:
+            self._expire_recent_batches(time.time())
+            recent_messages = sum(size for _, size in self._recent_batches)
+            return {
+                "messages_forwarded": self._forwarded_count,
+                "batches_forwarded": self._batch_count,
+                "messages_per_second": float(recent_messages) / self.RATE_WINDOW,
+                "mean_batch_size": float(recent_messages) / len(self._recent_batches) if self._recent_batches else 0,
+                "last_batch_size": self._last_batch_size,
+                "queue_depth": self._queue_collection.plugin_rx_queue.qsize(),
+            }
 
     def run(self):
-        with _amqp_connection() as conn:
-            while not self._stopping.is_set():
-                try:
-                    msg = self._queue_collection.plugin_rx_queue.get(block=True, timeout=1)
-                except Queue.Empty:
-                    pass
-                else:
-                    plugin_name = msg["plugin"]
-                    rx_queue_name = "agent_%s_rx" % plugin_name
-                    q = conn.SimpleQueue(
-                        rx_queue_name,
-                        serializer="json",
-                        exchange_opts={"durable": False},
-                        queue_opts={"durable": False},
-                    )
-                    q.put(msg)
+        while not self._stopping.is_set():
+            try:
+                batch = self._get_batch()
+            except Queue.Empty:
+                pass
+            else:
+                self._forward(batch)
 
     def stop(self):
         self._stopping.set()
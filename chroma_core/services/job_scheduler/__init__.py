@@ -41,35 +41,46 @@ class QueueHandler(object):
 
     def on_message(self, message):
         try:
-            # Deserialize any datetimes which were serialized for JSON
-            deserialized_update_attrs = {}
-            model_klass = ContentType.objects.get_by_natural_key(*message["instance_natural_key"]).model_class()
-            for attr, value in message["update_attrs"].items():
+            notifications = []
+            for notification in message["notifications"]:
                 try:
-                    field = [f for f in model_klass._meta.fields if f.name == attr][0]
-                except IndexError:
-                    # e.g. _id names, they aren't datetimes so ignore them
-                    deserialized_update_attrs[attr] = value
-                else:
-                    if isinstance(field, DateTimeField):
-                        deserialized_update_attrs[attr] = IMLDateTime.parse(value)
-                    else:
-                        deserialized_update_attrs[attr] = value
-
-            log.debug("on_message: %s %s" % (message, deserialized_update_attrs))
-
-            self._job_scheduler.notify(
-                message["instance_natural_key"],
-                message["instance_id"],
-                message["time"],
-                deserialized_update_attrs,
-                message["from_states"],
-            )
+                    notifications.append(self._deserialize(notification))
+                except:
+                    # Log bad notifications and continue with the rest of the batch
+                    log.warning("on_message: bad notification: %s" % traceback.format_exc())
+
+            self._job_scheduler.notify_many(notifications)
         except:
             # Log bad messages and continue, swallow the exception to avoid
             # bringing down the whole service
             log.warning("on_message: bad message: %s" % traceback.format_exc())
 
+    def _deserialize(self, notification):
+        # Deserialize any datetimes which were serialized for JSON
+        deserialized_update_attrs = {}
+        model_klass = ContentType.objects.get_by_natural_key(*notification["instance_natural_key"]).model_class()
+        for attr, value in notification["update_attrs"].items():
+            try:
+                field = [f for f in model_klass._meta.fields if f.name == attr][0]
+            except IndexError:
+                # e.g. _id names, they aren't datetimes so ignore them
+                deserialized_update_attrs[attr] = value
+            else:
+                if isinstance(field, DateTimeField):
+                    deserialized_update_attrs[attr] = IMLDateTime.parse(value)
+                else:
+                    deserialized_update_attrs[attr] = value
+
+        log.debug("on_message: %s %s" % (notification, deserialized_update_attrs))
+
+        return (
+            notification["instance_natural_key"],
+            notification["instance_id"],
+            notification["time"],
+            deserialized_update_attrs,
+            notification["from_states"],
+        )
+
 
 class Service(ChromaService):
     def __init__(self):
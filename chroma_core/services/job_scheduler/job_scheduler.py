@@ -14,19 +14,22 @@ from django.core.exceptions import ObjectDoesNotExist
 import os
 import operator
 import itertools
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import Queue
 from copy import deepcopy
 from chroma_core.lib.util import all_subclasses
 from chroma_core.services import dbutils
+from chroma_core.services.dbutils import ConnectionPool
 
 
+from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction, DEFAULT_DB_ALIAS
+from django.db import transaction
 from django.db.models import Q, ManyToManyField
 from django.core.exceptions import FieldDoesNotExist
 import django.utils.timezone
 
+import settings
 from chroma_core.lib.cache import ObjectCache
 from chroma_core.lib.util import target_label_split
 from chroma_core.models.server_profile import ServerProfile
@@ -37,7 +40,7 @@ from chroma_core.models import ManagedMdt
 from chroma_core.models import FilesystemMember
 from chroma_core.models import ConfigureLNetJob
 from chroma_core.models import ManagedTarget, ApplyConfParams, ManagedOst, Job, DeletableStatefulObject
-from chroma_core.models import StepResult
+from chroma_core.models import StepResult, StepResultChunk
 from chroma_core.models import (
     ManagedMgs,
     ManagedFilesystem,
@@ -139,37 +142,6 @@ class NotificationBuffer(object):
         return trimmed_notifications
 
 
-class SimpleConnectionQuota(object):
-    """
-    This class provides a way to limit the total number of DB connections
-    used by a population of threads.
-
-    It is *not* a pool: the connections are destroyed and created every time.
-
-    It's for when threads need to briefly dip into a period of database access
-    before giving it up again.
-    """
-
-    def __init__(self, max_connections):
-        self._semaphore = threading.Semaphore(max_connections)
-        self.db_alias = DEFAULT_DB_ALIAS
-        self.database = django.db.connections.databases[self.db_alias]
-
-    def acquire(self):
-        self._semaphore.acquire()
-        if django.db.connection.connection == DISABLED_CONNECTION:
-            django.db.connection.connection = None
-        # connection = load_backend(self.database['ENGINE']).DatabaseWrapper(self.database, self.db_alias)
-        # return connection
-
-    def release(self, connection):
-        # Close the connection if present, and hand back our token
-        if django.db.connection.connection:
-            _disable_database()
-
-        self._semaphore.release()
-
-
 def _disable_database():
     if django.db.connection.connection is not None and django.db.connection.connection != DISABLED_CONNECTION:
         django.db.connection.close()
@@ -180,6 +152,10 @@ class JobProgress(threading.Thread, Queue.Queue):
     """
     A thread and a queue for handling progress/completion information
     from RunJobThread
+
+    Step log and console output is buffered and appended as StepResultChunks,
+    all running steps at once, when STEP_OUTPUT_FLUSH_INTERVAL has passed or
+    STEP_OUTPUT_FLUSH_BYTES have built up, and when a step completes.
     """
 
     def __init__(self, job_scheduler):
@@ -191,15 +167,38 @@ class JobProgress(threading.Thread, Queue.Queue):
         self._stopping = threading.Event()
         self._job_to_result = {}
 
+        # (job_id, stream) => [output strings], in the order they were first written
+        self._pending_output = OrderedDict()
+        self._pending_bytes = 0
+        self._pending_since = None
+
     def run(self):
         while not self._stopping.is_set():
             try:
-                self._handle(self.get(block=True, timeout=1))
+                msg = self.get(block=True, timeout=self._flush_timeout())
             except Queue.Empty:
-                pass
+                msg = None
+                if self._pending_since is None or self._flush_timeout() > 0:
+                    continue
+
+            # Only hold a database connection while there is work: handle everything
+            # that is waiting, and any output flush that has come due, on one connection
+            with self._job_scheduler._db_pool.connection(priority=True):
+                while msg is not None:
+                    self._handle(msg)
+                    try:
+                        msg = self.get_nowait()
+                    except Queue.Empty:
+                        msg = None
+
+                if self._pending_since is not None and self._flush_timeout() == 0:
+                    self._flush_output()
+
+        with self._job_scheduler._db_pool.connection(priority=True):
+            for msg in self.queue:
+                self._handle(msg)
 
-        for msg in self.queue:
-            self._handle(msg)
+            self._flush_output()
 
     def _handle(self, msg):
         fn = getattr(self, "_%s" % msg[0])
@@ -226,6 +225,35 @@ class JobProgress(threading.Thread, Queue.Queue):
 
             return getter
 
+    def _flush_timeout(self):
+        if self._pending_since is None:
+            return 1
+        return max(0, min(1, self._pending_since + settings.STEP_OUTPUT_FLUSH_INTERVAL - time.time()))
+
+    def _append_output(self, job_id, stream, output):
+        self._pending_output.setdefault((job_id, stream), []).append(output)
+        self._pending_bytes += len(output)
+        if self._pending_since is None:
+            self._pending_since = time.time()
+
+        if self._pending_bytes >= settings.STEP_OUTPUT_FLUSH_BYTES:
+            self._flush_output()
+
+    def _flush_output(self):
+        if not self._pending_output:
+            return
+
+        chunks = [
+            StepResultChunk(step_result=self._job_to_result[job_id], stream=stream, text="".join(output))
+            for (job_id, stream), output in self._pending_output.items()
+        ]
+        with transaction.atomic():
+            StepResultChunk.objects.bulk_create(chunks)
+
+        self._pending_output.clear()
+        self._pending_bytes = 0
+        self._pending_since = None
+
     def _complete_job(self, job_id, errored):
         self._job_scheduler.complete_job(job_id, errored=errored)
 
@@ -233,33 +261,36 @@ class JobProgress(threading.Thread, Queue.Queue):
         self._job_scheduler.advance()
 
     def _start_step(self, job_id, **kwargs):
+        # Output from a previous attempt at this job belongs to its StepResult
+        self._flush_output()
+
         with transaction.atomic():
             result = StepResult(job_id=job_id, **kwargs)
             result.save()
         self._job_to_result[job_id] = result
 
     def _log(self, job_id, log_string):
-        result = self._job_to_result[job_id]
-        with transaction.atomic():
-            result.log += log_string
-            result.save()
+        self._append_output(job_id, "log", log_string)
 
     def _console(self, job_id, log_string):
-        result = self._job_to_result[job_id]
-        with transaction.atomic():
-            result.console += log_string
-            result.save()
+        self._append_output(job_id, "console", log_string)
 
     def _step_failure(self, job_id, backtrace):
+        self._flush_output()
+
         result = self._job_to_result[job_id]
         with transaction.atomic():
+            result.fold_chunks()
             result.state = "failed"
             result.backtrace = backtrace
             result.save()
 
     def _step_success(self, job_id, step_result):
+        self._flush_output()
+
         result = self._job_to_result[job_id]
         with transaction.atomic():
+            result.fold_chunks()
             result.state = "success"
             result.result = json.dumps(step_result)
             result.save()
@@ -268,11 +299,11 @@ class JobProgress(threading.Thread, Queue.Queue):
 class RunJobThread(threading.Thread):
     CANCEL_TIMEOUT = 30
 
-    def __init__(self, job_progress, connection_quota, job, steps):
+    def __init__(self, job_progress, connection_pool, job, steps):
         super(RunJobThread, self).__init__()
         self.job = job
         self._job_progress = job_progress
-        self._connection_quota = connection_quota
+        self._connection_pool = connection_pool
         self._cancel = threading.Event()
         self._complete = threading.Event()
         self.steps = steps
@@ -335,9 +366,8 @@ class RunJobThread(threading.Thread):
 
             try:
                 if step.database:
-                    # Get a token entitling code running in this thread
-                    # to open a database connection when it chooses to
-                    self._connection_quota.acquire()
+                    # Borrow a connection from the pool for the duration of the step
+                    self._connection_pool.check_out()
                 else:
                     _disable_database()
 
@@ -365,7 +395,8 @@ class RunJobThread(threading.Thread):
             finally:
                 if step.database:
                     log.debug("Job %d releasing database connection" % self.job.id)
-                    self._connection_quota.release(django.db.connection.connection)
+                    self._connection_pool.check_in()
+                    _disable_database()
 
             finish_step = step_index
             step_index += 1
@@ -390,10 +421,57 @@ class JobCollection(object):
         self._command_to_jobs = defaultdict(set)
         self._job_to_commands = defaultdict(set)
 
+        # Dependency index: for each pending job, the set of job IDs in its wait_for_json
+        # which are not yet complete, and the reverse mapping from a job ID to the pending
+        # jobs waiting on it.  Pending jobs with nothing left to wait for live in _ready_jobs.
+        self._waiting_for = {}
+        self._waited_on_by = defaultdict(set)
+        self._ready_jobs = {}
+
     def add(self, job):
+        known = job.id in self._jobs
+
         self._jobs[job.id] = job
         self._state_jobs[job.state][job.id] = job
 
+        if known:
+            # Re-adding a job (e.g. attaching it to another command): the wait_for_json
+            # has already been indexed, just keep the index pointing at this instance
+            if job.id in self._ready_jobs:
+                self._ready_jobs[job.id] = job
+        elif job.state == "pending":
+            self._index_pending(job)
+
+    def _index_pending(self, job):
+        complete_jobs = self._state_jobs["complete"]
+        waiting_for = set(job_id for job_id in json.loads(job.wait_for_json) if job_id not in complete_jobs)
+
+        if waiting_for:
+            self._waiting_for[job.id] = waiting_for
+            for job_id in waiting_for:
+                self._waited_on_by[job_id].add(job.id)
+        else:
+            self._ready_jobs[job.id] = job
+
+    def _unindex_pending(self, job):
+        self._ready_jobs.pop(job.id, None)
+        for job_id in self._waiting_for.pop(job.id, ()):
+            self._waited_on_by[job_id].discard(job.id)
+
+    def _state_changed(self, job, initial_state):
+        if initial_state == "pending" and job.state != "pending":
+            self._unindex_pending(job)
+
+        if job.state == "complete":
+            for dependent_id in self._waited_on_by.pop(job.id, ()):
+                waiting_for = self._waiting_for.get(dependent_id)
+                if waiting_for is None:
+                    continue
+                waiting_for.discard(job.id)
+                if not waiting_for:
+                    del self._waiting_for[dependent_id]
+                    self._ready_jobs[dependent_id] = self._jobs[dependent_id]
+
     def add_command(self, command, jobs):
         """Add command if it doesn't already exist, and ensure that all
         of `jobs` are associated with it
@@ -423,6 +501,7 @@ class JobCollection(object):
             log.warning("Cancelling uncached Job %s" % job.id)
         else:
             self._state_jobs[job.state][job.id] = job
+            self._state_changed(job, initial_state)
 
     def update_commands(self, job):
         """
@@ -447,20 +526,17 @@ class JobCollection(object):
 
     def update_many(self, jobs, new_state):
         for job in jobs:
-            del self._state_jobs[job.state][job.id]
+            initial_state = job.state
+            del self._state_jobs[initial_state][job.id]
             job.state = new_state
             self._state_jobs[job.state][job.id] = job
+            self._state_changed(job, initial_state)
 
         Job.objects.filter(id__in=[j.id for j in jobs]).update(state=new_state)
 
     @property
     def ready_jobs(self):
-        result = []
-        for job in self._state_jobs["pending"].values():
-            wait_for_ids = json.loads(job.wait_for_json)
-            complete_job_ids = [j.id for j in self._state_jobs["complete"].values()]
-            if not set(wait_for_ids) - set(complete_job_ids):
-                result.append(job)
+        result = [self._ready_jobs[job_id] for job_id in sorted(self._ready_jobs.keys())]
 
         if len(result) == 0 and len(self.pending_jobs) == 0 and len(self.tasked_jobs) == 0:
             # A quiescent state, flush the collection (avoid building up an indefinitely
@@ -490,6 +566,10 @@ class JobScheduler(object):
 
     MAX_STEP_DB_CONNECTIONS = 10
 
+    # Index of the AdvertisedJob classes offered for each stateful object class, see _advertised_job_classes
+    _advertised_job_pairs = None
+    _advertised_jobs_by_class = {}
+
     def __init__(self):
         self._lock = threading.RLock()
         """Globally serialize all scheduling operations: within a given cluster, they all potentially
@@ -502,7 +582,8 @@ class JobScheduler(object):
         self._job_collection = JobCollection()
         self._notification_buffer = NotificationBuffer()
 
-        self._db_quota = SimpleConnectionQuota(self.MAX_STEP_DB_CONNECTIONS)
+        # Steps share MAX_STEP_DB_CONNECTIONS, one more is kept for JobProgress
+        self._db_pool = ConnectionPool(self.MAX_STEP_DB_CONNECTIONS + 1, reserved=1)
         self._run_threads = {}  # Map of job ID to RunJobThread
 
         self.progress = JobProgress(self)
@@ -576,7 +657,7 @@ class JobScheduler(object):
         # without having a database connection for each RunJobThread
 
         if job.steps:
-            thread = RunJobThread(self.progress, self._db_quota, job, job.steps)
+            thread = RunJobThread(self.progress, self._db_pool, job, job.steps)
             assert job.id not in self._run_threads
             self._run_threads[job.id] = thread
 
@@ -888,6 +969,29 @@ class JobScheduler(object):
 
             self._run_next()
 
+    def notify_many(self, notifications):
+        """Apply a batch of notifications, each a tuple of the arguments to `notify`, and
+        then schedule whatever they have made runnable, once for the whole batch.
+
+        A notification which fails is logged and skipped so that it does not take the
+        rest of the batch with it.
+        """
+        with self._lock:
+            for content_type, object_id, time_serialized, update_attrs, from_states in notifications:
+                try:
+                    notification_time = IMLDateTime.parse(time_serialized)
+                    self._notify(content_type, object_id, notification_time, update_attrs, from_states)
+                except Exception:
+                    log.warning(
+                        "notify_many: Dropping notification for %s/%s: %s"
+                        % (content_type, object_id, traceback.format_exc())
+                    )
+
+            try:
+                self._run_next()
+            except Exception:
+                log.warning("notify_many: Error running jobs: %s" % traceback.format_exc())
+
     def run_jobs(self, job_dicts, message):
         with self._lock:
             result = self.CommandPlan.command_run_jobs(job_dicts, message)
@@ -1107,8 +1211,8 @@ class JobScheduler(object):
 
     def create_client_mount(self, host_id, filesystem_id, mountpoint):
         # RPC-callable
-        host = ObjectCache.get_one(ManagedHost, lambda mh: mh.id == host_id)
-        filesystem = ObjectCache.get_one(ManagedFilesystem, lambda mf: mf.id == filesystem_id)
+        host = ObjectCache.get_one(ManagedHost, id=host_id)
+        filesystem = ObjectCache.get_one(ManagedFilesystem, id=filesystem_id)
 
         mount = self._create_client_mount(host, filesystem, mountpoint)
 
@@ -1492,7 +1596,7 @@ class JobScheduler(object):
         with self._lock:
             with transaction.atomic():
                 server_profile = ServerProfile.objects.get(pk=server_profile_id)
-                host = ObjectCache.get_one(ManagedHost, lambda mh: mh.id == host_id)
+                host = ObjectCache.get_one(ManagedHost, id=host_id)
 
                 commands_required = host.set_profile(server_profile_id)
 
@@ -1569,6 +1673,37 @@ class JobScheduler(object):
 
         return stateful_object.downcast()
 
+    @staticmethod
+    def _retrieve_stateful_objects(object_list, from_cache=True):
+        """Get the stateful objects for a list of (obj_key, obj_id), from cache or DB
+
+        Objects are looked up one content type at a time, so that reading them from the
+        DB costs a query per type rather than a query per object.  Objects which do not
+        exist are left out of the result.
+
+        :return: dict of {(obj_key, obj_id): stateful_object}
+        """
+
+        ids_by_key = OrderedDict()
+        for obj_key, obj_id in object_list:
+            ids_by_key.setdefault(obj_key, []).append(obj_id)
+
+        stateful_objects = {}
+        for obj_key, obj_ids in ids_by_key.items():
+            model_klass = ContentType.objects.get_for_id(obj_key).model_class()
+            if from_cache:
+                cache_klass = ManagedTarget if issubclass(model_klass, ManagedTarget) else model_klass
+                for obj_id in obj_ids:
+                    try:
+                        stateful_objects[(obj_key, obj_id)] = ObjectCache.get_by_id(cache_klass, obj_id).downcast()
+                    except ObjectDoesNotExist:
+                        pass
+            else:
+                for stateful_object in model_klass.objects.filter(pk__in=obj_ids):
+                    stateful_objects[(obj_key, stateful_object.pk)] = stateful_object
+
+        return stateful_objects
+
     def available_transitions(self, object_list):
         """Compute the available transitional states for each stateful object
 
@@ -1586,20 +1721,20 @@ class JobScheduler(object):
 
         with self._lock:
             transitions = defaultdict(list)
+
+            # Hit the DB for the statefulobjects (ManagedMgs, ManagedMdt, etc., avoiding all caches
+            # Localize fixed for HYD-2714.  May chance again as HYD-3155 is resolved.
+            # Used to leverage the ObjectCache, but this suspect now:  HYD-3155
+            stateful_objects = JobScheduler._retrieve_stateful_objects(object_list, from_cache=False)
+            write_locks = self._lock_cache.get_write_by_locked_item()
+
             for obj_key, obj_id in object_list:
                 composite_id = "{}:{}".format(obj_key, obj_id)
 
                 try:
-                    # Hit the DB for the statefulobject (ManagedMgs, ManagedMdt, etc., avoiding all caches
-                    # Localize fixed for HYD-2714.  May chance again as HYD-3155 is resolved.
-                    model_klass = ContentType.objects.get_for_id(obj_key).model_class()
-                    stateful_object = model_klass.objects.get(pk=obj_id)
-
-                    # Used to leverage the ObjectCache, but this suspect now:  HYD-3155
-                    # stateful_object = JobScheduler._retrieve_stateful_object(obj_key, obj_id)
-
+                    stateful_object = stateful_objects[(obj_key, obj_id)]
                     log.debug("available_transitions object: %s, state: %s" % (stateful_object, stateful_object.state))
-                except ObjectDoesNotExist:
+                except KeyError:
                     # Do not advertise transitions for an object that does not exist
                     # as can happen if a parallel operation deletes this object
                     transitions[composite_id] = []
@@ -1609,7 +1744,7 @@ class JobScheduler(object):
                     # locked by an incomplete job.  We could alternatively advertise
                     # which jobs would actually be legal to add by skipping this
                     # check and using get_expected_state in place of .state below.
-                    if self._lock_cache.get_latest_write(stateful_object):
+                    if stateful_object in write_locks:
                         transitions[composite_id] = []
                         log.debug("available_transitions object is LOCKED: {}".format(composite_id))
                     else:
@@ -1665,28 +1800,61 @@ class JobScheduler(object):
 
         return transitions
 
+    @classmethod
+    def _advertised_job_classes(cls, klass):
+        """The (non plural) AdvertisedJob classes to offer for instances of klass
+
+        Computed from the (job class, advertised class) pairs on first use for each klass, in
+        the order that a walk of every AdvertisedJob subclass would find them.
+        """
+
+        try:
+            return cls._advertised_jobs_by_class[klass]
+        except KeyError:
+            pass
+
+        if cls._advertised_job_pairs is None:
+            from chroma_core.models import AdvertisedJob
+
+            cls._advertised_job_pairs = [
+                (job_class, apps.get_model("chroma_core", class_name))
+                for job_class in all_subclasses(AdvertisedJob)
+                if not job_class.plural
+                for class_name in job_class.classes
+            ]
+
+        job_classes = [job_class for job_class, advertised in cls._advertised_job_pairs if issubclass(klass, advertised)]
+        cls._advertised_jobs_by_class[klass] = job_classes
+
+        return job_classes
+
     def _fetch_jobs(self, stateful_object):
-        from chroma_core.models import AdvertisedJob
-
-        available_jobs = []
-        for job_class in all_subclasses(AdvertisedJob):
-            if not job_class.plural:
-                for class_name in job_class.classes:
-                    ct = ContentType.objects.get_by_natural_key("chroma_core", class_name.lower())
-                    klass = ct.model_class()
-                    if isinstance(stateful_object, klass):
-                        if job_class.can_run(stateful_object):
-                            available_jobs.append(
-                                {
-                                    "verb": job_class.verb,
-                                    "long_description": job_class.long_description(stateful_object),
-                                    "display_group": job_class.display_group,
-                                    "display_order": job_class.display_order,
-                                    "confirmation": job_class.get_confirmation(stateful_object),
-                                    "class_name": job_class.__name__,
-                                    "args": job_class.get_args(stateful_object),
-                                }
-                            )
+        return self._fetch_jobs_many([stateful_object])[stateful_object]
+
+    def _fetch_jobs_many(self, stateful_objects):
+        """Return {stateful_object: [available job dicts]}, asking each advertised
+        job class about all the objects of a class at once."""
+        by_class = defaultdict(list)
+        for stateful_object in stateful_objects:
+            by_class[stateful_object.__class__].append(stateful_object)
+
+        available_jobs = dict((stateful_object, []) for stateful_object in stateful_objects)
+        for klass, objects in by_class.items():
+            for job_class in self._advertised_job_classes(klass):
+                runnable = job_class.can_run_many(objects)
+                for stateful_object in objects:
+                    if stateful_object in runnable:
+                        available_jobs[stateful_object].append(
+                            {
+                                "verb": job_class.verb,
+                                "long_description": job_class.long_description(stateful_object),
+                                "display_group": job_class.display_group,
+                                "display_order": job_class.display_order,
+                                "confirmation": job_class.get_confirmation(stateful_object),
+                                "class_name": job_class.__name__,
+                                "args": job_class.get_args(stateful_object),
+                            }
+                        )
         return available_jobs
 
     def available_jobs(self, object_list):
@@ -1707,27 +1875,30 @@ class JobScheduler(object):
         with self._lock:
 
             jobs = defaultdict(list)
+            stateful_objects = JobScheduler._retrieve_stateful_objects(object_list)
+            write_locks = self._lock_cache.get_write_by_locked_item()
+
+            # If the object is subject to an incomplete Job
+            # then don't offer any actions
+            unlocked = [
+                stateful_object for stateful_object in stateful_objects.values() if stateful_object not in write_locks
+            ]
+            unlocked_jobs = self._fetch_jobs_many(unlocked)
+
             for obj_key, obj_id in object_list:
                 composite_id = "{}:{}".format(obj_key, obj_id)
 
-                try:
-                    stateful_object = JobScheduler._retrieve_stateful_object(obj_key, obj_id)
-                except ObjectDoesNotExist:
-                    # Do not advertise jobs for an object that does not exist
-                    # as can happen if a parallel operation deletes this object
-                    jobs[composite_id] = []
-                else:
-                    # If the object is subject to an incomplete Job
-                    # then don't offer any actions
-                    if self._lock_cache.get_latest_write(stateful_object) > 0:
-                        jobs[composite_id] = []
-                    else:
-                        jobs[composite_id] = self._fetch_jobs(stateful_object)
+                # Do not advertise jobs for an object that does not exist
+                # as can happen if a parallel operation deletes this object
+                stateful_object = stateful_objects.get((obj_key, obj_id))
+                jobs[composite_id] = unlocked_jobs.get(stateful_object, [])
 
             return jobs
 
     def get_locks(self):
-        all_locks = [to_lock_json(x) for x in self._lock_cache.read_locks + self._lock_cache.write_locks]
+        all_locks = [
+            to_lock_json(x) for x in itertools.chain(self._lock_cache.read_locks, self._lock_cache.write_locks)
+        ]
 
         def update_locks(locks, lock):
             lock_id = "{}:{}".format(lock["content_type_id"], lock["item_id"])
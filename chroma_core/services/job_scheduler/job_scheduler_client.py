@@ -17,6 +17,8 @@ from chroma_core.services import log_register
 from chroma_core.services.rpc import ServiceRpcInterface
 from chroma_core.models import ManagedHost, Command
 
+import settings
+
 
 log = log_register(__name__)
 
@@ -52,6 +54,11 @@ class JobSchedulerRpc(ServiceRpcInterface):
         "run_stratagem",
     ]
 
+    # API polling (available_transitions, available_jobs, get_locks) makes this the busiest RPC
+    # endpoint, serve it from persistent workers rather than a thread and DB connection per call
+    worker_count = settings.JOB_SCHEDULER_RPC_WORKERS
+    queue_depth = settings.JOB_SCHEDULER_RPC_QUEUE_DEPTH
+
 
 class JobSchedulerClient(object):
     """Because there are some tasks which are the domain of the job scheduler but do not need to
@@ -10,7 +10,10 @@ is used for updates received from agent reports.  Access to both of these, along
 non-remote functionality is wrapped in JobSchedulerClient.
 
 """
+import atexit
 import datetime
+import threading
+from collections import OrderedDict
 
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import DateTimeField
@@ -19,14 +22,81 @@ from chroma_core.services import log_register
 from chroma_core.services.queue import ServiceQueue
 from disabled_connection import DisabledConnection
 
+import settings
+
 
 log = log_register(__name__)
 
 
 class NotificationQueue(ServiceQueue):
+    """Messages are envelopes of the form {'notifications': [notification, ...]}"""
+
     name = "job_scheduler_notifications"
 
 
+class NotificationCoalescer(object):
+    """Hold notifications for up to `window` seconds and then send them to the job
+    scheduler in one message.
+
+    A notification replaces any pending one for the same object, attributes and
+    from_states: only the latest value is sent, at the position of the latest
+    notification, so the job scheduler ends up in the same state as if it had
+    received each of them.  Services which report the same thing about every host on
+    every cycle thereby cost one message per window instead of one per report.
+
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._timer = None
+
+    def add(self, notification):
+        key = (
+            tuple(notification["instance_natural_key"]),
+            notification["instance_id"],
+            tuple(sorted(notification["update_attrs"].keys())),
+            tuple(notification["from_states"]),
+        )
+
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = notification
+
+            if self.window > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.window, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            notifications = self._pending.values()
+            self._pending = OrderedDict()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        if notifications:
+            log.debug("Sending %d notifications" % len(notifications))
+            NotificationQueue().put({"notifications": notifications})
+
+
+_coalescer = NotificationCoalescer(settings.NOTIFICATION_COALESCE_WINDOW)
+
+# Don't lose whatever is still waiting for the window to expire when a process exits
+atexit.register(_coalescer.flush)
+
+
+def flush():
+    """Send any notifications which are being held for coalescing now"""
+    _coalescer.flush()
+
+
 def notify(instance, time, update_attrs, from_states=[]):
     """Having detected that the state of an object in the database does not
     match information from real life (i.e. chroma-agent), call this to
@@ -41,6 +111,8 @@ def notify(instance, time, update_attrs, from_states=[]):
                         LNet state to 'lnet_down'.  If this is ommitted, the notification
                         will be applied irrespective of the object's state.
 
+    Notifications are coalesced and sent in batches, see NotificationCoalescer.
+
     :return: None
 
     """
@@ -72,7 +144,7 @@ def notify(instance, time, update_attrs, from_states=[]):
                     encoded_attrs[attr] = value
 
         time_serialized = time.isoformat()
-        NotificationQueue().put(
+        _coalescer.add(
             {
                 "instance_natural_key": ContentType.objects.get_for_model(instance).natural_key(),
                 "instance_id": instance.id,
@@ -4,11 +4,55 @@
 
 
 from collections import defaultdict
+import bisect
 import json
 from django.db.models import Q
 from django.contrib.contenttypes.models import ContentType
 
 
+class JobOrderedLocks(object):
+    """
+    The StateLocks on one item, kept in order of job ID (and in order of
+    addition for locks held by the same job) so that the latest lock is
+    always at the end.
+    """
+
+    def __init__(self):
+        self._job_ids = []
+        self._locks = []
+
+    def add(self, lock):
+        i = bisect.bisect_right(self._job_ids, lock.job.id)
+        self._job_ids.insert(i, lock.job.id)
+        self._locks.insert(i, lock)
+
+    def remove(self, lock):
+        i = bisect.bisect_left(self._job_ids, lock.job.id)
+        while i < len(self._locks) and self._job_ids[i] == lock.job.id:
+            if self._locks[i] is lock:
+                del self._job_ids[i]
+                del self._locks[i]
+                return
+            i += 1
+        raise ValueError("%s not in %s" % (lock, self.__class__.__name__))
+
+    def latest(self, not_job=None):
+        for lock in reversed(self._locks):
+            if not_job is None or lock.job != not_job:
+                return lock
+        return None
+
+    def from_job_id(self, job_id):
+        """Return the locks held by jobs with an ID of at least job_id"""
+        return self._locks[bisect.bisect_left(self._job_ids, job_id) :]
+
+    def __iter__(self):
+        return iter(self._locks)
+
+    def __len__(self):
+        return len(self._locks)
+
+
 class LockCache(object):
 
     # Lock change receivers are called whenever a change occurs to the locks. It allows something to
@@ -21,10 +65,10 @@ class LockCache(object):
     def __init__(self):
         from chroma_core.models import Job, StateLock
 
-        self.write_locks = []
-        self.write_by_item = defaultdict(list)
-        self.read_locks = []
-        self.read_by_item = defaultdict(list)
+        self.write_locks = set()
+        self.write_by_item = defaultdict(JobOrderedLocks)
+        self.read_locks = set()
+        self.read_by_item = defaultdict(JobOrderedLocks)
         self.all_by_job = defaultdict(list)
         self.all_by_item = defaultdict(list)
 
@@ -44,15 +88,24 @@ class LockCache(object):
         for lock in locks:
             if lock.write:
                 self.write_locks.remove(lock)
-                self.write_by_item[lock.locked_item].remove(lock)
+                self._remove_from_item(self.write_by_item, lock)
             else:
                 self.read_locks.remove(lock)
-                self.read_by_item[lock.locked_item].remove(lock)
-            self.all_by_job[job.id].remove(lock)
+                self._remove_from_item(self.read_by_item, lock)
             self.all_by_item[lock.locked_item].remove(lock)
+            if not self.all_by_item[lock.locked_item]:
+                del self.all_by_item[lock.locked_item]
             self.call_receivers(lock, self.LOCK_REMOVE)
+        del self.all_by_job[job.id]
         return n
 
+    @staticmethod
+    def _remove_from_item(by_item, lock):
+        locks = by_item[lock.locked_item]
+        locks.remove(lock)
+        if not locks:
+            del by_item[lock.locked_item]
+
     def add(self, lock):
         self._add(lock)
 
@@ -60,11 +113,11 @@ class LockCache(object):
         assert lock.job.id is not None
 
         if lock.write:
-            self.write_locks.append(lock)
-            self.write_by_item[lock.locked_item].append(lock)
+            self.write_locks.add(lock)
+            self.write_by_item[lock.locked_item].add(lock)
         else:
-            self.read_locks.append(lock)
-            self.read_by_item[lock.locked_item].append(lock)
+            self.read_locks.add(lock)
+            self.read_by_item[lock.locked_item].add(lock)
 
         self.all_by_job[lock.job.id].append(lock)
         self.all_by_item[lock.locked_item].append(lock)
@@ -77,22 +130,15 @@ class LockCache(object):
         return self.all_by_item[locked_item]
 
     def get_latest_write(self, locked_item, not_job=None):
-        try:
-            if not_job is not None:
-                return sorted(
-                    [l for l in self.write_by_item[locked_item] if l.job != not_job],
-                    lambda a, b: cmp(a.job.id, b.job.id),
-                )[-1]
-
-            return sorted(self.write_by_item[locked_item], lambda a, b: cmp(a.job.id, b.job.id))[-1]
-        except IndexError:
-            return None
+        locks = self.write_by_item.get(locked_item)
+        return locks.latest(not_job) if locks else None
 
     def get_read_locks(self, locked_item, after, not_job):
-        return [x for x in self.read_by_item[locked_item] if after <= x.job.id and x.job != not_job]
+        locks = self.read_by_item.get(locked_item)
+        return [x for x in locks.from_job_id(after) if x.job != not_job] if locks else []
 
     def get_write(self, locked_item):
-        return self.write_by_item[locked_item]
+        return list(self.write_by_item.get(locked_item, []))
 
     def get_by_locked_item(self, item):
         return self.all_by_item[item]
@@ -101,7 +147,7 @@ class LockCache(object):
         result = {}
         for locked_item, locks in self.write_by_item.items():
             if locks:
-                result[locked_item] = sorted(locks, lambda a, b: cmp(a.job.id, b.job.id))[-1]
+                result[locked_item] = locks.latest()
         return result
 
 
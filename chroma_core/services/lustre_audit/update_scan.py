@@ -131,7 +131,8 @@ class UpdateScan(object):
                 break
 
         log.info("update_packages(%s): updates=%s" % (self.host, updates))
-        job_scheduler_notify.notify(self.host, self.started_at, {"needs_update": updates})
+        if self.host.needs_update != updates:
+            job_scheduler_notify.notify(self.host, self.started_at, {"needs_update": updates})
 
     def update_client_mounts(self):
         # Client mount audit comes in via metrics due to the way the
@@ -182,48 +183,67 @@ class UpdateScan(object):
         # Loop over all mountables we expected on this host, whether they
         # were actually seen in the results or not.
         mounted_uuids = dict([(str(m["fs_uuid"]), m) for m in self.host_data["mounts"]])
-        for target_mount in ManagedTargetMount.objects.filter(host=self.host):
+        target_mounts = list(ManagedTargetMount.objects.filter(host=self.host).select_related("target"))
+
+        # The recovery status we last recorded for each target, so that unchanged ones needn't be rewritten
+        recovery_statuses = dict(
+            TargetRecoveryInfo.objects.filter(target_id__in=[tm.target_id for tm in target_mounts]).values_list(
+                "target_id", "recovery_status"
+            )
+        )
+
+        for target_mount in target_mounts:
+            target = target_mount.target
 
             # Mounted-ness
             # ============
-            mounted_locally = target_mount.target.uuid in mounted_uuids
+            mounted_locally = target.uuid in mounted_uuids
 
             # Recovery status
             # ===============
             if mounted_locally:
-                mount_info = mounted_uuids[target_mount.target.uuid]
+                mount_info = mounted_uuids[target.uuid]
                 recovery_status = mount_info["recovery_status"]
             else:
                 recovery_status = {}
 
             # Update to active_mount and alerts for monitor-only
             # targets done here instead of resource_locations
-            if target_mount.target.immutable_state:
-                target = target_mount.target
+            if target.immutable_state:
                 if mounted_locally:
-                    job_scheduler_notify.notify(
-                        target,
-                        self.started_at,
-                        {"state": "mounted", "active_mount_id": target_mount.id},
-                        ["mounted", "unmounted"],
-                    )
-                elif not mounted_locally and target.active_mount == target_mount:
+                    self._notify_target_location(target, target_mount.id)
+                elif not mounted_locally and target.active_mount_id == target_mount.id:
                     log.debug("clearing active_mount, %s %s", self.started_at, self.host)
 
-                    job_scheduler_notify.notify(
-                        target,
-                        self.started_at,
-                        {"state": "unmounted", "active_mount_id": None},
-                        ["mounted", "unmounted"],
-                    )
-
-            with transaction.atomic():
-                if target_mount.target.active_mount is None:
-                    TargetRecoveryInfo.update(target_mount.target, {})
-                    TargetRecoveryAlert.notify(target_mount.target, False)
-                elif mounted_locally:
-                    recovering = TargetRecoveryInfo.update(target_mount.target, recovery_status)
-                    TargetRecoveryAlert.notify(target_mount.target, recovering)
+                    self._notify_target_location(target, None)
+
+            if target.active_mount_id is None:
+                self._update_recovery(target, {}, recovery_statuses)
+            elif mounted_locally:
+                self._update_recovery(target, recovery_status, recovery_statuses)
+
+    def _update_recovery(self, target, recovery_status, recovery_statuses):
+        with transaction.atomic():
+            try:
+                unchanged = json.loads(recovery_statuses[target.id]) == recovery_status
+            except KeyError:
+                unchanged = False
+
+            if unchanged:
+                recovering = TargetRecoveryInfo(recovery_status=recovery_statuses[target.id]).is_recovering()
+            else:
+                recovering = TargetRecoveryInfo.update(target, recovery_status)
+            TargetRecoveryAlert.notify(target, recovering)
+
+    def _notify_target_location(self, target, active_mount_id):
+        """Tell the job scheduler where a target is running, unless that is what it already believes"""
+        state = "unmounted" if active_mount_id is None else "mounted"
+        if target.state == state and target.active_mount_id == active_mount_id:
+            return
+
+        job_scheduler_notify.notify(
+            target, self.started_at, {"state": state, "active_mount_id": active_mount_id}, ["mounted", "unmounted"]
+        )
 
     def update_resource_locations(self):
         # If resource_locations is None then nothing changed since the last update and so we can just return.
@@ -246,38 +266,54 @@ class UpdateScan(object):
                 )
             return
 
-        for resource_name, node_name in self.host_data["resource_locations"].items():
+        resource_locations = self.host_data["resource_locations"]
+
+        # Resolve all the labels, node names and mounts in the report up front, in a fixed number of queries.
+        # If we're operating on a Managed* rather than a purely monitored target
+        targets = dict(
+            (target.ha_label, target)
+            for target in ManagedTarget.objects.filter(ha_label__in=resource_locations.keys(), immutable_state=False)
+        )
+
+        node_names = set(node_name for node_name in resource_locations.values() if node_name is not None)
+        hosts = {}
+        if node_names:
+            for host in ManagedHost.objects.filter(Q(nodename__in=node_names) | Q(fqdn__in=node_names)):
+                for name in [host.fqdn, host.nodename]:
+                    if name in node_names:
+                        hosts[name] = host
+
+        target_mounts = {}
+        if targets and hosts:
+            for target_mount in ManagedTargetMount.objects.filter(
+                target_id__in=[t.id for t in targets.values()], host_id__in=[h.id for h in hosts.values()]
+            ):
+                target_mounts[(target_mount.target_id, target_mount.host_id)] = target_mount
+
+        for resource_name, node_name in resource_locations.items():
             try:
-                target = ManagedTarget.objects.get(ha_label=resource_name)
-            except ManagedTarget.DoesNotExist:
-                # audit_log.warning("Resource %s on host %s is not a known target" % (resource_name, self.host))
+                target = targets[resource_name]
+            except KeyError:
+                # Either not a known target (audit_log.warning("Resource %s on host %s is not a known target"
+                # % (resource_name, self.host))), or a monitored one whose location is audited in update_target_mounts
                 continue
 
-            # If we're operating on a Managed* rather than a purely monitored target
-            if not target.immutable_state:
-                if node_name is None:
+            if node_name is None:
+                active_mount = None
+            else:
+                try:
+                    host = hosts[node_name]
+                except KeyError:
+                    log.warning("Resource location node '%s' does not match any Host" % (node_name))
                     active_mount = None
                 else:
                     try:
-                        host = ManagedHost.objects.get(Q(nodename=node_name) | Q(fqdn=node_name))
-                        try:
-                            active_mount = ManagedTargetMount.objects.get(target=target, host=host)
-                        except ManagedTargetMount.DoesNotExist:
-                            log.warning(
-                                "Resource for target '%s' is running on host '%s', but there is no such TargetMount"
-                                % (target, host)
-                            )
-                            active_mount = None
-                    except ManagedHost.DoesNotExist:
-                        log.warning("Resource location node '%s' does not match any Host" % (node_name))
+                        active_mount = target_mounts[(target.id, host.id)]
+                    except KeyError:
+                        log.warning(
+                            "Resource for target '%s' is running on host '%s', but there is no such TargetMount"
+                            % (target, host)
+                        )
                         active_mount = None
 
-                job_scheduler_notify.notify(
-                    target,
-                    self.started_at,
-                    {
-                        "state": ["unmounted", "mounted"][active_mount is not None],
-                        "active_mount_id": None if active_mount is None else active_mount.id,
-                    },
-                    ["mounted", "unmounted"],
-                )
+            self._notify_target_location(target, None if active_mount is None else active_mount.id)
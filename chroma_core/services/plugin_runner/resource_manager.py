@@ -13,7 +13,7 @@ import logging
 import json
 import threading
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from massiviu.context import DelayedContextFrom
 from django.db.models.aggregates import Count
@@ -138,6 +138,41 @@ class ClassIndex(object):
             self.add_record(srr["id"], storage_plugin_manager.get_resource_class_by_id(srr["resource_class_id"]))
 
 
+class LabelCache(object):
+    """Least recently used map of record id to the label of its resource, bounded at MAX_SIZE entries.
+
+    A label is made from the attributes of the resource, so entries must be invalidated when those change.
+    """
+
+    MAX_SIZE = 10000
+
+    def __init__(self):
+        self._labels = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record_id):
+        with self._lock:
+            label = self._labels.pop(record_id, None)
+            if label is not None:
+                self._labels[record_id] = label
+
+            return label
+
+    def set(self, record_id, label):
+        with self._lock:
+            self._labels.pop(record_id, None)
+            self._labels[record_id] = label
+            while len(self._labels) > self.MAX_SIZE:
+                self._labels.popitem(last=False)
+
+    def invalidate(self, record_id):
+        with self._lock:
+            self._labels.pop(record_id, None)
+
+    def __len__(self):
+        return len(self._labels)
+
+
 class SubscriberIndex(object):
     def __init__(self):
         log.debug("SubscriberIndex.__init__")
@@ -294,7 +329,7 @@ class ResourceManager(object):
         self._subscriber_index = SubscriberIndex()
         self._subscriber_index.populate()
 
-        self._label_cache = {}
+        self._label_cache = LabelCache()
 
     def session_open(self, plugin_instance, scannable_id, initial_resources, update_period):
 
@@ -476,15 +511,52 @@ class ResourceManager(object):
 
     def get_label(self, record_id):
         try:
-            if (
-                StorageResourceRecord.objects.get(pk=record_id).to_resource().get_label()
-                != self._label_cache[record_id]
-            ):
-                pass
-
-            return self._label_cache[record_id]
+            return self.get_labels([record_id])[record_id]
         except KeyError:
-            return StorageResourceRecord.objects.get(pk=record_id).to_resource().get_label()
+            raise StorageResourceRecord.DoesNotExist("No StorageResourceRecord %s" % record_id)
+
+    def get_labels(self, record_ids):
+        """Labels of the resources of record_ids, loading those not in the label cache together.
+
+        :return: dict of record id to label, without the ids of records that do not exist
+        """
+        labels = {}
+        missing_ids = []
+        for record_id in record_ids:
+            label = self._label_cache.get(record_id)
+            if label is None:
+                missing_ids.append(record_id)
+            else:
+                labels[record_id] = label
+
+        if missing_ids:
+            records = list(StorageResourceRecord.objects.filter(pk__in=missing_ids))
+            for record, resource in zip(records, StorageResourceRecord.to_resources(records)):
+                labels[record.id] = resource.get_label()
+                self._label_cache.set(record.id, labels[record.id])
+
+        return labels
+
+    def _volume_label_id(self, logicaldrive_id):
+        """The id of the record whose label a Volume on logicaldrive_id takes"""
+
+        # If this logicaldrive has one and only one ancestor which is
+        # also a logicaldrive, then inherit the label from that ancestor
+        ancestors = self._record_find_ancestors(logicaldrive_id, LogicalDrive)
+        record_class = self._class_index.get(logicaldrive_id)
+        ancestors.remove(logicaldrive_id)
+
+        is_zfs = callable(getattr(record_class, "device_type", None)) and record_class.device_type() == "zfs"
+
+        if (
+            len(ancestors) == 1
+            and not issubclass(record_class, LogicalDriveSlice)
+            and not issubclass(self._class_index.get(ancestors[0]), LogicalDriveSlice)
+            and not is_zfs
+        ):
+            return ancestors[0]
+        else:
+            return logicaldrive_id
 
     def _persist_lun_updates(self, scannable_id):
         from chroma_core.lib.storage_plugin.query import ResourceQuery
@@ -553,37 +625,28 @@ class ResourceManager(object):
         # Get the sizes, filesystem_type and device_type for all of the logicaldrive resources
         logicaldrive_id_to_attribute = defaultdict(dict)
 
-        for resource in StorageResourceRecord.objects.filter(id__in=node_to_logicaldrive_id.values()):
+        logicaldrive_records = list(StorageResourceRecord.objects.filter(id__in=node_to_logicaldrive_id.values()))
+        for record, resource in zip(logicaldrive_records, StorageResourceRecord.to_resources(logicaldrive_records)):
             for attribute_name in ["size", "filesystem_type", "usable_for_lustre"]:
-                attribute_value = getattr(resource.to_resource(), attribute_name)
-                logicaldrive_id_to_attribute[attribute_name][resource.id] = attribute_value
+                attribute_value = getattr(resource, attribute_name)
+                logicaldrive_id_to_attribute[attribute_name][record.id] = attribute_value
 
         existing_volumes = Volume.objects.filter(storage_resource__in=node_to_logicaldrive_id.values())
         logicaldrive_id_to_volume = dict([(v.storage_resource_id, v) for v in existing_volumes])
         logicaldrive_id_handled = set()
 
+        # Labels for the logicaldrives that need a Volume, loaded together
+        logicaldrive_id_to_label_id = dict(
+            (logicaldrive_id, self._volume_label_id(logicaldrive_id))
+            for logicaldrive_id in set(node_to_logicaldrive_id.values())
+            if logicaldrive_id not in logicaldrive_id_to_volume
+        )
+        labels = self.get_labels(set(logicaldrive_id_to_label_id.values()))
+
         with DelayedContextFrom(Volume) as volumes:
             for _, logicaldrive_id in node_to_logicaldrive_id.items():
                 if logicaldrive_id not in logicaldrive_id_to_volume and logicaldrive_id not in logicaldrive_id_handled:
-                    # If this logicaldrive has one and only one ancestor which is
-                    # also a logicaldrive, then inherit the label from that ancestor
-                    ancestors = self._record_find_ancestors(logicaldrive_id, LogicalDrive)
-                    record_class = self._class_index.get(logicaldrive_id)
-                    ancestors.remove(logicaldrive_id)
-
-                    is_zfs = (
-                        callable(getattr(record_class, "device_type", None)) and record_class.device_type() == "zfs"
-                    )
-
-                    if (
-                        len(ancestors) == 1
-                        and not issubclass(record_class, LogicalDriveSlice)
-                        and not issubclass(self._class_index.get(ancestors[0]), LogicalDriveSlice)
-                        and not is_zfs
-                    ):
-                        label = self.get_label(ancestors[0])
-                    else:
-                        label = self.get_label(logicaldrive_id)
+                    label = labels[logicaldrive_id_to_label_id[logicaldrive_id]]
 
                     # Check if there are any descendent LocalMount resources (i.e. LUN in use, do
                     # not advertise for use with Lustre).
@@ -1019,6 +1082,7 @@ class ResourceManager(object):
                 cleaned_id_attrs[key] = val
 
         record.update_attributes(cleaned_id_attrs)
+        self._label_cache.invalidate(global_record_id)
 
     def session_add_resources(self, scannable_id, resources):
         """NB this is plural because new resources may be interdependent
@@ -1128,66 +1192,79 @@ class ResourceManager(object):
             except KeyError as e:
                 log.warning("attempting to access resource missing from local-global map {}".format(e))
 
-        # This generator re-runs the query on every loop iteration in order
-        # to handle situations where resources returned by the query are
-        # deleted as dependents of prior resources (HYD-3659).
-        def iterate_lost_resources(query):
-            loops_remaining = len(query())
-            while loops_remaining:
-                loops_remaining -= 1
-                rs = query()
-                if len(rs):
-                    yield rs[0]
-                else:
-                    raise StopIteration()
-
-            # If the list of lost items grew, don't continue looping.
-            # Just bail out and the next scan will get them.
-            if loops_remaining <= 0:
-                raise StopIteration()
+        # Work out everything which has been lost in one pass and delete it together, rather than deleting
+        # resources one at a time and re-querying after each in case it took others with it (HYD-3659).
 
-        # Look for scoped resources which were at some point reported by
+        # Scoped resources which were at some point reported by
         # this scannable_id, but are missing this time around.
-        lost_scoped_resources = lambda: StorageResourceRecord.objects.filter(
-            ~Q(pk__in=reported_scoped_resources), storage_id_scope=session.scannable_id
+        lost_record_ids = list(
+            StorageResourceRecord.objects.filter(
+                ~Q(pk__in=reported_scoped_resources), storage_id_scope=session.scannable_id
+            ).values_list("id", flat=True)
         )
-        for r in iterate_lost_resources(lost_scoped_resources):
-            self._delete_resource(r)
 
-        # Look for globalid resources which were at some point reported by
+        # Globalid resources which were at some point reported by
         # this scannable_id, but are missing this time around.
-        lost_global_resources = lambda: StorageResourceRecord.objects.filter(
-            ~Q(pk__in=reported_global_resources), reported_by=session.scannable_id
+        lost_global_ids = list(
+            StorageResourceRecord.objects.filter(
+                ~Q(pk__in=reported_global_resources), reported_by=session.scannable_id
+            ).values_list("id", flat=True)
         )
-        for reportee in iterate_lost_resources(lost_global_resources):
-            reportee.reported_by.remove(session.scannable_id)
-            if not reportee.reported_by.count():
-                self._delete_resource(reportee)
+        if lost_global_ids:
+            StorageResourceRecord.reported_by.through._default_manager.filter(
+                **{
+                    "%s__in" % StorageResourceRecord.reported_by.field.m2m_field_name(): lost_global_ids,
+                    StorageResourceRecord.reported_by.field.m2m_reverse_field_name(): session.scannable_id,
+                }
+            ).delete()
+
+            # Those which nothing else reports any more go too
+            lost_record_ids.extend(
+                StorageResourceRecord.objects.filter(pk__in=lost_global_ids, reported_by=None).values_list(
+                    "id", flat=True
+                )
+            )
+
+        if lost_record_ids:
+            self._delete_resources(lost_record_ids)
 
     def _delete_resource(self, resource_record):
-        log.info("ResourceManager._delete_resource '%s'" % resource_record.pk)
+        self._delete_resources([resource_record.id])
+
+    def _delete_resources(self, record_ids):
+        """Delete the records `record_ids`, along with everything which depends on them: resources scoped to or
+        only reported by them, and resources which refer to any of those.  The whole set is worked out up front
+        and removed with bulk statements, so the cost does not grow with the depth of the tree."""
+        log.info("ResourceManager._delete_resources %s" % record_ids)
 
         ordered_for_deletion = []
         phase1_ordered_dependencies = []
+        seen = set()
 
         def collect_phase1(record_id):
-            if not record_id in phase1_ordered_dependencies:
+            if not record_id in seen:
+                seen.add(record_id)
                 phase1_ordered_dependencies.append(record_id)
 
-        # If we are deleting one of the special top level resource classes, handle
-        # its dependents
-        record_id = resource_record.id
+        # If we are deleting any of the special top level resource classes, handle
+        # their dependents
         from chroma_core.lib.storage_plugin.base_resource import BaseScannableResource, HostsideResource
 
-        resource_class = self._class_index.get(record_id)
-        if issubclass(resource_class, BaseScannableResource) or issubclass(resource_class, HostsideResource):
-            # Find resources scoped to this resource
-            for dependent in StorageResourceRecord.objects.filter(storage_id_scope=record_id):
-                collect_phase1(dependent.id)
+        top_level_ids = [
+            record_id
+            for record_id in record_ids
+            if issubclass(self._class_index.get(record_id), (BaseScannableResource, HostsideResource))
+        ]
+        if top_level_ids:
+            # Find resources scoped to these resources
+            for dependent_id in StorageResourceRecord.objects.filter(storage_id_scope__in=top_level_ids).values_list(
+                "id", flat=True
+            ):
+                collect_phase1(dependent_id)
 
-            # Delete any reported_by relations to this resource
+            # Delete any reported_by relations to these resources
             StorageResourceRecord.reported_by.through._default_manager.filter(
-                **{"%s" % StorageResourceRecord.reported_by.field.m2m_reverse_field_name(): record_id}
+                **{"%s__in" % StorageResourceRecord.reported_by.field.m2m_reverse_field_name(): top_level_ids}
             ).delete()
 
             # Delete any resources whose reported_by are now zero
@@ -1196,41 +1273,60 @@ class ResourceManager(object):
                 if (not issubclass(srr_class, HostsideResource)) and (not issubclass(srr_class, BaseScannableResource)):
                     collect_phase1(srr["id"])
 
-        if issubclass(resource_class, BaseScannableResource):
             # Delete any StorageResourceOffline alerts
-            for alert_state in StorageResourceOffline.objects.filter(alert_item_id=record_id):
+            scannable_ids = [
+                record_id
+                for record_id in top_level_ids
+                if issubclass(self._class_index.get(record_id), BaseScannableResource)
+            ]
+            for alert_state in StorageResourceOffline.objects.filter(alert_item_id__in=scannable_ids):
                 alert_state.delete()
 
-        phase1_ordered_dependencies.append(resource_record.id)
+        for record_id in record_ids:
+            collect_phase1(record_id)
+
+        # Load the whole graph of ResourceReference attributes that lead to the victims,
+        # one query per level rather than one per resource
+        referrers = defaultdict(list)
+        frontier = set(phase1_ordered_dependencies)
+        visited = set(frontier)
+        while frontier:
+            next_frontier = set()
+            for attr in StorageResourceAttributeReference.objects.filter(value__in=frontier).values(
+                "resource_id", "value_id"
+            ):
+                referrers[attr["value_id"]].append(attr["resource_id"])
+                if attr["resource_id"] not in visited:
+                    visited.add(attr["resource_id"])
+                    next_frontier.add(attr["resource_id"])
+            frontier = next_frontier
 
-        reference_cache = dict([(r, []) for r in phase1_ordered_dependencies])
-        for attr in StorageResourceAttributeReference.objects.filter(value__in=phase1_ordered_dependencies):
-            reference_cache[attr.value_id].append(attr)
+        deleting = set()
 
         def collect_phase2(record_id):
-            if record_id in ordered_for_deletion:
+            if record_id in deleting:
                 # NB cycles aren't allowed individually in the parent graph,
                 # the resourcereference graph, the scoping graph, but
                 # we are traversing all 3 at once so we can see cycles here.
                 return
+            deleting.add(record_id)
 
-            # Find ResourceReference attributes on other objects
-            # that refer to this one
-            if record_id in reference_cache:
-                attrs = reference_cache[record_id]
-            else:
-                attrs = StorageResourceAttributeReference.objects.filter(value=record_id)
-            for attr in attrs:
-                collect_phase2(attr.resource_id)
+            # Delete ResourceReference attributes on other objects
+            # that refer to this one first
+            for referrer_id in referrers[record_id]:
+                collect_phase2(referrer_id)
 
             ordered_for_deletion.append(record_id)
 
         for record_id in phase1_ordered_dependencies:
             collect_phase2(record_id)
 
-        for storage_resource_record in StorageResourceLearnEvent.objects.all():
-            if storage_resource_record.storage_resource.id in ordered_for_deletion:
-                storage_resource_record.delete()
+        learn_event_ids = [
+            event.id
+            for event in StorageResourceLearnEvent.objects.all()
+            if event.get_variant("storage_resource_id", None, int) in deleting
+        ]
+        StorageResourceLearnEvent.objects.filter(id__in=learn_event_ids).delete()
 
         # Delete any parent relations pointing to victim resources
         StorageResourceRecord.parents.through._default_manager.filter(
@@ -1267,28 +1363,26 @@ class ResourceManager(object):
         with DelayedContextFrom(StorageAlertPropagated) as sap_delayed:
             [sap_delayed.delete(int(x["id"])) for x in victim_saps]
 
-        for sra in victim_sras:
-            storage_resource_alert = StorageResourceAlert.objects.get(id=sra["id"])
-            if storage_resource_alert.active:
-                StorageResourceAlert.notify(
-                    storage_resource_alert.alert_item,
-                    False,
-                    alert_class=storage_resource_alert.alert_class,
-                    attribute=storage_resource_alert.attribute,
-                    alert_type=storage_resource_alert.alert_type,
-                )
+        for storage_resource_alert in StorageResourceAlert.objects.filter(id__in=victim_sras, active=True):
+            StorageResourceAlert.notify(
+                storage_resource_alert.alert_item,
+                False,
+                alert_class=storage_resource_alert.alert_class,
+                attribute=storage_resource_alert.attribute,
+                alert_type=storage_resource_alert.alert_type,
+            )
 
         for record_id in ordered_for_deletion:
             self._subscriber_index.remove_resource(record_id, self._class_index.get(record_id))
             self._class_index.remove_record(record_id)
             self._edges.remove_node(record_id)
+            self._label_cache.invalidate(record_id)
 
             for session in self._sessions.values():
                 try:
                     local_id = session.global_id_to_local_id[record_id]
                     del session.local_id_to_global_id[local_id]
                     del session.global_id_to_local_id[record_id]
-                    del self._label_cache[record_id]
                 except KeyError:
                     pass
 
@@ -1437,7 +1531,7 @@ class ResourceManager(object):
 
             session.local_id_to_global_id[resource._handle] = record.pk
             session.global_id_to_local_id[record.pk] = resource._handle
-            self._label_cache[record.id] = resource.get_label()
+            self._label_cache.set(record.id, resource.get_label())
 
             if created:
                 # Record a user-visible event
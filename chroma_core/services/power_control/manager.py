@@ -4,11 +4,15 @@
 
 
 from collections import defaultdict
+import os
+import signal
+import subprocess
 import threading
-from Queue import Queue
+from Queue import Queue, Empty
 
 from django.db import transaction
 
+import settings
 from chroma_core.lib.util import CommandLine, CommandError
 from chroma_core.services.log import log_register
 from chroma_core.models import PowerControlDevice, PowerControlDeviceOutlet
@@ -17,6 +21,98 @@ from chroma_core.models import PowerControlDevice, PowerControlDeviceOutlet
 log = log_register(__name__.split(".")[-1])
 
 
+class CommandTimeout(CommandError):
+    pass
+
+
+class OutletCommandExecutor(object):
+    """
+    Run fence agent commands concurrently, at most `max_workers` at once across all
+    callers, killing any command which runs for longer than `timeout` seconds.
+    """
+
+    def __init__(self, max_workers, timeout):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def _shell(self, cmdline):
+        # Fence agents are often scripts wrapping ipmitool, so run each in its own
+        # process group and kill the whole group on timeout
+        p = subprocess.Popen(cmdline, stdout=subprocess.PIPE, stderr=subprocess.PIPE, preexec_fn=os.setsid)
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            try:
+                os.killpg(p.pid, signal.SIGKILL)
+            except OSError:
+                # Already exited
+                pass
+
+        timer = threading.Timer(self.timeout, kill)
+        timer.start()
+        try:
+            out, err = p.communicate()
+        finally:
+            timer.cancel()
+        rc = p.wait()
+
+        if timed_out.is_set():
+            raise CommandTimeout(cmdline, rc, out, err)
+        return rc, out, err
+
+    def run(self, cmdline):
+        """Return (rc, stdout, stderr), raising CommandTimeout if the command was killed"""
+        with self._slots:
+            return self._shell(cmdline)
+
+    def run_all(self, cmdlines):
+        """
+        Run each of `cmdlines`, returning a list of (rc, stdout, stderr) in the same order.
+        Commands that timed out, or could not be run at all, have the exception in place of a
+        result: see unpack().
+        """
+        results = [None] * len(cmdlines)
+        pending = Queue()
+        for i, cmdline in enumerate(cmdlines):
+            pending.put((i, cmdline))
+
+        def work():
+            while True:
+                try:
+                    i, cmdline = pending.get_nowait()
+                except Empty:
+                    return
+                try:
+                    results[i] = self.run(cmdline)
+                except Exception as e:
+                    results[i] = e
+
+        workers = [threading.Thread(target=work) for _ in range(min(self.max_workers, len(cmdlines)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        return results
+
+    def unpack(self, result):
+        """
+        Return the (rc, stdout, stderr) of a run_all() result. A command that timed out gives its
+        output so far, the failure to run a command at all (e.g. a missing fence agent) is raised.
+        """
+        if isinstance(result, CommandTimeout):
+            return result.rc, result.stdout, "timed out after %ss" % self.timeout
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            return result
+
+
+# Commands which change outlet state, and the one-shot PDU outlet query, are still run one at a
+# time under the device lock with CommandLine.try_shell; only monitoring and IPMI queries, which
+# fan out over many BMCs, go through the OutletCommandExecutor.
 class PowerControlManager(CommandLine):
     def __init__(self):
         # Big lock
@@ -26,6 +122,10 @@ class PowerControlManager(CommandLine):
         self._power_devices = {}
         # Allow us to communicate with our monitoring threads
         self.monitor_task_queue = defaultdict(Queue)
+        # Outlet queries for every device share one bound on concurrent commands
+        self.executor = OutletCommandExecutor(
+            settings.POWER_CONTROL_OUTLET_WORKERS, settings.POWER_CONTROL_COMMAND_TIMEOUT
+        )
 
         self._refresh_power_devices()
 
@@ -112,9 +212,12 @@ class PowerControlManager(CommandLine):
             self.add_monitor_task(device.sockaddr, ("query_device_outlets", {"device_id": device.id}))
 
         with self._device_locks[device.sockaddr]:
+            outlets = list(device.outlets.all())
+            results = self.executor.run_all([device.monitor_command(outlet.identifier) for outlet in outlets])
+
             bmc_states = {}
-            for outlet in device.outlets.all():
-                rc, out, err = self.shell(device.monitor_command(outlet.identifier))
+            for outlet, result in zip(outlets, results):
+                rc, out, err = self.executor.unpack(result)
                 if rc == 0:
                     bmc_states[outlet] = True
                 else:
@@ -132,8 +235,11 @@ class PowerControlManager(CommandLine):
             self.add_monitor_task(device.sockaddr, ("query_device_outlets", {"device_id": device.id}))
 
         with self._device_locks[device.sockaddr]:
+            cmdline = device.monitor_command()
             try:
-                self.try_shell(device.monitor_command())
+                rc, out, err = self.executor.run(cmdline)
+                if rc != 0:
+                    raise CommandError(cmdline, rc, out, err)
             except CommandError as e:
                 log.error("Device %s did not respond to monitor: %s" % (device, e))
                 return False
@@ -165,14 +271,14 @@ class PowerControlManager(CommandLine):
         # With HYD-2089 landed, we can query PDU outlet states in one
         # shot, rather than sequentially.
         #
-        # IPMI is another story. We're landing rudimentary support for
-        # IPMI with HYD-2099, but longer-term we will probably want to
-        # improve query performance with some kind of fanout.
+        # IPMI is another story: each outlet is a separate BMC, so the
+        # queries are fanned out over the executor.
         with self._device_locks[device.sockaddr]:
             if device.is_ipmi:
-                # IPMI -- query sequentially
-                for outlet in device.outlets.order_by("identifier"):
-                    rc, stdout, stderr = self.shell(device.outlet_query_command(outlet.identifier))
+                outlets = list(device.outlets.order_by("identifier"))
+                results = self.executor.run_all([device.outlet_query_command(o.identifier) for o in outlets])
+                for outlet, result in zip(outlets, results):
+                    rc, stdout, stderr = self.executor.unpack(result)
 
                     # These RCs seem to be common across agents.
                     # Verified: fence_apc, fence_wti, fence_xvm
@@ -5,11 +5,12 @@
 
 import traceback
 import threading
+import time
 import Queue
 
 from chroma_core.services.log import log_register
 from chroma_core.models import PowerControlDevice, PowerControlDeviceUnavailableAlert, IpmiBmcUnavailableAlert
-from settings import DISABLE_POWER_CONTROL_DEVICE_MONITORING
+from settings import DISABLE_POWER_CONTROL_DEVICE_MONITORING, POWER_CONTROL_MONITOR_WORKERS
 
 
 log = log_register(__name__.split(".")[-1])
@@ -18,32 +19,33 @@ log = log_register(__name__.split(".")[-1])
 MONITORING_INTERVAL = 30
 
 
-class PowerDeviceMonitor(threading.Thread):
+class PowerDeviceMonitor(object):
     """
     Instances of this class do double-duty: Their primary mission in life is
     to watch an assigned PDU and raise Alerts if the PDU becomes unmonitorable.
     As a secondary duty, they handle asynchronous tasks for the manager:
     slowish, fiddly things like querying a PDU's outlet states, etc.
+
+    Monitors don't have a thread each: PowerMonitorDaemon runs them on its
+    workers when they have something to do, one worker per monitor at a time.
     """
 
     def __init__(self, device, power_control_manager):
-        super(PowerDeviceMonitor, self).__init__()
         self.device = device
         self._manager = power_control_manager
         self._stopping = threading.Event()
-        self._interval_ctr = 0
+        self._next_check = time.time() + MONITORING_INTERVAL
+        # Set by the daemon when it hands the monitor to a worker, cleared by the worker
+        self.busy = False
 
-    def run(self):
-        try:
-            self._run()
-        finally:
-            # Make sure we always clean up.
-            # HYD-1918: Refactor this kludgy mess so that these threads don't
-            # get DB access and therefore don't need to clean up.
-            import django.db
+    @property
+    def stopped(self):
+        return self._stopping.is_set()
 
-            if django.db.connection.connection:
-                django.db.connection.close()
+    def has_work(self, now):
+        if self._stopping.is_set():
+            return False
+        return now >= self._next_check or not self._manager.get_monitor_tasks(self.device.sockaddr).empty()
 
     def _run_manager_tasks(self):
         try:
@@ -84,20 +86,13 @@ class PowerDeviceMonitor(threading.Thread):
                 "Checked on %s:%s: %s" % (self.device.sockaddr + tuple(["available" if available else "unavailable"]))
             )
 
-    def _run(self):
-        log.info("Starting monitor for %s" % self.device)
+    def run_once(self, now):
+        """Run one task scheduled by the manager, then check the device if a check is due"""
+        self._run_manager_tasks()
 
-        while not self._stopping.is_set():
-            # Check to see if the manager has scheduled something for
-            # us to do besides monitoring.
-            self._run_manager_tasks()
-
-            if self._interval_ctr >= MONITORING_INTERVAL:
-                self._interval_ctr = 0
-                self._check_monitored_device()
-
-            self._interval_ctr += 1
-            self._stopping.wait(timeout=1)
+        if not self._stopping.is_set() and now >= self._next_check:
+            self._next_check = now + MONITORING_INTERVAL
+            self._check_monitored_device()
 
     def stop(self):
         log.info("Stopping monitor for %s" % self.device)
@@ -105,9 +100,17 @@ class PowerDeviceMonitor(threading.Thread):
 
 
 class PowerMonitorDaemon(object):
+    """
+    Schedules every PowerDeviceMonitor from one loop, handing monitors which have
+    a task queued or a check due to a fixed set of worker threads.  A slow device
+    therefore holds up at most one worker, rather than every device holding a thread.
+    """
+
     def __init__(self, power_control_manager):
         self._manager = power_control_manager
         self._stopping = threading.Event()
+        self._work_queue = Queue.Queue()
+        self._workers = []
 
         self.device_monitors = {}
 
@@ -116,38 +119,74 @@ class PowerMonitorDaemon(object):
 
         log.info("Found %d power devices to monitor" % len(self.device_monitors))
 
+    def _work(self):
+        try:
+            while True:
+                monitor = self._work_queue.get()
+                if monitor is None:
+                    break
+
+                try:
+                    monitor.run_once(time.time())
+                except Exception:
+                    # The daemon will replace the monitor
+                    log.error("Monitor for %s failed, stopping: %s" % (monitor.device, traceback.format_exc()))
+                    monitor.stop()
+                finally:
+                    monitor.busy = False
+        finally:
+            # HYD-1918: Refactor this kludgy mess so that these threads don't
+            # get DB access and therefore don't need to clean up.
+            import django.db
+
+            if django.db.connection.connection:
+                django.db.connection.close()
+
+    def _update_monitors(self):
+        # Check for new devices to monitor, or stopped monitors. A monitor
+        # stops itself if the manager has enqueued a 'stop' task.
+        for sockaddr, device in self._manager.power_devices.items():
+            if sockaddr in self.device_monitors:
+                monitor = self.device_monitors[sockaddr]
+                if not monitor.stopped or monitor.busy:
+                    continue
+                log.warn("Monitor for %s:%s stopped, restarting" % sockaddr)
+            else:
+                log.info("Found new power device: %s:%s" % sockaddr)
+            log.info("Starting monitor for %s" % device)
+            self.device_monitors[sockaddr] = PowerDeviceMonitor(device, self._manager)
+
+        # Check for old devices to stop monitoring
+        for sockaddr, monitor in self.device_monitors.items():
+            if sockaddr not in self._manager.power_devices:
+                log.info("Reaping monitor for old power device: %s:%s" % sockaddr)
+                monitor.stop()
+                del self.device_monitors[sockaddr]
+
+    def _schedule_monitors(self):
+        now = time.time()
+        for monitor in self.device_monitors.values():
+            if not monitor.busy and monitor.has_work(now):
+                monitor.busy = True
+                self._work_queue.put(monitor)
+
     def run(self):
         log.info("entering main loop")
 
-        for monitor in self.device_monitors.values():
-            monitor.start()
+        self._workers = [threading.Thread(target=self._work) for _ in range(POWER_CONTROL_MONITOR_WORKERS)]
+        for worker in self._workers:
+            worker.start()
 
         while not self._stopping.is_set():
-            # Check for new devices to monitor, or dead threads. A thread
-            # may suicide if the manager has enqueued a 'stop' task.
-            for sockaddr, device in self._manager.power_devices.items():
-                if sockaddr in self.device_monitors and not self.device_monitors[sockaddr].is_alive():
-                    log.warn("Monitor for %s:%s died, restarting" % sockaddr)
-                elif not sockaddr in self.device_monitors:
-                    log.info("Found new power device: %s:%s" % sockaddr)
-                else:
-                    continue
-                monitor = PowerDeviceMonitor(device, self._manager)
-                self.device_monitors[sockaddr] = monitor
-                monitor.start()
-
-            # Check for old devices to stop monitoring
-            for sockaddr, monitor in self.device_monitors.items():
-                if sockaddr not in self._manager.power_devices:
-                    log.info("Reaping monitor for old power device: %s:%s" % sockaddr)
-                    monitor.stop()
-                    monitor.join()
-                    del self.device_monitors[sockaddr]
+            self._update_monitors()
+            self._schedule_monitors()
 
             self._stopping.wait(timeout=1)
 
         for monitor in self.device_monitors.values():
             monitor.stop()
+        for worker in self._workers:
+            self._work_queue.put(None)
 
         log.info("leaving main loop")
 
@@ -157,5 +196,5 @@ class PowerMonitorDaemon(object):
 
     def join(self):
         log.info("Joining...")
-        for monitor in self.device_monitors.values():
-            monitor.join()
+        for worker in self._workers:
+            worker.join()
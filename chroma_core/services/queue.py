@@ -9,6 +9,9 @@ around an AMQP queue."""
 
 import threading
 
+import kombu.messaging
+import kombu.pools
+
 from chroma_core.services import _amqp_connection
 from chroma_core.services.log import log_register
 
@@ -33,16 +36,44 @@ class ServiceQueue(object):
 
         AcmeQueue().put({'foo': 'bar'})
 
+    Senders publish through kombu's per-process producer pool, so the connection
+    (and the declaration of the queue on it) is reused between calls rather than
+    set up and torn down for every message.  Use `put_many` to send a batch of
+    messages with a single producer checkout.
+
     """
 
     name = None
 
+    def _amqp_queue(self):
+        # Equivalent to the entities declared by conn.SimpleQueue in `serve`
+        exchange = kombu.messaging.Exchange(self.name, type="direct", durable=False)
+        return kombu.messaging.Queue(self.name, exchange, routing_key=self.name, durable=False)
+
     def put(self, body):
-        with _amqp_connection() as conn:
-            q = conn.SimpleQueue(
-                self.name, serializer="json", exchange_opts={"durable": False}, queue_opts={"durable": False}
-            )
-            q.put(body)
+        self.put_many([body])
+
+    def put_many(self, bodies):
+        queue = self._amqp_queue()
+
+        def errback(exc, _):
+            log.info("RabbitMQ queue %s got a temporary error. May retry. Error: %r", self.name, exc, exc_info=1)
+
+        retry_policy = {"max_retries": 10, "errback": errback}
+
+        with kombu.pools.producers[_amqp_connection()].acquire(block=True) as producer:
+            for body in bodies:
+                # declare is a no-op after the first publish on a pooled connection,
+                # kombu remembers which entities each connection has declared.
+                producer.publish(
+                    body,
+                    serializer="json",
+                    exchange=queue.exchange,
+                    routing_key=self.name,
+                    declare=[queue],
+                    retry=True,
+                    retry_policy=retry_policy,
+                )
 
     def purge(self):
         with _amqp_connection() as conn:
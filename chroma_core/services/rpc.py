@@ -15,7 +15,10 @@ management command.
 """
 import logging
 
+import heapq
 import socket
+import Queue as queue
+from collections import defaultdict
 import threading
 import uuid
 import django
@@ -33,6 +36,7 @@ from kombu.entity import TRANSIENT_DELIVERY_MODE
 
 from chroma_core.services.log import log_register
 from chroma_core.services import _amqp_connection, _amqp_exchange, dbutils
+from chroma_core.services.dbutils import ConnectionPool
 
 
 REQUEST_SCHEMA = {
@@ -69,6 +73,12 @@ LIGHTWEIGHT_CONNECTIONS_LIMIT = 10
 
 RESPONSE_CONN_LIMIT = 10
 
+"""
+Upper bounds (in seconds) of the buckets in the per-method latency histograms kept
+by RpcWorkerPool.  Anything slower is counted in a final '+Inf' bucket.
+"""
+RPC_LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.5, 1, 5, 30]
+
 tx_connections = None
 rx_connections = None
 lw_connections = None
@@ -91,6 +101,65 @@ class RpcTimeout(Exception):
     pass
 
 
+def _execute_rpc(rpc, body):
+    """Run the method requested in `body`, returning the response (result or exception)"""
+    try:
+        return {
+            "result": rpc._local_call(body["method"], *body["args"], **body["kwargs"]),
+            "request_id": body["request_id"],
+            "exception": None,
+        }
+    except Exception as e:
+        import sys
+        import traceback
+
+        exc_info = sys.exc_info()
+        backtrace = "\n".join(traceback.format_exception(*(exc_info or sys.exc_info())))
+
+        # Utility to generate human readable errors
+        def translate_error(err):
+            from socket import error as socket_error
+
+            if type(err) == socket_error:
+                return "Cannot reach server"
+
+            return str(err)
+
+        log.error("RunOneRpc: exception calling %s: %s" % (body["method"], backtrace))
+        return {
+            "request_id": body["request_id"],
+            "result": None,
+            "exception": translate_error(e),
+            "exception_type": type(e).__name__,
+            "traceback": backtrace,
+        }
+
+
+def _send_response(response_conn_pool, body, result):
+    with response_conn_pool[_amqp_connection()].acquire(block=True) as connection:
+
+        def errback(exc, _):
+            log.info("RabbitMQ rpc got a temporary error. May retry. Error: %r", exc, exc_info=1)
+
+        retry_policy = {"max_retries": 10, "errback": errback}
+
+        connection.ensure_connection(**retry_policy)
+
+        with Producer(connection) as producer:
+
+            maybe_declare(_amqp_exchange(), producer.channel, True, **retry_policy)
+            producer.publish(
+                result,
+                serializer="json",
+                routing_key=body["response_routing_key"],
+                delivery_mode=TRANSIENT_DELIVERY_MODE,
+                retry=True,
+                retry_policy=retry_policy,
+                immedate=True,
+                mandatory=True,
+            )
+
+
 class RunOneRpc(threading.Thread):
     """Handle a single incoming RPC in a new thread, and send the
     response (result or exception) from the execution thread."""
@@ -103,68 +172,91 @@ class RunOneRpc(threading.Thread):
 
     def run(self):
         try:
-            result = {
-                "result": self.rpc._local_call(self.body["method"], *self.body["args"], **self.body["kwargs"]),
-                "request_id": self.body["request_id"],
-                "exception": None,
-            }
-        except Exception as e:
-            import sys
-            import traceback
-
-            exc_info = sys.exc_info()
-            backtrace = "\n".join(traceback.format_exception(*(exc_info or sys.exc_info())))
-
-            # Utility to generate human readable errors
-            def translate_error(err):
-                from socket import error as socket_error
-
-                if type(err) == socket_error:
-                    return "Cannot reach server"
-
-                return str(err)
-
-            result = {
-                "request_id": self.body["request_id"],
-                "result": None,
-                "exception": translate_error(e),
-                "exception_type": type(e).__name__,
-                "traceback": backtrace,
-            }
-            log.error("RunOneRpc: exception calling %s: %s" % (self.body["method"], backtrace))
+            result = _execute_rpc(self.rpc, self.body)
         finally:
             django.db.connection.close()
 
-        with self._response_conn_pool[_amqp_connection()].acquire(block=True) as connection:
+        _send_response(self._response_conn_pool, self.body, result)
+
 
-            def errback(exc, _):
-                log.info("RabbitMQ rpc got a temporary error. May retry. Error: %r", exc, exc_info=1)
+class RpcWorkerPool(object):
+    """Handle incoming RPCs on a fixed set of worker threads fed from a bounded queue.
 
-            retry_policy = {"max_retries": 10, "errback": errback}
+    Unlike RunOneRpc, workers borrow database connections from a ConnectionPool
+    for each call rather than opening a new one.  When all workers are busy and
+    `queue_depth` requests are waiting, `submit` blocks, which stops the RpcServer
+    consuming further requests until a worker is free.
+    """
 
-            connection.ensure_connection(**retry_policy)
+    def __init__(self, rpc, worker_count, queue_depth, response_conn_pool):
+        self.rpc = rpc
+        self._queue = queue.Queue(maxsize=queue_depth)
+        self._response_conn_pool = response_conn_pool
+        self._db_pool = ConnectionPool(worker_count)
 
-            with Producer(connection) as producer:
+        self._latency_lock = threading.Lock()
+        self._latencies = defaultdict(lambda: [0] * (len(RPC_LATENCY_BUCKETS) + 1))
 
-                maybe_declare(_amqp_exchange(), producer.channel, True, **retry_policy)
-                producer.publish(
-                    result,
-                    serializer="json",
-                    routing_key=self.body["response_routing_key"],
-                    delivery_mode=TRANSIENT_DELIVERY_MODE,
-                    retry=True,
-                    retry_policy=retry_policy,
-                    immedate=True,
-                    mandatory=True,
-                )
+        self._workers = [threading.Thread(target=self._work) for _ in range(worker_count)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, body):
+        self._queue.put(body, block=True)
+
+    def _work(self):
+        while True:
+            body = self._queue.get(block=True)
+            if body is None:
+                break
+
+            started_at = time.time()
+            with self._db_pool.connection():
+                result = _execute_rpc(self.rpc, body)
+            self._record_latency(body["method"], time.time() - started_at)
+
+            try:
+                _send_response(self._response_conn_pool, body, result)
+            except Exception as e:
+                # Don't lose the worker, the caller will time out waiting
+                log.error("RpcWorkerPool: failed to send response to %s: %s" % (body["request_id"], e))
+
+    def _record_latency(self, method, latency):
+        bucket = len(RPC_LATENCY_BUCKETS)
+        for i, upper_bound in enumerate(RPC_LATENCY_BUCKETS):
+            if latency <= upper_bound:
+                bucket = i
+                break
+
+        with self._latency_lock:
+            self._latencies[method][bucket] += 1
+
+    def latency_histograms(self):
+        """Return {method: [(bucket upper bound, count), ...]}, counts are not cumulative"""
+        bounds = [str(b) for b in RPC_LATENCY_BUCKETS] + ["+Inf"]
+        with self._latency_lock:
+            return dict((method, zip(bounds, counts)) for method, counts in self._latencies.items())
+
+    def stop(self):
+        for _ in self._workers:
+            self._queue.put(None, block=True)
+        for worker in self._workers:
+            worker.join()
+        self._db_pool.close_idle()
+
+        for method, histogram in sorted(self.latency_histograms().items()):
+            log.info("RPC latency %s %s" % (method, " ".join("<=%s:%s" % bucket for bucket in histogram)))
 
 
 class RpcServer(ConsumerMixin):
-    def __init__(self, rpc, connection, service_name, serialize=False):
+    def __init__(self, rpc, connection, service_name, serialize=False, worker_count=None, queue_depth=None):
         """
         :param rpc: A ServiceRpcInterface instance
         :param serialize: If True, then process RPCs one after another in a single thread
         rather than running a thread for each RPC.
+        :param worker_count: If set, process RPCs on a pool of this many persistent worker
+        threads (see RpcWorkerPool) rather than running a thread for each RPC.
+        :param queue_depth: How many RPCs may wait for a worker before consuming blocks.
         """
         super(RpcServer, self).__init__()
         self.serialize = serialize
@@ -174,6 +266,11 @@ class RpcServer(ConsumerMixin):
         self.request_routing_key = "%s.requests" % self.queue_name
         self._response_conn_pool = kombu.pools.Connections(limit=RESPONSE_CONN_LIMIT)
 
+        if worker_count:
+            self.worker_pool = RpcWorkerPool(rpc, worker_count, queue_depth or worker_count, self._response_conn_pool)
+        else:
+            self.worker_pool = None
+
     def get_consumers(self, Consumer, channel):
         return [
             Consumer(
@@ -196,11 +293,18 @@ class RpcServer(ConsumerMixin):
             # breaks our faith in request_id and response_routing_key
             log.error("Invalid RPC body: %s" % e)
         else:
-            RunOneRpc(self.rpc, body, self._response_conn_pool).start()
+            if self.worker_pool:
+                self.worker_pool.submit(body)
+            else:
+                RunOneRpc(self.rpc, body, self._response_conn_pool).start()
 
     def stop(self):
         self.should_stop = True
 
+    def join(self):
+        if self.worker_pool:
+            self.worker_pool.stop()
+
 
 class ResponseWaitState(object):
     """State kept by for each outstanding RPC -- the response handler
@@ -221,9 +325,16 @@ class RpcClientResponseHandler(threading.Thread):
     def __init__(self, response_routing_key):
         super(RpcClientResponseHandler, self).__init__()
         self._stopping = False
-        self._response_states = {}
         self._response_routing_key = response_routing_key
 
+        # _response_states is shared between the calling threads and this one, guard it with _lock.
+        # _deadlines is a heap of (timeout_at, request_id), so that ageing only has to look at
+        # the requests which have expired.  Requests which complete before their deadline are
+        # left in the heap until it is compacted.
+        self._lock = threading.Lock()
+        self._response_states = {}
+        self._deadlines = []
+
         self._started = threading.Event()
 
     def wait_for_start(self):
@@ -236,15 +347,20 @@ class RpcClientResponseHandler(threading.Thread):
 
     def start_wait(self, request_id, rpc_timeout):
         log.debug("start_wait %s" % request_id)
-        self._response_states[request_id] = ResponseWaitState(rpc_timeout)
+        state = ResponseWaitState(rpc_timeout)
+        with self._lock:
+            self._response_states[request_id] = state
+            heapq.heappush(self._deadlines, (state.timeout_at, request_id))
 
     def complete_wait(self, request_id):
         log.debug("complete_wait %s" % request_id)
-        state = self._response_states[request_id]
+        with self._lock:
+            state = self._response_states[request_id]
         state.complete.wait()
         log.debug("complete_wait %s triggered" % request_id)
 
-        del self._response_states[request_id]
+        with self._lock:
+            del self._response_states[request_id]
 
         if state.timeout:
             raise RpcTimeout()
@@ -252,40 +368,47 @@ class RpcClientResponseHandler(threading.Thread):
             return state.result
 
     def _age_response_states(self):
-        # FIXME: keep a sorted list by insertion time to avoid
-        # the need to check all the timeouts
         t = time.time()
-        for request_id, state in self._response_states.items():
-            if not state.complete.is_set() and t > state.timeout_at:
-                log.debug("Aged out RPC %s" % request_id)
-                state.timeout = True
-                state.complete.set()
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] < t:
+                timeout_at, request_id = heapq.heappop(self._deadlines)
+                state = self._response_states.get(request_id)
+                if state is not None and not state.complete.is_set():
+                    log.debug("Aged out RPC %s" % request_id)
+                    state.timeout = True
+                    state.complete.set()
+
+            # Drop the deadlines of requests which have completed, when they are the majority
+            if len(self._deadlines) > 2 * len(self._response_states):
+                self._deadlines = [(s.timeout_at, r) for r, s in self._response_states.items()]
+                heapq.heapify(self._deadlines)
 
     def timeout_all(self):
-        for request_id, state in self._response_states.items():
+        with self._lock:
+            states = self._response_states.values()
+        for state in states:
             state.timeout = True
             state.complete.set()
 
+    def _on_response(self, body, message):
+        try:
+            jsonschema.validate(body, RESPONSE_SCHEMA)
+        except jsonschema.ValidationError as e:
+            log.error("Malformed response: %s" % e)
+        else:
+            with self._lock:
+                state = self._response_states.get(body["request_id"])
+            if state is None:
+                log.debug("Unknown request ID %s" % body["request_id"])
+            else:
+                state.result = body
+                state.complete.set()
+        finally:
+            message.ack()
+
     def run(self):
         log.debug("ResponseThread.run")
 
-        def callback(body, message):
-            # log.debug(body)
-            try:
-                jsonschema.validate(body, RESPONSE_SCHEMA)
-            except jsonschema.ValidationError as e:
-                log.error("Malformed response: %s" % e)
-            else:
-                try:
-                    state = self._response_states[body["request_id"]]
-                except KeyError:
-                    log.debug("Unknown request ID %s" % body["request_id"])
-                else:
-                    state.result = body
-                    state.complete.set()
-            finally:
-                message.ack()
-
         with rx_connections[_amqp_connection()].acquire(block=True) as connection:
             # Prepare the response queue
             with connection.Consumer(
@@ -298,7 +421,7 @@ class RpcClientResponseHandler(threading.Thread):
                         durable=False,
                     )
                 ],
-                callbacks=[callback],
+                callbacks=[self._on_response],
             ):
 
                 self._started.set()
@@ -558,8 +681,15 @@ class ServiceRpcInterface(object):
 
         FooRpc().functionality()
 
+    Set `worker_count` in your subclass to serve requests from a bounded pool of that
+    many threads (see RpcWorkerPool) instead of starting a thread per request.
+    `queue_depth` sets how many requests may wait for a free worker.
+
     """
 
+    worker_count = None
+    queue_depth = None
+
     def __init__(self, wrapped=None):
         self.worker = None
         self.wrapped = wrapped
@@ -623,8 +753,17 @@ class ServiceRpcInterface(object):
 
     def run(self):
         with _amqp_connection() as connection:
-            self.worker = RpcServer(self, connection, self.__class__.__name__)
-            self.worker.run()
+            self.worker = RpcServer(
+                self,
+                connection,
+                self.__class__.__name__,
+                worker_count=self.worker_count,
+                queue_depth=self.queue_depth,
+            )
+            try:
+                self.worker.run()
+            finally:
+                self.worker.join()
 
     def stop(self):
         # self.worker could be None if thread stopped before run() gets to the point of setting it
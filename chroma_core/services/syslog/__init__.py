@@ -65,7 +65,9 @@ class Service(ChromaService):
         return removed_num_entries
 
     def on_data(self, fqdn, body):
+        parsed = []
         with transaction.atomic():
+            # All the lines are inserted together when the context exits
             with DelayedContextFrom(LogMessage) as log_messages:
                 for msg in body["log_lines"]:
                     try:
@@ -82,10 +84,12 @@ class Service(ChromaService):
                         )
                         self._table_size += 1
 
-                        self._parser.parse(fqdn, msg)
+                        parsed.append(msg)
                     except Exception as e:
                         self.log.error("Error %s ingesting systemd-journal entry: %s" % (e, msg))
 
+            self._parser.parse_many(fqdn, parsed)
+
     def run(self):
         super(Service, self).run()
 
@@ -314,6 +314,14 @@ SERIAL_PREFERENCE = ["serial_83", "serial_80"]
 # disable this monitoring from the IML Manager.
 DISABLE_POWER_CONTROL_DEVICE_MONITORING = False
 
+# Number of threads running power control device checks and tasks, shared by all
+# devices, and the most fence agent commands run at once when querying outlets
+POWER_CONTROL_MONITOR_WORKERS = int(os.getenv("POWER_CONTROL_MONITOR_WORKERS", 8))
+POWER_CONTROL_OUTLET_WORKERS = int(os.getenv("POWER_CONTROL_OUTLET_WORKERS", 16))
+
+# Seconds after which a fence agent command querying a power control device is killed
+POWER_CONTROL_COMMAND_TIMEOUT = int(os.getenv("POWER_CONTROL_COMMAND_TIMEOUT", 30))
+
 # For django_coverage
 COVERAGE_REPORT_HTML_OUTPUT_DIR = "/tmp/test_html"
 
@@ -332,6 +340,32 @@ ALLOW_ANONYMOUS_READ = True
 # Long poll timeout Seconds
 LONG_POLL_TIMEOUT_SECONDS = 60 * 5
 
+# Number of worker threads serving job_scheduler RPCs, and how many requests
+# may wait for a free worker before the job_scheduler stops accepting more
+JOB_SCHEDULER_RPC_WORKERS = int(os.getenv("JOB_SCHEDULER_RPC_WORKERS", 8))
+JOB_SCHEDULER_RPC_QUEUE_DEPTH = int(os.getenv("JOB_SCHEDULER_RPC_QUEUE_DEPTH", 64))
+
+# Seconds for which job_scheduler notifications are held so that repeats of the
+# same update can be coalesced and sent as one batch.  Zero sends them immediately.
+NOTIFICATION_COALESCE_WINDOW = float(os.getenv("NOTIFICATION_COALESCE_WINDOW", 1.0))
+
+# Seconds after which a service reloads its in-memory index of active alerts, to
+# pick up alerts raised or lowered by other processes
+ALERT_INDEX_REFRESH_INTERVAL = int(os.getenv("ALERT_INDEX_REFRESH_INTERVAL", 60))
+
+# Caps on the messages sent to an agent in one long-poll response; messages beyond
+# either cap stay queued for the agent's next GET
+AGENT_MESSAGE_BATCH_MAX_COUNT = int(os.getenv("AGENT_MESSAGE_BATCH_MAX_COUNT", 256))
+AGENT_MESSAGE_BATCH_MAX_BYTES = int(os.getenv("AGENT_MESSAGE_BATCH_MAX_BYTES", 4 * 1024 * 1024))
+
+# Responses to agents that accept gzip are compressed when they are at least this many bytes
+AGENT_MESSAGE_GZIP_MIN_BYTES = int(os.getenv("AGENT_MESSAGE_GZIP_MIN_BYTES", 1024))
+
+# Step log and console output is written to the database in batches, once this
+# many seconds have passed since the first unwritten output or this many bytes are waiting
+STEP_OUTPUT_FLUSH_INTERVAL = float(os.getenv("STEP_OUTPUT_FLUSH_INTERVAL", 1.0))
+STEP_OUTPUT_FLUSH_BYTES = int(os.getenv("STEP_OUTPUT_FLUSH_BYTES", 256 * 1024))
+
 # Allow Cookie to be read from JavaScript and passed to
 # Realtime service
 SESSION_COOKIE_HTTPONLY = False
@@ -2,7 +2,8 @@ from django.contrib.auth.models import User, Group
 
 from tests.unit.chroma_api.tastypie_test import TestApiClient
 from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
-from tests.unit.chroma_core.helpers import fake_log_message
+from chroma_core.models import Nid
+from tests.unit.chroma_core.helpers import fake_log_message, synthetic_host
 
 
 class TestLogResource(ChromaApiTestCase):
@@ -50,3 +51,22 @@ class TestLogResource(ChromaApiTestCase):
             log_entries = [log_entry["message"] for log_entry in self.deserialize(client.get("/api/log/"))["objects"]]
             xs = self.messages[::-1]
             self.assertListEqual(xs, log_entries)
+
+    def test_substitutions(self):
+        """Verifies NIDs and target names are decorated, with lookups that don't cost a query per message"""
+
+        host = synthetic_host("myserver", nids=[Nid.Nid("192.168.0.19", "tcp", 0)])
+        self.create_simple_filesystem(host)
+        for i in range(10):
+            fake_log_message("Lustre: %s: connection from 192.168.0.19@tcp to 192.168.0.99@tcp" % self.mdt.name)
+
+        response = self.clients["superuser"].get("/api/log/", data={"limit": 0})
+        log_entries = [e for e in self.deserialize(response)["objects"] if "192.168.0.19@tcp" in e["message"]]
+        self.assertEqual(len(log_entries), 10)
+
+        for log_entry in log_entries:
+            message = log_entry["message"]
+            substitutions = [(message[s["start"] : s["end"]], s["label"]) for s in log_entry["substitutions"]]
+            self.assertEqual(
+                substitutions, [(self.mdt.name, self.mdt.get_label()), ("192.168.0.19@tcp", host.get_label())]
+            )
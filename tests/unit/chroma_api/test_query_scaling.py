@@ -136,8 +136,8 @@ class TestQueryScaling(ChromaApiTestCase):
         decorated_scaling = self._measure_scaling(create_n_logs_decorated, LogResource)
         undecorated_scaling = self._measure_scaling(create_n_logs_undecorated, LogResource)
 
-        # FIXME: log decoration is O(N) because we issue a separate query for decorating each log message
-        self.assertIsInstance(decorated_scaling, OrderN)
+        # Decorating log messages loads its NID and target lookups once per request
+        self.assertIsInstance(decorated_scaling, Order1)
 
         self.assertIsInstance(undecorated_scaling, Order1)
         self.assertEqual(undecorated_scaling.query_count, QUERIES_TOTAL_UNDECORATED_LOGS)
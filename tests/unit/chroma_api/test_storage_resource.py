@@ -1,3 +1,7 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chroma_core.models import StorageResourceRecord
 from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
 from tests.unit.chroma_core.lib.storage_plugin.helper import load_plugins
 
@@ -20,7 +24,7 @@ class TestStorageResourceResource(ChromaApiTestCase):
 
         StorageResourceResource._meta.queryset = StorageResourceRecord.objects.filter(
             resource_class__id__in=filter_class_ids()
-        )
+        ).select_related("resource_class__storage_plugin")
 
     def tearDown(self):
         import chroma_core
@@ -62,3 +66,27 @@ class TestStorageResourceResource(ChromaApiTestCase):
             # Check that the alias is still the last valid one we set
             response = self.api_client.get(resource["resource_uri"])
             self.assertEqual(self.deserialize(response)["alias"], valid_alias)
+
+    def test_list_query_count(self):
+        """Check that listing a page of storage resources costs the same number of queries however long the page"""
+        resource_class, resource_class_id = self.manager.get_plugin_resource_class(
+            "loadable_plugin", "TestScannableResource"
+        )
+
+        query_counts = []
+        names = []
+        for n in [5, 10, 20]:
+            while len(names) < n:
+                names.append("resource%s" % len(names))
+                StorageResourceRecord.get_or_create_root(resource_class, resource_class_id, {"name": names[-1]})
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.api_client.get("/api/storage_resource/", data={"limit": 0})
+            self.assertHttpOK(response)
+
+            objects = self.deserialize(response)["objects"]
+            self.assertEqual(sorted(o["attributes"]["name"]["raw"] for o in objects), sorted(names))
+            query_counts.append(len(queries))
+
+        # The first request also pays for setup overhead
+        self.assertEqual(query_counts[1], query_counts[2])
@@ -0,0 +1,60 @@
+import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chroma_core.services.plugin_runner.resource_manager import LabelCache
+from tests.unit.chroma_core.lib.storage_plugin.resource_manager.test_resource_manager import ResourceManagerTestCase
+
+
+class TestLabelCache(ResourceManagerTestCase):
+    LUN_COUNT = 50
+
+    def setUp(self):
+        super(TestLabelCache, self).setUp("example_plugin")
+
+        self.couplet_record, couplet_resource = self._make_global_resource(
+            "example_plugin", "Couplet", {"address_1": "foo", "address_2": "bar"}
+        )
+        self.luns = [
+            self._make_local_resource("example_plugin", "Lun", local_id=i, name="lun%s" % i, serial="serial%s" % i)
+            for i in range(self.LUN_COUNT)
+        ]
+        self.resource_manager.session_open(self.plugin, self.couplet_record.pk, [couplet_resource] + self.luns, 60)
+
+        session = self.resource_manager._sessions[self.couplet_record.pk]
+        self.lun_ids = [session.local_id_to_global_id[lun._handle] for lun in self.luns]
+
+    def test_get_labels(self):
+        expected = dict((lun_id, "lun%s" % i) for i, lun_id in enumerate(self.lun_ids))
+        self.resource_manager._label_cache = LabelCache()
+
+        # Loaded together, not a resource at a time
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.resource_manager.get_labels(self.lun_ids), expected)
+        self.assertLess(len(queries), self.LUN_COUNT / 10)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resource_manager.get_labels(self.lun_ids), expected)
+            self.assertEqual(self.resource_manager.get_label(self.lun_ids[0]), "lun0")
+
+    def test_invalidated_on_update(self):
+        self.assertEqual(self.resource_manager.get_label(self.lun_ids[0]), "lun0")
+
+        self.resource_manager.session_update_resource(self.couplet_record.pk, self.luns[0]._handle, {"name": "renamed"})
+        self.assertEqual(self.resource_manager.get_label(self.lun_ids[0]), "renamed")
+
+    def test_bounded(self):
+        cache = LabelCache()
+        with mock.patch.object(LabelCache, "MAX_SIZE", 2):
+            cache.set(1, "one")
+            cache.set(2, "two")
+            self.assertEqual(cache.get(1), "one")
+            cache.set(3, "three")
+
+        # The least recently used went
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get(2), None)
+        self.assertEqual(cache.get(1), "one")
+
+        cache.invalidate(1)
+        self.assertEqual(cache.get(1), None)
@@ -1,9 +1,16 @@
+import time
+
 from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from chroma_core.lib.util import dbperf
+from chroma_core.services.log import log_register
 from chroma_core.models.host import Volume, VolumeNode
 from chroma_core.models.storage_plugin import StorageResourceRecord
 from tests.unit.chroma_core.lib.storage_plugin.resource_manager.test_resource_manager import ResourceManagerTestCase
 
+log = log_register("test_many")
+
 
 class TestManyObjects(ResourceManagerTestCase):
     """
@@ -85,3 +92,66 @@ class TestManyObjects(ResourceManagerTestCase):
         finally:
             dbperf.enabled = False
             connection.use_debug_cursor = False
+
+
+class TestCullManyObjects(ResourceManagerTestCase):
+    """Culling a controller's lost resources should take a fixed number of queries however many there are"""
+
+    def setUp(self):
+        super(TestCullManyObjects, self).setUp("linux")
+
+        couplet_record, self.couplet_resource = self._make_global_resource(
+            "example_plugin", "Couplet", {"address_1": "foo", "address_2": "bar"}
+        )
+        self.couplet_resource_pk = couplet_record.pk
+
+    def _make_tree(self, lun_count, drives_per_lun):
+        resources = []
+        for n in range(0, lun_count):
+            drives = [
+                self._make_local_resource(
+                    "example_plugin", "HardDrive", serial_number="foobarbaz%s_%s" % (n, m), capacity=1024
+                )
+                for m in range(0, drives_per_lun)
+            ]
+            lun_resource = self._make_local_resource(
+                "example_plugin",
+                "Lun",
+                parents=drives,
+                serial="foobar%d" % n,
+                local_id=n,
+                size=1024 * drives_per_lun,
+                name="LUN_%d" % n,
+            )
+            resources.extend(drives + [lun_resource])
+        return resources
+
+    def _cull(self, lun_count, drives_per_lun):
+        """Open a session with a tree of resources, then reopen it with none so they are all culled.
+
+        :return: (query count, seconds) taken by the culling session_open
+        """
+        self.resource_manager.session_open(
+            self.plugin,
+            self.couplet_resource_pk,
+            [self.couplet_resource] + self._make_tree(lun_count, drives_per_lun),
+            60,
+        )
+        self.assertEqual(StorageResourceRecord.objects.count(), 1 + lun_count * (1 + drives_per_lun))
+
+        start = time.time()
+        with CaptureQueriesContext(connection) as queries:
+            self.resource_manager.session_open(self.plugin, self.couplet_resource_pk, [self.couplet_resource], 60)
+        elapsed = time.time() - start
+
+        self.assertEqual(StorageResourceRecord.objects.count(), 1)
+        return len(queries), elapsed
+
+    def test_cull_scaling(self):
+        small_query_count, _ = self._cull(5, 3)
+        large_query_count, _ = self._cull(50, 3)
+        self.assertEqual(small_query_count, large_query_count)
+
+    def test_cull_benchmark(self):
+        query_count, elapsed = self._cull(2000, 9)
+        log.info("Culled 20000 resources in %.2fs with %d queries" % (elapsed, query_count))
@@ -1,7 +1,9 @@
 import types
 import sys
+import time
 
 import mock
+from django.test import SimpleTestCase
 
 from chroma_core.services.plugin_runner.resource_manager import PluginSession
 from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
@@ -9,6 +11,10 @@ from chroma_core.lib.storage_plugin.api import attributes
 from chroma_core.lib.storage_plugin.api import identifiers
 from chroma_core.lib.storage_plugin.api import resources
 from chroma_core.lib.storage_plugin.api.plugin import Plugin
+from chroma_core.lib.storage_plugin.base_plugin import ResourceIndex, ResourceNotFound
+from chroma_core.services.log import log_register
+
+log = log_register("test_plugin")
 
 
 class TestLocalResource(resources.ScannableResource):
@@ -41,6 +47,14 @@ class TestResourceStatistic(resources.ScannableResource):
     extra_info = attributes.String()
 
 
+class TestPairResource(resources.Resource):
+    class Meta:
+        identifier = identifiers.ScopedId("host", "path")
+
+    host = attributes.String()
+    path = attributes.String(optional=True)
+
+
 class TestPlugin(Plugin):
     _resource_classes = [TestGlobalResource, TestLocalResource, TestResourceExtraInfo, TestResourceStatistic]
 
@@ -310,3 +324,98 @@ class TestAddRemove(IMLUnitTestCase):
         self.resource_manager.session_update_resource.assert_called_once_with(
             self.plugin._scannable_id, self.plugin.resource._handle, {"extra_info": "bar"}
         )
+
+    def test_update_one_of_many(self):
+        """An update touching one resource of a large session should only visit that resource"""
+        self._create_mocked_resource_and_plugin()
+        self.plugin.do_initial_scan()
+
+        def report_many(self, root_resource):
+            self.resources = [
+                self.update_or_create(TestResourceExtraInfo, name="test%s" % i, extra_info="foo")[0]
+                for i in range(10000)
+            ]
+
+        self.plugin.update_scan = types.MethodType(report_many, self.plugin)
+        self.plugin.do_periodic_update()
+
+        def modify_one(self, root_resource):
+            self.resources[5000].extra_info = "bar"
+
+        self.plugin.update_scan = types.MethodType(modify_one, self.plugin)
+        with mock.patch.object(
+            TestResourceExtraInfo, "flush_deltas", autospec=True, side_effect=TestResourceExtraInfo.flush_deltas
+        ) as flush_deltas:
+            self.plugin.do_periodic_update()
+
+        flush_deltas.assert_called_once_with(self.plugin.resources[5000])
+        self.resource_manager.session_update_resource.assert_called_once_with(
+            self.plugin._scannable_id, self.plugin.resources[5000]._handle, {"extra_info": "bar"}
+        )
+
+        # Nothing changed, nothing visited
+        self.plugin.update_scan = types.MethodType(lambda self, root_resource: None, self.plugin)
+        with mock.patch.object(TestResourceExtraInfo, "flush_deltas") as flush_deltas:
+            self.plugin.do_periodic_update()
+        self.assertFalse(flush_deltas.called)
+
+
+class TestResourceIndex(SimpleTestCase):
+    DEVICE_COUNT = 50000
+
+    def setUp(self):
+        super(TestResourceIndex, self).setUp()
+
+        self.index = ResourceIndex()
+        self.handle = 0
+
+    def _add(self, klass, **attrs):
+        resource = klass(**attrs)
+        self.handle += 1
+        resource._handle = self.handle
+        self.index.add(resource)
+        return resource
+
+    def test_find_by_attr(self):
+        a = self._add(TestPairResource, host="host1", path="/dev/a")
+        b = self._add(TestPairResource, host="host1", path="/dev/b")
+        c = self._add(TestPairResource, host="host2", path="/dev/a")
+        no_path = self._add(TestPairResource, host="host3")
+        other = self._add(TestLocalResource, name="host1")
+
+        def find(klass, **attrs):
+            return sorted(self.index.find_by_attr(klass, **attrs), key=lambda r: r._handle)
+
+        self.assertEqual(find(TestPairResource), [a, b, c, no_path])
+        self.assertEqual(find(TestPairResource, host="host1"), [a, b])
+        # A resource without a value for an id attribute matches any value of it
+        self.assertEqual(find(TestPairResource, path="/dev/a"), [a, c, no_path])
+        self.assertEqual(find(TestPairResource, host="host2", path="/dev/a"), [c])
+        self.assertEqual(find(TestLocalResource, name="host1"), [other])
+
+        self.index.remove(a)
+        self.assertEqual(find(TestPairResource, host="host1"), [b])
+        self.assertRaises(ResourceNotFound, self.index.get, TestPairResource, host="host1", path="/dev/a")
+        self.assertEqual(self.index.get(TestPairResource, host="host1", path="/dev/b"), b)
+
+    def test_benchmark(self):
+        """Lookups should not scan every resource in the index"""
+        start = time.time()
+        for i in range(self.DEVICE_COUNT):
+            self._add(TestPairResource, host="host%s" % (i % 10), path="/dev/sd%s" % i)
+        add_time = time.time() - start
+
+        with mock.patch.object(
+            TestPairResource, "compare_id_tuple", wraps=TestPairResource.compare_id_tuple
+        ) as compare_id_tuple:
+            start = time.time()
+            for i in range(self.DEVICE_COUNT):
+                self.index.get(TestPairResource, host="host%s" % (i % 10), path="/dev/sd%s" % i)
+                self.assertEqual(len(list(self.index.find_by_attr(TestPairResource, path="/dev/sd%s" % i))), 1)
+            lookup_time = time.time() - start
+
+        log.info("%s resources: %.3fs to add, %.3fs to look up" % (self.DEVICE_COUNT, add_time, lookup_time))
+
+        # get() goes straight to the resource, and find_by_attr examines only the one candidate with
+        # that path, where a linear scan would examine every resource for every lookup
+        self.assertEqual(compare_id_tuple.call_count, self.DEVICE_COUNT)
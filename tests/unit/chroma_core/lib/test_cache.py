@@ -0,0 +1,80 @@
+from chroma_core.lib.cache import ObjectCache
+from chroma_core.models import ManagedMgs, ManagedFilesystem, ManagedOst, ManagedMdt, ManagedTarget
+from chroma_core.models import ManagedTargetMount, VolumeNode
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+from tests.unit.chroma_core.helpers import synthetic_host, synthetic_volume_full, load_default_profile
+
+
+class TestObjectCacheIndexes(IMLUnitTestCase):
+    """Check that ObjectCache's secondary indexes answer lookups without querying, and follow changes"""
+
+    def setUp(self):
+        super(TestObjectCacheIndexes, self).setUp()
+
+        load_default_profile()
+
+        self.host = synthetic_host()
+        self.other_host = synthetic_host()
+
+        self.mgs = self._create_target(ManagedMgs)
+        self.fs = ManagedFilesystem.objects.create(name="testfs", mgs=self.mgs)
+        self.mdt = self._create_target(ManagedMdt, filesystem=self.fs, index=0)
+        self.osts = [self._create_target(ManagedOst, filesystem=self.fs, index=i) for i in range(4)]
+
+        ObjectCache.clear()
+        ObjectCache.getInstance()
+
+    def tearDown(self):
+        super(TestObjectCacheIndexes, self).tearDown()
+
+        ObjectCache.clear()
+
+    def _create_target(self, klass, **kwargs):
+        volume = synthetic_volume_full(self.host, secondary_hosts=[self.other_host])
+        target = klass.objects.create(volume=volume, **kwargs)
+        for volume_node in VolumeNode.objects.filter(volume=volume):
+            ManagedTargetMount.objects.create(
+                target=target, host=volume_node.host, volume_node=volume_node, primary=volume_node.primary
+            )
+        return target
+
+    def test_lookups_without_queries(self):
+        # Warm the ContentType cache used by downcast_class
+        ObjectCache.fs_targets(self.fs.id)
+
+        with self.assertNumQueries(0):
+            fs_target_ids = [t.id for t in ObjectCache.fs_targets(self.fs.id)]
+            host_target_ids = set(t.id for t in ObjectCache.host_targets(self.other_host.id))
+            primary_mount = ObjectCache.get_one(ManagedTargetMount, target_id=self.mdt.id, primary=True)
+            mounts = ObjectCache.get(ManagedTargetMount, target_id=self.mdt.id)
+
+        self.assertEqual(fs_target_ids, [self.mdt.id] + [ost.id for ost in self.osts])
+        self.assertEqual(host_target_ids, set([self.mgs.id, self.mdt.id] + [ost.id for ost in self.osts]))
+        self.assertEqual(primary_mount.host_id, self.host.id)
+        self.assertEqual(len(mounts), 2)
+
+    def test_new_target(self):
+        ost = self._create_target(ManagedOst, filesystem=self.fs, index=4)
+        ObjectCache.add(ManagedTarget, ost.managedtarget_ptr)
+        for mount in ManagedTargetMount.objects.filter(target=ost):
+            ObjectCache.add(ManagedTargetMount, mount)
+
+        self.assertIn(ost.id, [t.id for t in ObjectCache.fs_targets(self.fs.id)])
+        self.assertEqual(ObjectCache.target_primary_server(ost.managedtarget_ptr).id, self.host.id)
+
+    def test_purge(self):
+        ost = self.osts[0]
+        ObjectCache.purge(ManagedTarget, lambda t: t.id == ost.id)
+        ObjectCache.purge(ManagedTargetMount, lambda mtm: mtm.target_id == ost.id)
+
+        self.assertNotIn(ost.id, [t.id for t in ObjectCache.fs_targets(self.fs.id)])
+        self.assertNotIn(ost.id, [t.id for t in ObjectCache.host_targets(self.host.id)])
+        self.assertEqual(ObjectCache.get(ManagedTargetMount, target_id=ost.id), [])
+
+    def test_update(self):
+        # Swap primary and secondary for the MGS, the (target_id, primary) index must follow
+        for mount in ManagedTargetMount.objects.filter(target=self.mgs):
+            ManagedTargetMount.objects.filter(id=mount.id).update(primary=not mount.primary)
+            ObjectCache.update(mount)
+
+        self.assertEqual(ObjectCache.target_primary_server(self.mgs.managedtarget_ptr).id, self.other_host.id)
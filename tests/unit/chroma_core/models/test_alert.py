@@ -1,8 +1,14 @@
+import mock
+from django.db import transaction
+
 from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
 
 from chroma_core.models import CommandRunningAlert
 from chroma_core.models import CommandCancelledAlert
 from chroma_core.models import AlertState
+from chroma_core.models import HostContactAlert
+from chroma_core.models import HostOfflineAlert
+from tests.unit.chroma_core.helpers.synthentic_objects import synthetic_host
 
 
 class TestAlert(IMLUnitTestCase):
@@ -24,3 +30,112 @@ class TestAlert(IMLUnitTestCase):
         alerts = AlertState.objects.all()
         self.assertEqual(len(alerts), 1)
         self.assertEqual(alerts[0].message(), "Command Houston we have a problem cancelled")
+
+
+class TestActiveAlertIndex(IMLUnitTestCase):
+    def setUp(self):
+        super(TestActiveAlertIndex, self).setUp()
+
+        # As if this process ran the only service raising CommandRunningAlerts
+        mock.patch.object(CommandRunningAlert, "raised_by_service", "test_service").start()
+        self.addCleanup(mock.patch.stopall)
+
+        AlertState.active_index.enable(3600, ["test_service"])
+        self.addCleanup(AlertState.active_index.disable)
+
+        self.command = self.make_command()
+
+    def test_repeated_notify(self):
+        CommandRunningAlert.notify(self.command, True)
+
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                alert = CommandRunningAlert.notify(self.command, True)
+        self.assertEqual(alert.id, AlertState.objects.get(active=True).id)
+
+        CommandRunningAlert.notify(self.command, False)
+        self.assertEqual(AlertState.objects.filter(active=True).count(), 0)
+
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.assertEqual(CommandRunningAlert.notify(self.command, False), None)
+
+    def test_repeated_host_notify(self):
+        """The alerts HostState and the corosync service notify on every cycle"""
+        AlertState.active_index.enable(3600, ["http_agent", "corosync"])
+        host = synthetic_host()
+
+        for alert_class in [HostContactAlert, HostOfflineAlert]:
+            alert = alert_class.notify(host, True)
+            with self.assertNumQueries(0):
+                for _ in range(10):
+                    self.assertEqual(alert_class.notify(host, True).id, alert.id)
+
+            alert_class.notify(host, False)
+            with self.assertNumQueries(0):
+                for _ in range(10):
+                    self.assertEqual(alert_class.notify(host, False), None)
+
+        self.assertEqual(AlertState.objects.filter(active=True).count(), 0)
+
+    def test_loaded_at_enable(self):
+        CommandRunningAlert.notify(self.command, True)
+        AlertState.active_index.disable()
+        AlertState.active_index.enable(3600, ["test_service"])
+
+        with self.assertNumQueries(0):
+            CommandRunningAlert.notify(self.command, True)
+
+    def test_not_raised_by_this_process(self):
+        """Without raised_by_service the index can't know another process hasn't raised one"""
+        AlertState.active_index.enable(3600, ["other_service"])
+        CommandRunningAlert.notify(self.command, True)
+        CommandRunningAlert.notify(self.command, False)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(CommandRunningAlert.notify(self.command, False), None)
+
+    def test_raised_elsewhere(self):
+        """high() of an alert raised by another process since the index was loaded"""
+        alert = CommandRunningAlert.notify(self.command, True)
+        AlertState.active_index.deleted(alert)
+
+        with transaction.atomic():
+            self.assertEqual(CommandRunningAlert.notify(self.command, True).id, alert.id)
+
+            # The colliding insert did not break the transaction
+            self.assertEqual(AlertState.objects.filter(active=True).count(), 1)
+
+        # And the index was corrected
+        self.assertEqual(CommandRunningAlert.notify(self.command, False).id, alert.id)
+        self.assertEqual(AlertState.objects.filter(active=True).count(), 0)
+
+    def test_lowered_elsewhere(self):
+        alert = CommandRunningAlert.notify(self.command, True)
+        AlertState.objects.filter(id=alert.id).update(active=None)
+
+        end_event = mock.Mock()
+        with mock.patch.object(CommandRunningAlert, "end_event", return_value=end_event):
+            self.assertEqual(CommandRunningAlert.notify(self.command, False), None)
+        self.assertFalse(end_event.register_event.called)
+
+        # A fresh instance, rather than the one lowered elsewhere, is raised
+        self.assertNotEqual(CommandRunningAlert.notify(self.command, True).id, alert.id)
+        self.assertEqual(AlertState.objects.filter(active=True).count(), 1)
+
+    def test_loads_existing_alerts(self):
+        CommandRunningAlert.notify(self.command, True)
+        AlertState.active_index.invalidate()
+
+        CommandRunningAlert.notify(self.command, True)
+        self.assertEqual(AlertState.objects.count(), 1)
+
+    def test_cast(self):
+        CommandRunningAlert.notify(self.command, True).cast(CommandCancelledAlert)
+
+        # The cast alert is no longer a CommandRunningAlert, so this raises a new one
+        CommandRunningAlert.notify(self.command, True)
+        self.assertEqual(
+            sorted(AlertState.objects.filter(active=True).values_list("record_type", flat=True)),
+            ["CommandCancelledAlert", "CommandRunningAlert"],
+        )
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import defaultdict
+
+import mock
+
+from chroma_core.models import Corosync2Configuration, ManagedHost
+from chroma_core.models import corosync2
+from chroma_core.models.corosync2 import AutoConfigureCorosyncStep, McastPortLocks
+from chroma_core.services.log import log_register
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+log = log_register("test_corosync2_peers")
+
+
+class TestCorosyncPeers(IMLUnitTestCase):
+    def setUp(self):
+        super(TestCorosyncPeers, self).setUp()
+
+        mock.patch.object(AutoConfigureCorosyncStep, "peer_mcast_ports", {}).start()
+        mock.patch.object(AutoConfigureCorosyncStep, "mcast_port_peers", defaultdict(set)).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _create_configuration(self, fqdn, mcast_port):
+        host = ManagedHost.objects.create(address=fqdn, fqdn=fqdn, nodename=fqdn)
+        return Corosync2Configuration.objects.create(host=host, mcast_port=mcast_port)
+
+    def test_peers_from_db(self):
+        self._create_configuration("a", 1000)
+        self._create_configuration("b", 1000)
+        self._create_configuration("c", 2000)
+        self._create_configuration("d", 1000).mark_deleted()
+        self._create_configuration("e", 3000)
+
+        # Remembered from earlier runs, since deleted or moved to another port
+        AutoConfigureCorosyncStep._index_peer("d", 1000)
+        AutoConfigureCorosyncStep._index_peer("e", 1000)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(AutoConfigureCorosyncStep._corosync_peers("new", 1000), ["a", "b"])
+
+        self.assertEqual(AutoConfigureCorosyncStep.peer_mcast_ports, {"a": 1000, "b": 1000, "e": 3000, "new": 1000})
+        self.assertEqual(AutoConfigureCorosyncStep.mcast_port_peers[3000], {"e"})
+
+        # Moving to another port leaves the old one
+        self.assertEqual(AutoConfigureCorosyncStep._corosync_peers("new", 2000), ["c"])
+        self.assertEqual(AutoConfigureCorosyncStep.mcast_port_peers[1000], {"a", "b"})
+
+    def test_concurrent_adds(self):
+        """Hosts added at the same time only wait for the hosts sharing their mcast port"""
+        ports = [1000, 2000, 3000, 4000]
+        hosts_per_port = 3
+        in_flight = defaultdict(int)
+        peak = defaultdict(int)
+        in_flight_lock = threading.Lock()
+        all_ports_in_flight = threading.Event()
+
+        def slow_db_mcast_ports(mcast_port, fqdns):
+            with in_flight_lock:
+                in_flight[mcast_port] += 1
+                in_flight[None] += 1
+                for key in [mcast_port, None]:
+                    peak[key] = max(peak[key], in_flight[key])
+                if in_flight[None] == len(ports):
+                    all_ports_in_flight.set()
+
+            # Hold the lookup until one host from every port is looking up at once,
+            # which can only happen if different ports don't wait for each other
+            all_ports_in_flight.wait(1)
+
+            with in_flight_lock:
+                in_flight[mcast_port] -= 1
+                in_flight[None] -= 1
+            return {}, set()
+
+        mock.patch.object(AutoConfigureCorosyncStep, "_db_mcast_ports", side_effect=slow_db_mcast_ports).start()
+        port_locks = McastPortLocks()
+        results = {}
+        locks = defaultdict(set)
+
+        def add_host(fqdn, mcast_port):
+            # As AutoConfigureCorosyncStep.run does
+            with port_locks[mcast_port]:
+                locks[mcast_port].add(id(port_locks[mcast_port]))
+                results[fqdn] = (mcast_port, AutoConfigureCorosyncStep._corosync_peers(fqdn, mcast_port))
+
+        threads = [
+            threading.Thread(target=add_host, args=("host%s_%s" % (port, i), port))
+            for i in range(hosts_per_port)
+            for port in ports
+        ]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start
+
+        log.info("%s concurrent corosync peer lookups: %.3fs" % (len(threads), elapsed))
+
+        # Hosts on different ports looked up their peers concurrently, hosts on the same port one at a time
+        self.assertEqual(peak[None], len(ports))
+        for port in ports:
+            self.assertEqual(peak[port], 1)
+            self.assertEqual(len(locks[port]), 1)
+
+            # Each host on the port saw those added before it
+            port_results = sorted((peers for mcast_port, peers in results.values() if mcast_port == port), key=len)
+            self.assertEqual([len(peers) for peers in port_results], range(hosts_per_port))
+            for earlier, later in zip(port_results, port_results[1:]):
+                self.assertTrue(set(earlier) < set(later))
+            self.assertTrue(all(fqdn.startswith("host%s_" % port) for fqdn in port_results[-1]))
+
+    def test_port_lock_shared(self):
+        self.assertIs(
+            corosync2.peer_mcast_ports_configuration_lock[1000], corosync2.peer_mcast_ports_configuration_lock[1000]
+        )
+        self.assertIsNot(
+            corosync2.peer_mcast_ports_configuration_lock[1000], corosync2.peer_mcast_ports_configuration_lock[2000]
+        )
@@ -0,0 +1,104 @@
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from networkx import Graph, find_cliques
+
+from chroma_core.models import HaCluster, ManagedHost
+from chroma_core.services.log import log_register
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+log = log_register("test_ha_cluster")
+
+
+def uncached_host_peers(host):
+    """host_peers as it was before the topology was cached: a query per host and a new graph per call"""
+    graph = Graph()
+    for edges in [[(h, p) for p in h.ha_cluster_peers.all()] for h in ManagedHost.objects.all()]:
+        graph.add_edges_from(edges)
+
+    for cluster_peers in find_cliques(graph):
+        if host in cluster_peers:
+            return cluster_peers
+
+    return []
+
+
+class TestHaCluster(IMLUnitTestCase):
+    def _create_hosts(self, count, cluster_size):
+        hosts = []
+        for i in range(count):
+            address = "myserver_%d" % i
+            hosts.append(ManagedHost.objects.create(address=address, fqdn=address, nodename=address))
+
+        through = ManagedHost.ha_cluster_peers.through
+        peers = []
+        for start in range(0, count, cluster_size):
+            cluster = hosts[start : start + cluster_size]
+            peers.extend(
+                through(from_managedhost_id=a.id, to_managedhost_id=b.id) for a in cluster for b in cluster if a != b
+            )
+        through.objects.bulk_create(peers)
+
+        return hosts
+
+    def test_host_peers(self):
+        hosts = self._create_hosts(6, 3)
+        lonely = ManagedHost.objects.create(address="lonely", fqdn="lonely", nodename="lonely")
+
+        self.assertEqual(set(HaCluster.host_peers(hosts[0])), set(hosts[0:3]))
+        self.assertEqual(set(HaCluster.host_peers(hosts[4])), set(hosts[3:6]))
+        self.assertEqual(HaCluster.host_peers(lonely), [])
+        self.assertEqual(
+            sorted(set(h.id for h in cluster.peers) for cluster in HaCluster.all_clusters()),
+            sorted([set(h.id for h in hosts[0:3]), set(h.id for h in hosts[3:6])]),
+        )
+
+    def test_invalidation(self):
+        hosts = self._create_hosts(4, 2)
+        self.assertEqual(set(HaCluster.host_peers(hosts[0])), set(hosts[0:2]))
+
+        hosts[0].ha_cluster_peers.add(hosts[2])
+        hosts[1].ha_cluster_peers.add(hosts[2])
+        self.assertEqual(set(HaCluster.host_peers(hosts[2])), set(hosts[0:3]))
+
+        hosts[2].ha_cluster_peers.remove(hosts[0], hosts[1])
+        self.assertEqual(set(HaCluster.host_peers(hosts[2])), set(hosts[2:4]))
+
+        hosts[3].mark_deleted()
+        self.assertEqual(HaCluster.host_peers(hosts[2]), [])
+
+    def test_query_count(self):
+        hosts = self._create_hosts(100, 2)
+        HaCluster.host_peers(hosts[0])
+
+        # Checking the topology is current, then loading the peers
+        with self.assertNumQueries(3):
+            self.assertEqual(set(HaCluster.host_peers(hosts[50])), set(hosts[50:52]))
+        with self.assertNumQueries(3):
+            self.assertEqual(len(HaCluster.all_clusters()), 50)
+
+    def test_benchmark(self):
+        """host_peers for every host of a 1,000 server site"""
+        hosts = self._create_hosts(1000, 2)
+        sample = hosts[::50]
+
+        start = time.time()
+        for host in sample:
+            self.assertEqual(len(uncached_host_peers(host)), 2)
+        uncached_time = (time.time() - start) / len(sample)
+
+        HaCluster.host_peers(hosts[0])
+        with CaptureQueriesContext(connection) as queries:
+            start = time.time()
+            for host in hosts:
+                self.assertEqual(len(HaCluster.host_peers(host)), 2)
+            cached_time = (time.time() - start) / len(hosts)
+
+        log.info(
+            "HaCluster.host_peers with 1000 hosts: %.1fms uncached, %.1fms cached"
+            % (uncached_time * 1000, cached_time * 1000)
+        )
+
+        # The same queries as test_query_count for every host, however many hosts there are
+        self.assertEqual(len(queries), 3 * len(hosts))
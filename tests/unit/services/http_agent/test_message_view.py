@@ -0,0 +1,229 @@
+import Queue
+import gzip
+import json
+import threading
+import time
+from StringIO import StringIO
+
+import mock
+from django.test import RequestFactory, SimpleTestCase
+
+from chroma_agent_comms.views import MessageView, ValidatedClientView
+from chroma_core.services.http_agent.queues import HostQueueCollection
+from chroma_core.services.http_agent.sessions import SessionCollection
+from chroma_core.services.log import log_register
+from tests.utils import patch
+import settings
+
+log = log_register("test_message_view")
+
+CLIENT_START_TIME = "2020-01-01T00:00:00.000000+00:00"
+
+
+class MessageViewTestCase(SimpleTestCase):
+    PLUGIN = "action_runner"
+
+    def setUp(self):
+        super(MessageViewTestCase, self).setUp()
+
+        self.queues = HostQueueCollection()
+        self.sessions = SessionCollection(self.queues)
+        hosts = mock.Mock()
+        hosts.update.return_value = False
+
+        mock.patch.multiple(MessageView, queues=self.queues, sessions=self.sessions, hosts=hosts).start()
+        mock.patch.object(ValidatedClientView, "valid_certs", {}, create=True).start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.factory = RequestFactory()
+        self.view = MessageView.as_view()
+
+    def _add_agent(self, fqdn):
+        ValidatedClientView.valid_certs["serial-%s" % fqdn] = fqdn
+        return self.sessions.create(fqdn, self.PLUGIN)
+
+    def _send(self, fqdn, session, body):
+        self.queues.send(
+            {
+                "fqdn": fqdn,
+                "type": "DATA",
+                "plugin": self.PLUGIN,
+                "session_id": session.id,
+                "session_seq": None,
+                "body": body,
+            }
+        )
+
+    def _get(self, fqdn, **headers):
+        request = self.factory.get(
+            "/agent/message/",
+            {"server_boot_time": CLIENT_START_TIME, "client_start_time": CLIENT_START_TIME},
+            HTTP_X_SSL_CLIENT_SERIAL="serial-%s" % fqdn,
+            HTTP_X_SSL_CLIENT_NAME=fqdn,
+            **headers
+        )
+        response = self.view(request)
+        self.assertEqual(response.status_code, 200)
+
+        content = response.content
+        if response.get("Content-Encoding") == "gzip":
+            content = gzip.GzipFile(fileobj=StringIO(content)).read()
+        return response, json.loads(content)["messages"]
+
+
+class TestMessageView(MessageViewTestCase):
+    def setUp(self):
+        super(TestMessageView, self).setUp()
+
+        self.fqdn = "agent0.example.com"
+        self.session = self._add_agent(self.fqdn)
+
+    def test_count_cap(self):
+        for i in range(25):
+            self._send(self.fqdn, self.session, i)
+
+        with patch(settings, AGENT_MESSAGE_BATCH_MAX_COUNT=10):
+            batches = [[m["body"] for m in self._get(self.fqdn)[1]] for _ in range(3)]
+
+        self.assertEqual(batches, [range(0, 10), range(10, 20), range(20, 25)])
+
+    def test_size_cap(self):
+        body = "x" * 1000
+        for i in range(10):
+            self._send(self.fqdn, self.session, body)
+
+        with patch(settings, AGENT_MESSAGE_BATCH_MAX_BYTES=3500):
+            sizes = [len(self._get(self.fqdn)[1]) for _ in range(4)]
+
+        # The message that overflowed each response went first in the next
+        self.assertEqual(sizes, [3, 3, 3, 1])
+
+        # A single message over the cap is still sent, on its own
+        self._send(self.fqdn, self.session, body)
+        self._send(self.fqdn, self.session, body)
+        with patch(settings, AGENT_MESSAGE_BATCH_MAX_BYTES=100):
+            self.assertEqual(len(self._get(self.fqdn)[1]), 1)
+            self.assertEqual(len(self._get(self.fqdn)[1]), 1)
+
+    def test_stale_session_not_counted(self):
+        stale = mock.Mock(id="stale")
+        for i in range(10):
+            self._send(self.fqdn, stale, i)
+        for i in range(5):
+            self._send(self.fqdn, self.session, i)
+
+        with patch(settings, AGENT_MESSAGE_BATCH_MAX_COUNT=5):
+            self.assertEqual([m["body"] for m in self._get(self.fqdn)[1]], range(5))
+
+    def test_gzip(self):
+        for i in range(100):
+            self._send(self.fqdn, self.session, "message %s" % i)
+
+        response, messages = self._get(self.fqdn, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(len(messages), 100)
+
+        # Small responses and agents that don't ask for gzip get plain JSON
+        self._send(self.fqdn, self.session, "small")
+        response, messages = self._get(self.fqdn, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(len(messages), 1)
+
+        for i in range(100):
+            self._send(self.fqdn, self.session, "message %s" % i)
+        response, messages = self._get(self.fqdn)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(len(messages), 100)
+
+    def test_gzip_post(self):
+        messages = [
+            {
+                "fqdn": self.fqdn,
+                "type": "DATA",
+                "plugin": self.PLUGIN,
+                "session_id": self.session.id,
+                "session_seq": 0,
+                "body": "data",
+            }
+        ]
+        compressed = StringIO()
+        with gzip.GzipFile(fileobj=compressed, mode="w") as f:
+            f.write(json.dumps({"messages": messages}))
+
+        request = self.factory.post(
+            "/agent/message/",
+            compressed.getvalue(),
+            content_type="application/json",
+            HTTP_CONTENT_ENCODING="gzip",
+            HTTP_X_SSL_CLIENT_SERIAL="serial-%s" % self.fqdn,
+            HTTP_X_SSL_CLIENT_NAME=self.fqdn,
+        )
+        self.assertEqual(self.view(request).status_code, 200)
+        self.assertEqual(self.queues.plugin_rx_queue.get_nowait(), messages[0])
+
+    def test_long_poll_wakes(self):
+        threading.Timer(0.5, self._send, (self.fqdn, self.session, "late")).start()
+
+        with patch(MessageView, LONG_POLL_TIMEOUT=10):
+            start = time.time()
+            messages = self._get(self.fqdn)[1]
+
+        self.assertEqual([m["body"] for m in messages], ["late"])
+        self.assertLess(time.time() - start, 5)
+
+
+class TestMessageViewLoad(MessageViewTestCase):
+    """Simulate many agents draining their queues concurrently through a bounded pool of request handlers"""
+
+    AGENT_COUNT = 1000
+    MESSAGES_PER_AGENT = 50
+    HANDLER_THREADS = 32
+
+    def test_many_agents(self):
+        agents = ["agent%s.example.com" % i for i in range(self.AGENT_COUNT)]
+        body = "x" * 200
+        for fqdn in agents:
+            session = self._add_agent(fqdn)
+            for i in range(self.MESSAGES_PER_AGENT):
+                self._send(fqdn, session, body)
+
+        polls = Queue.Queue()
+        for fqdn in agents:
+            polls.put(fqdn)
+        received = dict((fqdn, 0) for fqdn in agents)
+        errors = []
+
+        def handler():
+            while True:
+                try:
+                    fqdn = polls.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    response, messages = self._get(fqdn, HTTP_ACCEPT_ENCODING="gzip")
+                    if len(messages) > settings.AGENT_MESSAGE_BATCH_MAX_COUNT:
+                        errors.append((fqdn, len(messages)))
+                except Exception as e:
+                    errors.append((fqdn, e))
+                    continue
+                received[fqdn] += len(messages)
+                # Like an agent, poll again while there is still work queued
+                if received[fqdn] < self.MESSAGES_PER_AGENT:
+                    polls.put(fqdn)
+
+        with patch(settings, AGENT_MESSAGE_BATCH_MAX_COUNT=16), patch(MessageView, LONG_POLL_TIMEOUT=0):
+            start = time.time()
+            threads = [threading.Thread(target=handler) for _ in range(self.HANDLER_THREADS)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.time() - start
+
+        log.info(
+            "MessageView.get: %s agents, %.0f messages/s"
+            % (self.AGENT_COUNT, self.AGENT_COUNT * self.MESSAGES_PER_AGENT / elapsed)
+        )
+
+        self.assertEqual(errors, [])
+        self.assertEqual(received, dict((fqdn, self.MESSAGES_PER_AGENT) for fqdn in agents))
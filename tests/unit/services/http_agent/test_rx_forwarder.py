@@ -0,0 +1,60 @@
+import Queue
+
+import mock
+from django.test import SimpleTestCase
+
+from chroma_core.services.http_agent.queues import HostQueueCollection, AmqpRxForwarder
+from chroma_core.services.queue import AgentRxQueue
+
+
+class TestAmqpRxForwarder(SimpleTestCase):
+    def setUp(self):
+        super(TestAmqpRxForwarder, self).setUp()
+
+        self.published = []
+        mock.patch.object(
+            AgentRxQueue,
+            "put_many",
+            autospec=True,
+            side_effect=lambda queue, messages: self.published.append((queue.name, list(messages))),
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.queues = HostQueueCollection()
+        self.forwarder = AmqpRxForwarder(self.queues)
+
+    def _message(self, plugin, i):
+        return {"fqdn": "host%s" % i, "type": "DATA", "plugin": plugin, "session_id": None, "body": i}
+
+    def _forward_all(self):
+        while True:
+            try:
+                batch = self.forwarder._get_batch()
+            except Queue.Empty:
+                break
+            self.forwarder._forward(batch)
+
+    def test_batches(self):
+        messages = []
+        for i in range(250):
+            message = self._message("linux" if i % 2 else "corosync", i)
+            messages.append(message)
+            self.queues.receive(message)
+
+        self._forward_all()
+
+        # One publish per plugin for each batch of MAX_BATCH_SIZE messages
+        self.assertEqual(len(self.published), 6)
+        for queue_name, plugin in [("agent_linux_rx", "linux"), ("agent_corosync_rx", "corosync")]:
+            forwarded = sum([batch for name, batch in self.published if name == queue_name], [])
+            self.assertEqual(forwarded, [m for m in messages if m["plugin"] == plugin])
+
+        # One AgentRxQueue per plugin is reused between batches
+        self.assertEqual(sorted(self.forwarder._rx_queues.keys()), ["corosync", "linux"])
+
+        stats = self.forwarder.stats()
+        self.assertEqual(stats["messages_forwarded"], 250)
+        self.assertEqual(stats["batches_forwarded"], 3)
+        self.assertEqual(stats["last_batch_size"], 50)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertAlmostEqual(stats["mean_batch_size"], 250 / 3.0)
@@ -175,13 +175,21 @@ class JobTestCase(IMLUnitTestCase):
 
         NotificationQueue.put = mock.Mock(side_effect=job_scheduler_queue_immediate)
 
+        # Deliver each notification as it is made rather than when the coalescing window expires
+        from chroma_core.services.job_scheduler import job_scheduler_notify
+
+        coalesce_patch = mock.patch.object(job_scheduler_notify._coalescer, "window", 0)
+        coalesce_patch.start()
+        self.addCleanup(coalesce_patch.stop)
+
         import chroma_core.services.job_scheduler.job_scheduler
 
         chroma_core.services.job_scheduler.job_scheduler._disable_database = mock.Mock()
 
         def _spawn_job(job):
             log.debug("functional spawn job")
-            thread = RunJobThread(self.job_scheduler.progress, self.job_scheduler._db_quota, job, job.get_steps())
+            # Steps run in this thread on the test's connection, rather than one from the pool
+            thread = RunJobThread(self.job_scheduler.progress, mock.Mock(), job, job.get_steps())
             self.job_scheduler._run_threads[job.id] = thread
             thread._run()
 
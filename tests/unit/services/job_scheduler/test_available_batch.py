@@ -0,0 +1,126 @@
+import mock
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chroma_help.help import help_text
+
+from chroma_core.lib.cache import ObjectCache
+from chroma_core.lib.util import all_subclasses
+from chroma_core.models import AdvertisedJob, Job, ManagedHost, ServerProfile
+from chroma_core.services.job_scheduler.job_scheduler import JobScheduler
+from tests.unit.chroma_core.helpers import load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestAvailableBatch(IMLUnitTestCase):
+    """available_transitions and available_jobs for many objects at once, as the API asks for a page of objects"""
+
+    HOST_COUNT = 1000
+
+    def setUp(self):
+        super(TestAvailableBatch, self).setUp()
+
+        load_default_profile()
+        server_profile = ServerProfile.objects.get(name="test_profile")
+        self.hosts = [
+            ManagedHost.objects.create(
+                address="host%s.tld" % i,
+                fqdn="host%s.tld" % i,
+                nodename="host%s.tld" % i,
+                state="managed",
+                server_profile=server_profile,
+            )
+            for i in range(self.HOST_COUNT)
+        ]
+
+        # Load the caches with every host before counting queries
+        ObjectCache.clear()
+        self.addCleanup(ObjectCache.clear)
+        self.js = JobScheduler()
+        ObjectCache.getInstance()
+
+        self.ct_id = ContentType.objects.get_for_model(ManagedHost).id
+        self.object_list = [(self.ct_id, host.id) for host in self.hosts]
+
+    def _composite_id(self, host_id):
+        return "{}:{}".format(self.ct_id, host_id)
+
+    def test_locked_query_count(self):
+        """Looking up the objects and their locks costs a query per content type, whatever the number of objects"""
+
+        write_locks = dict((host, mock.Mock()) for host in self.hosts)
+        with mock.patch.object(self.js._lock_cache, "get_write_by_locked_item", return_value=write_locks):
+            with self.assertNumQueries(1):
+                transitions = self.js.available_transitions(self.object_list)
+            with self.assertNumQueries(0):
+                jobs = self.js.available_jobs(self.object_list)
+
+        for host in self.hosts:
+            self.assertEqual(transitions[self._composite_id(host.id)], [])
+            self.assertEqual(jobs[self._composite_id(host.id)], [])
+
+    def _unlocked_query_count(self, object_list):
+        with CaptureQueriesContext(connection) as transition_queries:
+            self.js.available_transitions(object_list)
+        with CaptureQueriesContext(connection) as job_queries:
+            self.js.available_jobs(object_list)
+
+        return len(transition_queries), len(job_queries)
+
+    def test_unlocked_query_count(self):
+        """Checking which jobs can run costs the same number of queries for 10 objects as for 1,000"""
+
+        # Warm the per-process lookups (content types, advertised job classes) first
+        self._unlocked_query_count(self.object_list[:1])
+
+        few = self._unlocked_query_count(self.object_list[:10])
+        many = self._unlocked_query_count(self.object_list)
+
+        self.assertEqual(many, few)
+
+    def test_expected_transitions_and_jobs(self):
+        missing_id = max(host.id for host in self.hosts) + 1
+        object_list = self.object_list[:5] + [(self.ct_id, missing_id)]
+
+        transitions = self.js.available_transitions(object_list)
+        jobs = self.js.available_jobs(object_list)
+
+        # test_profile is managed, and the hosts have no outlets, client mounts or alerts
+        for ct_id, host_id in object_list[:5]:
+            composite_id = self._composite_id(host_id)
+            self.assertEqual(
+                transitions[composite_id],
+                [
+                    {
+                        "state": "removed",
+                        "verb": "Remove",
+                        "long_description": help_text["remove_configured_server"],
+                        "display_group": Job.JOB_GROUPS.EMERGENCY,
+                        "display_order": 120,
+                    }
+                ],
+            )
+            self.assertEqual(
+                sorted((job["class_name"], job["verb"], job["args"]) for job in jobs[composite_id]),
+                [
+                    ("ForceRemoveHostJob", "Force Remove", {"host_id": host_id}),
+                    ("RebootHostJob", "Reboot", {"host_id": host_id}),
+                    ("ShutdownHostJob", "Shutdown", {"host_id": host_id}),
+                ],
+            )
+
+        self.assertEqual(transitions[self._composite_id(missing_id)], [])
+        self.assertEqual(jobs[self._composite_id(missing_id)], [])
+
+    def test_advertised_job_index(self):
+        host = self.hosts[0]
+        expected = [
+            job_class
+            for job_class in all_subclasses(AdvertisedJob)
+            if not job_class.plural
+            for class_name in job_class.classes
+            if isinstance(host, ContentType.objects.get_by_natural_key("chroma_core", class_name.lower()).model_class())
+        ]
+
+        self.assertEqual(JobScheduler._advertised_job_classes(ManagedHost), expected)
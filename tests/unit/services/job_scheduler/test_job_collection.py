@@ -0,0 +1,133 @@
+import json
+import time
+
+import mock
+from django.test import SimpleTestCase
+
+from chroma_core.services.job_scheduler.job_scheduler import JobCollection
+from chroma_core.services.log import log_register
+
+log = log_register("test_job_collection")
+
+
+class FakeJob(object):
+    def __init__(self, id, wait_for=()):
+        self.id = id
+        self.state = "pending"
+        self._wait_for_json = json.dumps(list(wait_for))
+        self.wait_for_reads = 0
+
+    @property
+    def wait_for_json(self):
+        self.wait_for_reads += 1
+        return self._wait_for_json
+
+    def __repr__(self):
+        return "FakeJob(%s)" % self.id
+
+
+class TestJobCollection(SimpleTestCase):
+    def setUp(self):
+        super(TestJobCollection, self).setUp()
+
+        # JobCollection persists state changes, which we don't care about here
+        mock.patch("chroma_core.services.job_scheduler.job_scheduler.Job").start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.collection = JobCollection()
+
+    def _complete(self, job):
+        self.collection.update_many([job], "tasked")
+        self.collection.update(job, "complete", errored=False, cancelled=False)
+
+    def test_ready_follows_dependencies(self):
+        a = FakeJob(1)
+        b = FakeJob(2, [1])
+        c = FakeJob(3, [1, 2])
+        for job in [a, b, c]:
+            self.collection.add(job)
+
+        self.assertEqual(self.collection.ready_jobs, [a])
+
+        self.collection.update_many([a], "tasked")
+        self.assertEqual(self.collection.ready_jobs, [])
+
+        self.collection.update(a, "complete", errored=False, cancelled=False)
+        self.assertEqual(self.collection.ready_jobs, [b])
+
+        self._complete(b)
+        self.assertEqual(self.collection.ready_jobs, [c])
+
+    def test_wait_for_already_complete(self):
+        a = FakeJob(1)
+        self.collection.add(a)
+        self._complete(a)
+
+        # Keep something in flight so that the collection isn't flushed
+        self.collection.add(FakeJob(2, [99]))
+
+        b = FakeJob(3, [1])
+        self.collection.add(b)
+        self.assertEqual(self.collection.ready_jobs, [b])
+
+    def test_cancelled_pending_job(self):
+        a = FakeJob(1)
+        b = FakeJob(2, [1])
+        self.collection.add(a)
+        self.collection.add(b)
+
+        # Cancelling a job straight out of pending removes it from the index
+        self.collection.update(b, "complete", cancelled=True)
+        self._complete(a)
+        self.assertEqual(self.collection.ready_jobs, [])
+
+    def test_readd_job(self):
+        a = FakeJob(1)
+        b = FakeJob(2, [1])
+        self.collection.add(a)
+        self.collection.add(b)
+        self.collection.add(b)
+
+        self._complete(a)
+        self.assertEqual(self.collection.ready_jobs, [b])
+
+    def test_scaling(self):
+        """Check that draining a chain of dependent jobs is linear in the number of jobs"""
+
+        def drain(job_count):
+            collection = JobCollection()
+            jobs = [FakeJob(i, [i - 1] if i else []) for i in range(job_count)]
+            for job in jobs:
+                collection.add(job)
+
+            with mock.patch(
+                "chroma_core.services.job_scheduler.job_scheduler.json.loads", side_effect=json.loads
+            ) as loads:
+                start = time.time()
+                drained = 0
+                advances = 0
+                while True:
+                    ready = collection.ready_jobs
+                    if not ready:
+                        break
+                    collection.update_many(ready, "tasked")
+                    for job in ready:
+                        collection.update(job, "complete", errored=False, cancelled=False)
+                    drained += len(ready)
+                    advances += 1
+                elapsed = time.time() - start
+
+                # wait_for_json was parsed once, on add, and never again
+                self.assertEqual(loads.call_count, 0)
+
+            log.info("JobCollection drained %s jobs in %.3fs" % (job_count, elapsed))
+
+            self.assertEqual(drained, job_count)
+            self.assertEqual(advances, job_count)
+
+            # Each job's dependencies were read once when it was added, rather than
+            # being rescanned against the complete jobs on every advance
+            self.assertEqual(sum(job.wait_for_reads for job in jobs), job_count)
+
+        drain(500)
+        drain(5000)
@@ -0,0 +1,89 @@
+import time
+
+import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chroma_core.models import StepResult, StepResultChunk, StopLNetJob
+from chroma_core.services.job_scheduler.job_scheduler import JobProgress
+from chroma_core.services.log import log_register
+from tests.unit.chroma_core.helpers import synthetic_host, load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+from tests.utils import patch
+import settings
+
+log = log_register("test_job_progress")
+
+
+class TestJobProgressOutput(IMLUnitTestCase):
+    CONSOLE_BYTES = 10 * 1024 * 1024
+    WRITE_BYTES = 4096
+
+    def setUp(self):
+        super(TestJobProgressOutput, self).setUp()
+
+        load_default_profile()
+        host = synthetic_host("myserver")
+        self.job = StopLNetJob.objects.create(lnet_configuration=host.lnet_configuration)
+        step_klass, args = self.job.get_steps()[0]
+
+        self.progress = JobProgress(mock.Mock())
+        self.progress._start_step(self.job.id, step_klass=step_klass, args=args, step_index=0, step_count=1)
+
+    def _step_result(self):
+        return StepResult.objects.get(job=self.job)
+
+    def test_running_step_assembled(self):
+        self.progress._log(self.job.id, "one ")
+        self.progress._console(self.job.id, "console ")
+        self.progress._log(self.job.id, "two")
+
+        # Nothing is written until a threshold is reached
+        self.assertEqual(self._step_result().assembled("log"), "")
+
+        self.progress._flush_output()
+        self.progress._log(self.job.id, " three")
+        self.progress._flush_output()
+
+        step_result = self._step_result()
+        self.assertEqual(step_result.log, "")
+        self.assertEqual(step_result.assembled("log"), "one two three")
+        self.assertEqual(step_result.assembled("console"), "console ")
+
+        self.progress._step_success(self.job.id, None)
+
+        step_result = self._step_result()
+        self.assertEqual((step_result.log, step_result.console), ("one two three", "console "))
+        self.assertEqual(step_result.assembled("log"), "one two three")
+        self.assertFalse(StepResultChunk.objects.exists())
+
+    def test_flush_interval(self):
+        with patch(settings, STEP_OUTPUT_FLUSH_INTERVAL=0.1):
+            self.progress._log(self.job.id, "output")
+            self.assertGreater(self.progress._flush_timeout(), 0)
+            time.sleep(0.1)
+            self.assertEqual(self.progress._flush_timeout(), 0)
+
+    def test_stream_console(self):
+        """Stream 10MB of console output through a step: writes must not grow with the output already written"""
+        write = "x" * (self.WRITE_BYTES - 1) + "\n"
+        writes = self.CONSOLE_BYTES / self.WRITE_BYTES
+
+        start = time.time()
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(writes):
+                self.progress._console(self.job.id, write)
+            self.progress._step_failure(self.job.id, "backtrace")
+        elapsed = time.time() - start
+
+        log.info("JobProgress: %.1fMB/s console output" % (self.CONSOLE_BYTES / elapsed / (1024 * 1024)))
+
+        # An insert per STEP_OUTPUT_FLUSH_BYTES, and the StepResult is only updated when the step completes
+        flushes = self.CONSOLE_BYTES / settings.STEP_OUTPUT_FLUSH_BYTES
+        self.assertLess(len(queries), flushes * 4 + 20)
+        self.assertEqual(len([q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]), 1)
+
+        step_result = self._step_result()
+        self.assertEqual(step_result.state, "failed")
+        self.assertEqual(len(step_result.console), self.CONSOLE_BYTES)
+        self.assertFalse(StepResultChunk.objects.exists())
@@ -0,0 +1,127 @@
+import random
+import time
+from collections import Counter
+
+import mock
+
+from chroma_core.models import StateLock
+from chroma_core.services.job_scheduler.lock_cache import LockCache
+from chroma_core.services.log import log_register
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+log = log_register("test_lock_cache")
+
+# How many times jobs' IDs were read and locks compared, as a measure of the locks visited
+visits = Counter()
+
+
+class FakeJob(object):
+    def __init__(self, id):
+        self._id = id
+
+    @property
+    def id(self):
+        visits["job_id"] += 1
+        return self._id
+
+
+class CountingStateLock(StateLock):
+    def __eq__(self, other):
+        visits["lock_eq"] += 1
+        return self is other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = StateLock.__hash__
+
+
+class TestLockCache(IMLUnitTestCase):
+    LOCK_COUNT = 10000
+    ITEM_COUNT = 100
+
+    def setUp(self):
+        super(TestLockCache, self).setUp()
+
+        # Receivers serialize locks for the UI, which our fake jobs and items don't support
+        mock.patch.object(LockCache, "lock_change_receivers", []).start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.lock_cache = LockCache()
+
+        # Add locks out of job order, as happens when a command depends on earlier jobs
+        self.jobs = [FakeJob(i) for i in range(1, self.LOCK_COUNT + 1)]
+        self.items = ["item-%s" % i for i in range(self.ITEM_COUNT)]
+        self.locks = []
+        rng = random.Random(0)
+        for job in rng.sample(self.jobs, len(self.jobs)):
+            lock = CountingStateLock(job=job, locked_item=rng.choice(self.items), write=rng.choice([True, False]))
+            self.lock_cache.add(lock)
+            self.locks.append(lock)
+
+    def _expected_latest_write(self, item, not_job=None):
+        writes = [l for l in self.locks if l.write and l.locked_item == item and l.job != not_job]
+        return max(writes, key=lambda l: l.job.id) if writes else None
+
+    def test_latest_write(self):
+        for item in self.items:
+            expected = self._expected_latest_write(item)
+            self.assertEqual(self.lock_cache.get_latest_write(item), expected)
+            self.assertEqual(
+                self.lock_cache.get_latest_write(item, not_job=expected.job),
+                self._expected_latest_write(item, not_job=expected.job),
+            )
+
+        self.assertEqual(self.lock_cache.get_latest_write("no-such-item"), None)
+        self.assertEqual(
+            self.lock_cache.get_write_by_locked_item(), dict((i, self._expected_latest_write(i)) for i in self.items)
+        )
+
+    def test_read_locks_after(self):
+        item = self.items[0]
+        after = self.LOCK_COUNT / 2
+        expected = [l for l in self.locks if not l.write and l.locked_item == item and l.job.id >= after]
+
+        self.assertEqual(
+            sorted(self.lock_cache.get_read_locks(item, after=after, not_job=None), key=lambda l: l.job.id),
+            sorted(expected, key=lambda l: l.job.id),
+        )
+
+    def test_remove_job(self):
+        for lock in self.locks[: self.LOCK_COUNT / 2]:
+            self.assertEqual(self.lock_cache.remove_job(lock.job), 1)
+        remaining = self.locks[self.LOCK_COUNT / 2 :]
+
+        self.assertEqual(self.lock_cache.write_locks | self.lock_cache.read_locks, set(remaining))
+        self.locks = remaining
+        for item in self.items:
+            self.assertEqual(self.lock_cache.get_latest_write(item), self._expected_latest_write(item))
+
+    def test_benchmark(self):
+        """With 10k outstanding locks, lookups and removals should not scan every lock"""
+        visits.clear()
+        start = time.time()
+        for i in range(self.LOCK_COUNT):
+            self.lock_cache.get_latest_write(self.items[i % self.ITEM_COUNT])
+        lookup_time = time.time() - start
+
+        # Each lookup goes straight to the latest write, rather than sorting the item's locks
+        self.assertLessEqual(sum(visits.values()), self.LOCK_COUNT)
+
+        most_locks_on_an_item = max(len(locks) for locks in self.lock_cache.all_by_item.values())
+        visits.clear()
+        start = time.time()
+        for job in self.jobs:
+            self.lock_cache.remove_job(job)
+        remove_time = time.time() - start
+
+        # Each removal visits at most the locks on the same item, rather than every outstanding lock
+        self.assertLessEqual(visits["lock_eq"], self.LOCK_COUNT * most_locks_on_an_item)
+
+        self.assertFalse(self.lock_cache.write_locks or self.lock_cache.read_locks)
+        self.assertFalse(self.lock_cache.write_by_item or self.lock_cache.read_by_item)
+
+        log.info(
+            "%s locks: %.3fs for %s lookups, %.3fs to remove them all"
+            % (self.LOCK_COUNT, lookup_time, self.LOCK_COUNT, remove_time)
+        )
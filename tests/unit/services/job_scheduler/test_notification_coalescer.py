@@ -0,0 +1,106 @@
+import threading
+
+import mock
+from django.test import SimpleTestCase
+
+from chroma_core.services.job_scheduler import QueueHandler
+from chroma_core.services.job_scheduler.job_scheduler import JobScheduler
+from chroma_core.services.job_scheduler.job_scheduler_notify import NotificationCoalescer, NotificationQueue
+
+
+class TestNotificationCoalescer(SimpleTestCase):
+    def setUp(self):
+        super(TestNotificationCoalescer, self).setUp()
+
+        self.sent = []
+        self.put = mock.patch.object(
+            NotificationQueue, "put", autospec=True, side_effect=lambda queue, body: self.sent.append(body)
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _notification(self, instance_id, time, update_attrs, from_states=[]):
+        return {
+            "instance_natural_key": ["chroma_core", "managedhost"],
+            "instance_id": instance_id,
+            "time": time,
+            "update_attrs": update_attrs,
+            "from_states": from_states,
+        }
+
+    def test_coalesce(self):
+        coalescer = NotificationCoalescer(3600)
+
+        # Every host reports the same thing on each of ten cycles
+        for cycle in range(10):
+            for host_id in range(100):
+                coalescer.add(self._notification(host_id, cycle, {"boot_time": cycle}))
+        # A different attribute set, or different from_states, is a different notification
+        coalescer.add(self._notification(0, 10, {"boot_time": 10, "properties": "{}"}))
+        coalescer.add(self._notification(0, 11, {"boot_time": 11}, ["managed"]))
+        # A repeat moves to the back, after the notifications it superseded
+        coalescer.add(self._notification(1, 12, {"boot_time": 12}))
+
+        self.assertEqual(self.sent, [])
+        coalescer.flush()
+
+        self.assertEqual(self.put.call_count, 1)
+        notifications = self.sent[0]["notifications"]
+        self.assertEqual(len(notifications), 102)
+        self.assertEqual(
+            [(n["instance_id"], n["time"]) for n in notifications],
+            [(0, 9)] + [(host_id, 9) for host_id in range(2, 100)] + [(0, 10), (0, 11), (1, 12)],
+        )
+
+        # Nothing left to send
+        coalescer.flush()
+        self.assertEqual(self.put.call_count, 1)
+
+    def test_window_expiry(self):
+        coalescer = NotificationCoalescer(0.1)
+        sent = threading.Event()
+        self.put.side_effect = lambda queue, body: (self.sent.append(body), sent.set())
+
+        coalescer.add(self._notification(0, 0, {"boot_time": 0}))
+        coalescer.add(self._notification(0, 1, {"boot_time": 1}))
+
+        self.assertTrue(sent.wait(5))
+        self.assertEqual(self.sent, [{"notifications": [self._notification(0, 1, {"boot_time": 1})]}])
+
+    def test_no_window(self):
+        coalescer = NotificationCoalescer(0)
+
+        coalescer.add(self._notification(0, 0, {"boot_time": 0}))
+        coalescer.add(self._notification(0, 1, {"boot_time": 1}))
+
+        self.assertEqual(self.put.call_count, 2)
+
+
+class TestQueueHandler(SimpleTestCase):
+    """A bad message must not take down the thread serving the notification queue"""
+
+    def setUp(self):
+        super(TestQueueHandler, self).setUp()
+
+        mock.patch("chroma_core.services.job_scheduler.job_scheduler_notify.NotificationQueue").start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.job_scheduler = mock.Mock()
+        self.handler = QueueHandler(self.job_scheduler)
+
+    def test_old_format_message(self):
+        self.handler.on_message(
+            {"instance_natural_key": ["chroma_core", "managedhost"], "instance_id": 1, "time": 0, "update_attrs": {}}
+        )
+        self.assertFalse(self.job_scheduler.notify_many.called)
+
+    def test_notify_many_fails(self):
+        self.job_scheduler.notify_many.side_effect = RuntimeError("Oops")
+        self.handler.on_message({"notifications": []})
+        self.job_scheduler.notify_many.assert_called_once_with([])
+
+    def test_run_next_fails(self):
+        job_scheduler = mock.Mock(spec=JobScheduler, _lock=threading.RLock())
+        job_scheduler._run_next.side_effect = RuntimeError("Oops")
+
+        JobScheduler.notify_many(job_scheduler, [])
+        self.assertTrue(job_scheduler._run_next.called)
@@ -0,0 +1,85 @@
+import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chroma_core.models import ManagedMgs, ManagedTargetMount, TargetRecoveryInfo, VolumeNode
+from chroma_core.services.lustre_audit.update_scan import UpdateScan
+from iml_common.lib.date_time import IMLDateTime
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+from tests.unit.chroma_core.helpers import synthetic_host, synthetic_volume_full, load_default_profile
+
+
+class TestUpdateScan(IMLUnitTestCase):
+    def setUp(self):
+        super(TestUpdateScan, self).setUp()
+
+        load_default_profile()
+
+        self.host = synthetic_host()
+        self.other_host = synthetic_host()
+        self.targets = []
+
+        self.notify = mock.patch("chroma_core.services.job_scheduler.job_scheduler_notify.notify").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _create_targets(self, n):
+        """Create targets until there are n of them"""
+        for i in range(len(self.targets), n):
+            volume = synthetic_volume_full(self.host, secondary_hosts=[self.other_host])
+            target = ManagedMgs.objects.create(volume=volume, ha_label="MGS_%s" % i, uuid="uuid%s" % i)
+            for volume_node in VolumeNode.objects.filter(volume=volume):
+                ManagedTargetMount.objects.create(
+                    target=target, host=volume_node.host, volume_node=volume_node, primary=volume_node.primary
+                )
+            self.targets.append(target)
+
+    def _scan(self, resource_locations):
+        update_scan = UpdateScan()
+        update_scan.host = self.host
+        update_scan.started_at = IMLDateTime.utcnow()
+        update_scan.host_data = {"mounts": [], "metrics": {}, "resource_locations": resource_locations}
+        return update_scan
+
+    def test_resource_locations_query_count(self):
+        """The number of queries to resolve resource locations should not grow with the number of targets"""
+        query_counts = []
+        for n in [5, 10]:
+            self._create_targets(n)
+            resource_locations = dict((t.ha_label, self.host.nodename) for t in self.targets)
+            resource_locations["not_a_target"] = self.host.nodename
+
+            with CaptureQueriesContext(connection) as queries:
+                self._scan(resource_locations).update_resource_locations()
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+        # Every target was reported mounted on its mount on self.host
+        self.assertEqual(self.notify.call_count, 5 + 10)
+        for call in self.notify.call_args_list[-10:]:
+            target, _, attrs, _ = call[0]
+            self.assertEqual(attrs["state"], "mounted")
+            self.assertEqual(attrs["active_mount_id"], ManagedTargetMount.objects.get(target=target, host=self.host).id)
+
+    def test_unchanged_locations_not_notified(self):
+        self._create_targets(3)
+        for target in self.targets:
+            target.state = "mounted"
+            target.active_mount = ManagedTargetMount.objects.get(target=target, host=self.host)
+            target.save()
+
+        self._scan(dict((t.ha_label, self.host.nodename) for t in self.targets)).update_resource_locations()
+        self.assertFalse(self.notify.called)
+
+        self._scan(dict((t.ha_label, self.other_host.fqdn) for t in self.targets)).update_resource_locations()
+        self.assertEqual(self.notify.call_count, 3)
+
+    def test_unchanged_recovery_status_not_rewritten(self):
+        self._create_targets(3)
+
+        self._scan({}).update_target_mounts()
+        recovery_info_ids = set(TargetRecoveryInfo.objects.values_list("id", flat=True))
+        self.assertEqual(len(recovery_info_ids), 3)
+
+        self._scan({}).update_target_mounts()
+        self.assertEqual(set(TargetRecoveryInfo.objects.values_list("id", flat=True)), recovery_info_ids)
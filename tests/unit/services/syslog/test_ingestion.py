@@ -0,0 +1,86 @@
+import time
+
+import mock
+
+from chroma_core.models import ClientConnectEvent, LogMessage, MessageClass
+from chroma_core.services.log import log_register
+from chroma_core.services.queue import AgentRxQueue
+from chroma_core.services.syslog import Service
+from tests.unit.chroma_core.helpers import synthetic_host, load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+log = log_register("test_ingestion")
+
+CONNECT_MESSAGE = (
+    " Lustre: 5629:0:(ldlm_lib.c:877:target_handle_connect()) lustre-MDT0000: connection from "
+    "26959b68-1208-1fca-1f07-da2dc872c55f@192.168.122.218@tcp t0 exp 0000000000000000 cur 1317994929 last 0"
+)
+
+
+class TestSyslogIngestion(IMLUnitTestCase):
+    LINE_COUNT = 100000
+    BATCH_SIZE = 1000
+
+    def setUp(self):
+        super(TestSyslogIngestion, self).setUp()
+
+        load_default_profile()
+        self.host = synthetic_host("myaddress")
+
+        mock.patch.object(AgentRxQueue, "purge").start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.service = Service()
+        self.service.log = log
+
+    def _line(self, message):
+        return {
+            "message": message,
+            "severity": 6,
+            "facility": 0,
+            "source": "kernel",
+            "datetime": "2020-01-01T00:00:00.000000+00:00",
+        }
+
+    def test_classify_and_parse(self):
+        self.service.on_data(
+            self.host.fqdn,
+            {
+                "log_lines": [
+                    self._line("[1234.5] LustreError: 11-0: an error"),
+                    self._line(" Lustre: some news"),
+                    self._line("LustreErrorous: not lustre"),
+                    self._line(CONNECT_MESSAGE),
+                ]
+            },
+        )
+
+        self.assertEqual(
+            list(LogMessage.objects.order_by("id").values_list("message_class", flat=True)),
+            [MessageClass.LUSTRE_ERROR, MessageClass.LUSTRE, MessageClass.NORMAL, MessageClass.LUSTRE],
+        )
+        self.assertEqual(ClientConnectEvent.objects.count(), 1)
+
+    def test_no_host_lookup_without_hits(self):
+        with self.assertNumQueries(0):
+            self.service._parser.parse_many(self.host.fqdn, [self._line("nothing to see") for _ in range(100)])
+
+    def test_benchmark(self):
+        lines = []
+        for i in range(self.LINE_COUNT):
+            if i % 1000 == 0:
+                lines.append(self._line(CONNECT_MESSAGE))
+            elif i % 3 == 0:
+                lines.append(self._line("[%s.0] LustreError: 0:0:(ldlm_lockd.c:356) something failed" % i))
+            else:
+                lines.append(self._line("systemd[1]: Started Session %s of user root." % i))
+
+        start = time.time()
+        for i in range(0, self.LINE_COUNT, self.BATCH_SIZE):
+            self.service.on_data(self.host.fqdn, {"log_lines": lines[i : i + self.BATCH_SIZE]})
+        elapsed = time.time() - start
+
+        log.info("syslog ingestion: %.0f lines/s" % (self.LINE_COUNT / elapsed))
+
+        self.assertEqual(LogMessage.objects.count(), self.LINE_COUNT)
+        self.assertEqual(ClientConnectEvent.objects.count(), self.LINE_COUNT / 1000)
@@ -0,0 +1,187 @@
+import threading
+import time
+
+import django.db
+import mock
+from django.test import SimpleTestCase
+
+from chroma_core.services.dbutils import ConnectionPool
+from chroma_core.services.log import log_register
+
+log = log_register("test_connection_pool")
+
+
+def _query():
+    cursor = django.db.connection.cursor()
+    cursor.execute("SELECT 1")
+    return cursor.fetchone()[0]
+
+
+class ConnectionQuota(object):
+    """The semaphore-only quota job steps used before ConnectionPool: a new connection for every step"""
+
+    def __init__(self, max_connections):
+        self._semaphore = threading.Semaphore(max_connections)
+
+    def check_out(self):
+        self._semaphore.acquire()
+
+    def check_in(self):
+        django.db.connection.close()
+        self._semaphore.release()
+
+
+class TestConnectionPool(SimpleTestCase):
+    allow_database_queries = True
+
+    JOB_COUNT = 500
+    MAX_CONNECTIONS = 10
+
+    def _in_thread(self, fn):
+        errors = []
+
+        def run():
+            try:
+                fn()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                django.db.connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual(errors, [])
+
+    def test_reuse(self):
+        pool = ConnectionPool(2)
+        raw_connections = []
+
+        def use():
+            for _ in range(3):
+                with pool.connection():
+                    self.assertEqual(_query(), 1)
+                    raw_connections.append(django.db.connection.connection)
+                self.assertIsNone(django.db.connection.connection)
+
+        self._in_thread(use)
+        self._in_thread(use)
+
+        # Every check out, from either thread, got the same connection back
+        self.assertEqual(len(set(id(c) for c in raw_connections)), 1)
+        self.assertEqual(pool.idle_count, 1)
+        pool.close_idle()
+
+    def test_health_check(self):
+        pool = ConnectionPool(2)
+
+        def break_connection():
+            with pool.connection():
+                _query()
+                django.db.connection.connection.close()
+
+        def use():
+            with pool.connection():
+                self.assertEqual(_query(), 1)
+
+        self._in_thread(break_connection)
+        self._in_thread(use)
+        pool.close_idle()
+
+    def test_transaction_not_reused(self):
+        pool = ConnectionPool(2)
+
+        def leave_transaction():
+            pool.check_out()
+            _query()
+            django.db.connection.set_autocommit(False)
+            pool.check_in()
+
+        self._in_thread(leave_transaction)
+        self.assertEqual(pool.idle_count, 0)
+
+    def test_reserved(self):
+        pool = ConnectionPool(2, reserved=1)
+
+        def hold(checked_out, release, priority=False):
+            with pool.connection(priority):
+                checked_out.set()
+                release.wait()
+
+        holding, release_holder = threading.Event(), threading.Event()
+        holder = threading.Thread(target=hold, args=(holding, release_holder))
+        holder.start()
+        self.assertTrue(holding.wait(5))
+
+        # The last connection is only for priority check outs...
+        waiting, release_waiter = threading.Event(), threading.Event()
+        waiter = threading.Thread(target=hold, args=(waiting, release_waiter))
+        waiter.start()
+        self.assertFalse(waiting.wait(0.5))
+
+        # ...which don't wait
+        def priority_check_out():
+            with pool.connection(priority=True):
+                pass
+
+        self._in_thread(priority_check_out)
+        self.assertFalse(waiting.is_set())
+
+        release_holder.set()
+        self.assertTrue(waiting.wait(5))
+        release_waiter.set()
+        holder.join()
+        waiter.join()
+
+    def _run_jobs(self, pool):
+        """Run JOB_COUNT single-query steps from as many threads at once, as when many jobs are launched
+
+        :return: (number of database connections opened, elapsed time)
+        """
+        wrapper_class = type(django.db.connections[django.db.DEFAULT_DB_ALIAS])
+        connect = wrapper_class.connect
+        connects = []
+        connects_lock = threading.Lock()
+
+        def counting_connect(wrapper):
+            with connects_lock:
+                connects.append(wrapper)
+            return connect(wrapper)
+
+        def step():
+            try:
+                pool.check_out()
+                try:
+                    _query()
+                finally:
+                    pool.check_in()
+            finally:
+                django.db.connection.close()
+
+        threads = [threading.Thread(target=step) for _ in range(self.JOB_COUNT)]
+        with mock.patch.object(wrapper_class, "connect", counting_connect):
+            start = time.time()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.time() - start
+
+        return len(connects), elapsed
+
+    def test_throughput(self):
+        quota_connects, quota_time = self._run_jobs(ConnectionQuota(self.MAX_CONNECTIONS))
+
+        pool = ConnectionPool(self.MAX_CONNECTIONS)
+        pool_connects, pool_time = self._run_jobs(pool)
+        self.assertLessEqual(pool.idle_count, self.MAX_CONNECTIONS)
+        pool.close_idle()
+
+        log.info(
+            "%s steps: %.0f/s connecting per step, %.0f/s from a pool"
+            % (self.JOB_COUNT, self.JOB_COUNT / quota_time, self.JOB_COUNT / pool_time)
+        )
+
+        # Connecting per step opens a connection for every step, the pool no more than it holds
+        self.assertEqual(quota_connects, self.JOB_COUNT)
+        self.assertLessEqual(pool_connects, self.MAX_CONNECTIONS)
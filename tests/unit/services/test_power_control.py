@@ -1,13 +1,21 @@
+import os
+import shutil
+import tempfile
 import threading
+import time
 
 import mock
 
 from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+from tests.utils import patch
 from chroma_core.models.power_control import PowerControlType, PowerControlDevice, PowerControlDeviceOutlet
-from chroma_core.services.power_control.manager import PowerControlManager
+from chroma_core.services.power_control.manager import PowerControlManager, OutletCommandExecutor
 from chroma_core.services.power_control.monitor_daemon import PowerMonitorDaemon, PowerDeviceMonitor
+from chroma_core.services.log import log_register
 from tests.integration.core.constants import TEST_TIMEOUT
 
+log = log_register("test_power_control")
+
 
 class PowerControlTestCase(IMLUnitTestCase):
     def setUp(self):
@@ -18,7 +26,7 @@ class PowerControlTestCase(IMLUnitTestCase):
         self.threads_at_start = set(threading.enumerate())
 
         self.power_manager = PowerControlManager()
-        monitor_daemon = PowerMonitorDaemon(self.power_manager)
+        self.monitor_daemon = monitor_daemon = PowerMonitorDaemon(self.power_manager)
 
         class MonitorDaemonThread(threading.Thread):
             def run(self):
@@ -80,32 +88,60 @@ class PowerMonitoringTests(PowerControlTestCase):
         self.wait_for_assert(lambda: self.assertNotIn("MonitorDaemonThread", self.thread_class_names))
 
     def test_pdu_add_remove_spawns_reaps_monitors(self, mocked):
-        self.assertNotIn("PowerDeviceMonitor", self.thread_class_names)
+        self.assertEqual(self.monitor_daemon.device_monitors, {})
 
         pdu = PowerControlDevice.objects.create(device_type=self.fence_type, address="localhost")
         # This normally happens via a post_save signal
         self.power_manager.register_device(pdu.id)
-        self.wait_for_assert(lambda: self.assertIn("PowerDeviceMonitor", self.thread_class_names))
+        self.wait_for_assert(lambda: self.assertIn(pdu.sockaddr, self.monitor_daemon.device_monitors))
 
         pdu.mark_deleted()
         # This normally happens via a post_delete signal
         self.power_manager.unregister_device(pdu.sockaddr)
-        self.wait_for_assert(lambda: self.assertNotIn("PowerDeviceMonitor", self.thread_class_names))
+        self.wait_for_assert(lambda: self.assertEqual(self.monitor_daemon.device_monitors, {}))
 
     def test_pdu_update_respawns_monitors(self, mocked):
         pdu = PowerControlDevice.objects.create(device_type=self.fence_type, address="localhost")
         # This normally happens via a post_save signal
         self.power_manager.register_device(pdu.id)
-        self.wait_for_assert(lambda: self.assertIn("PowerDeviceMonitor", self.thread_class_names))
+        self.wait_for_assert(lambda: self.assertIn(pdu.sockaddr, self.monitor_daemon.device_monitors))
 
-        start_threads = threading.enumerate()
+        start_monitors = dict(self.monitor_daemon.device_monitors)
         pdu.address = "1.2.3.4"
         pdu.username = "bob"
         pdu.save()
         # This normally happens via a post_save signal
         self.power_manager.reregister_device(pdu.id)
 
-        self.wait_for_assert(lambda: self.assertNotEqual(start_threads, threading.enumerate()))
+        self.wait_for_assert(lambda: self.assertNotEqual(start_monitors, self.monitor_daemon.device_monitors))
+
+    def test_monitors_share_workers(self, mocked):
+        for i in range(20):
+            pdu = PowerControlDevice.objects.create(device_type=self.fence_type, address="pdu%s" % i)
+            self.power_manager.register_device(pdu.id)
+        self.wait_for_assert(lambda: self.assertEqual(len(self.monitor_daemon.device_monitors), 20))
+
+        # Monitors are scheduled onto the daemon's workers rather than having a thread each
+        self.assertNotIn("PowerDeviceMonitor", self.thread_class_names)
+
+    def test_failed_monitor_logged(self, mocked):
+        monitor = mock.Mock(spec=PowerDeviceMonitor, busy=True)
+        monitor.run_once.side_effect = RuntimeError("check failed")
+
+        # A daemon of its own, so that the running daemon's workers don't take the monitor
+        daemon = PowerMonitorDaemon(self.power_manager)
+        daemon._work_queue.put(monitor)
+        daemon._work_queue.put(None)
+
+        with mock.patch("chroma_core.services.power_control.monitor_daemon.log") as log:
+            worker = threading.Thread(target=daemon._work)
+            worker.start()
+            worker.join()
+
+        # The monitor is stopped for the daemon to replace, with the reason why in the log
+        self.assertTrue(monitor.stop.called)
+        self.assertFalse(monitor.busy)
+        self.assertIn("check failed", log.error.call_args[0][0])
 
 
 @mock.patch("chroma_core.services.power_control.rpc.PowerControlRpc")
@@ -167,3 +203,128 @@ class MonitorThreadCase(IMLUnitTestCase):
         # Note that the notification goes to the BMC (PowerControlDeviceOutlet
         # instance), not the pseudo-PDU device
         mock_notify.assert_called_with(bmc, False)
+
+
+FAKE_FENCE_AGENT = """#!/bin/sh
+# Stand-in for ipmitool/fence agents: $1 is the operation, $2 the BMC
+sleep %(latency)s
+case "$2" in
+    off-*) exit 2 ;;
+    hang-*) sleep 60 ;;
+esac
+exit 0
+"""
+
+
+@mock.patch("chroma_core.services.power_control.rpc.PowerControlRpc")
+class OutletFanoutTests(IMLUnitTestCase):
+    """Query many slow BMCs through a fake fence agent which sleeps to simulate latency"""
+
+    BMC_COUNT = 64
+    LATENCY = 0.5
+
+    def setUp(self):
+        super(OutletFanoutTests, self).setUp()
+
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        agent = os.path.join(self.tmpdir, "fake_fence_agent")
+        with open(agent, "w") as f:
+            f.write(FAKE_FENCE_AGENT % {"latency": self.LATENCY})
+        os.chmod(agent, 0o755)
+
+        # fence_virsh outlets are not validated as BMC addresses
+        self.fence_type = PowerControlType.objects.create(
+            agent="fence_virsh",
+            max_outlets=0,
+            monitor_template="%s monitor %%(identifier)s" % agent,
+            outlet_query_template="%s status %%(identifier)s" % agent,
+        )
+
+    def _create_device(self, identifiers):
+        device = PowerControlDevice.objects.create(device_type=self.fence_type, address="localhost")
+        for identifier in identifiers:
+            PowerControlDeviceOutlet.objects.create(device=device, identifier=identifier)
+        return device
+
+    def test_query_device_outlets(self, mock_rpc):
+        identifiers = ["bmc-%s" % i for i in range(self.BMC_COUNT - 1)] + ["off-0"]
+        device = self._create_device(identifiers)
+        manager = PowerControlManager()
+
+        running = [0]
+        peak = [0]
+        lock = threading.Lock()
+        shell = manager.executor._shell
+
+        def counting_shell(cmdline):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                return shell(cmdline)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        start = time.time()
+        with patch(manager.executor, _shell=counting_shell):
+            manager.query_device_outlets(device.id)
+        elapsed = time.time() - start
+
+        states = dict(PowerControlDeviceOutlet.objects.filter(device=device).values_list("identifier", "has_power"))
+        self.assertEqual(states, dict((i, i != "off-0") for i in identifiers))
+
+        # Sequentially this would take BMC_COUNT * LATENCY
+        log.info("query_device_outlets of %s BMCs: %.1fs, %s at once" % (self.BMC_COUNT, elapsed, peak[0]))
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], manager.executor.max_workers)
+
+    def test_missing_fence_agent(self, mock_rpc):
+        """A command that can't be run at all fails the query as it did when outlets were queried one by one"""
+        self.fence_type.outlet_query_template = "%s status %%(identifier)s" % os.path.join(self.tmpdir, "missing")
+        self.fence_type.save()
+        device = self._create_device(["bmc-%s" % i for i in range(4)])
+
+        with self.assertRaises(OSError):
+            PowerControlManager().query_device_outlets(device.id)
+
+    def test_check_bmc_availability(self, mock_rpc):
+        device = self._create_device(["bmc-%s" % i for i in range(self.BMC_COUNT)] + ["hang-0"])
+        manager = PowerControlManager()
+        manager.executor = OutletCommandExecutor(manager.executor.max_workers, 2)
+
+        start = time.time()
+        bmc_states = manager.check_bmc_availability(device)
+
+        # The hung BMC is killed at the timeout and reported unavailable
+        self.assertLess(time.time() - start, 10)
+        self.assertEqual(
+            dict((o.identifier, available) for o, available in bmc_states.items()),
+            dict([("bmc-%s" % i, True) for i in range(self.BMC_COUNT)] + [("hang-0", False)]),
+        )
+
+    def test_concurrency_bound(self, mock_rpc):
+        running = [0]
+        peak = [0]
+        lock = threading.Lock()
+
+        def shell(cmdline):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return 0, "", ""
+
+        executor = OutletCommandExecutor(4, 10)
+        with patch(executor, _shell=shell):
+            # Two callers sharing the executor still run at most 4 commands at once
+            callers = [threading.Thread(target=executor.run_all, args=([["true"]] * 20,)) for _ in range(2)]
+            for caller in callers:
+                caller.start()
+            for caller in callers:
+                caller.join()
+
+        self.assertEqual(peak[0], 4)
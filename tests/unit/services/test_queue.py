@@ -0,0 +1,68 @@
+import time
+
+import mock
+from django.test import SimpleTestCase
+from kombu.connection import BrokerConnection
+
+from chroma_core.services.queue import ServiceQueue
+from chroma_core.services.log import log_register
+
+log = log_register("test_queue")
+
+
+class BenchQueue(ServiceQueue):
+    name = "test_queue_bench"
+
+
+class TestServiceQueuePut(SimpleTestCase):
+    """Publish through ServiceQueue using kombu's in-memory transport as a stand-in for RabbitMQ"""
+
+    MESSAGE_COUNT = 2000
+
+    def setUp(self):
+        super(TestServiceQueuePut, self).setUp()
+
+        mock.patch("chroma_core.services.queue._amqp_connection", lambda: BrokerConnection("memory://")).start()
+        self.establish = mock.patch.object(
+            BrokerConnection,
+            "_establish_connection",
+            autospec=True,
+            side_effect=BrokerConnection._establish_connection,
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+        BenchQueue().purge()
+        self.establish.reset_mock()
+
+    def _drain(self):
+        bodies = []
+        with BrokerConnection("memory://") as conn:
+            q = conn.SimpleQueue(
+                BenchQueue.name, serializer="json", exchange_opts={"durable": False}, queue_opts={"durable": False}
+            )
+            while True:
+                try:
+                    message = q.get(block=False)
+                except q.Empty:
+                    break
+                message.ack()
+                bodies.append(message.decode())
+        return bodies
+
+    def test_put(self):
+        start = time.time()
+        for i in range(self.MESSAGE_COUNT):
+            BenchQueue().put({"i": i})
+        elapsed = time.time() - start
+        log.info("ServiceQueue.put: %.0f messages/s" % (self.MESSAGE_COUNT / elapsed))
+
+        # The pooled connection is reused rather than reconnecting for every message
+        self.assertLessEqual(self.establish.call_count, 1)
+
+        self.assertEqual(self._drain(), [{"i": i} for i in range(self.MESSAGE_COUNT)])
+
+    def test_put_many(self):
+        BenchQueue().put_many([{"i": i} for i in range(self.MESSAGE_COUNT)])
+
+        self.assertLessEqual(self.establish.call_count, 1)
+        self.assertEqual(self._drain(), [{"i": i} for i in range(self.MESSAGE_COUNT)])
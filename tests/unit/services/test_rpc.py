@@ -0,0 +1,210 @@
+import Queue
+import heapq
+import threading
+import time
+import uuid
+
+import mock
+from django.test import SimpleTestCase
+
+from chroma_core.services.log import log_register
+from chroma_core.services.rpc import RpcClientResponseHandler, RpcTimeout, RpcWorkerPool, ServiceRpcInterface
+
+log = log_register("test_rpc")
+
+
+class InMemoryTransport(threading.Thread):
+    """Stands in for the AMQP response queue: responses put on `queue` are delivered
+    to the handler's consumer callback from a single thread, as drain_events would."""
+
+    def __init__(self, handler):
+        super(InMemoryTransport, self).__init__()
+        self.handler = handler
+        self.queue = Queue.Queue()
+
+    def run(self):
+        while True:
+            body = self.queue.get()
+            if body is None:
+                return
+            self.handler._on_response(body, mock.Mock())
+
+    def respond(self, request_id, result):
+        self.queue.put({"request_id": request_id, "result": result, "exception": None})
+
+    def stop(self):
+        self.queue.put(None)
+
+
+class TestRpcClientResponseHandler(SimpleTestCase):
+    RPC_COUNT = 10000
+    CALLER_THREADS = 20
+
+    def setUp(self):
+        super(TestRpcClientResponseHandler, self).setUp()
+
+        self.handler = RpcClientResponseHandler("test.responses")
+        self.transport = InMemoryTransport(self.handler)
+        self.transport.start()
+
+    def tearDown(self):
+        self.transport.stop()
+        self.transport.join()
+
+        super(TestRpcClientResponseHandler, self).tearDown()
+
+    def test_concurrent_rpcs(self):
+        """Fire RPC_COUNT RPCs from concurrent callers, check every caller gets its own response"""
+        errors = []
+
+        def caller(count):
+            for i in range(count):
+                request_id = str(uuid.uuid4())
+                self.handler.start_wait(request_id, 300)
+                self.transport.respond(request_id, request_id)
+                result = self.handler.complete_wait(request_id)
+                if result["result"] != request_id:
+                    errors.append((request_id, result))
+
+        threads = [
+            threading.Thread(target=caller, args=(self.RPC_COUNT / self.CALLER_THREADS,))
+            for _ in range(self.CALLER_THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.handler._response_states, {})
+
+    def test_ageing_touches_only_expired(self):
+        for i in range(self.RPC_COUNT):
+            self.handler.start_wait("pending-%s" % i, 300)
+        for i in range(10):
+            self.handler.start_wait("expiring-%s" % i, 0)
+
+        time.sleep(0.01)
+
+        rpc_heapq = mock.patch("chroma_core.services.rpc.heapq", wraps=heapq).start()
+        self.addCleanup(mock.patch.stopall)
+
+        start = time.time()
+        self.handler._age_response_states()
+        log.info("Ageing %s RPCs: %.3fs" % (self.RPC_COUNT, time.time() - start))
+
+        # Only the expired deadlines were taken off the heap
+        self.assertEqual(rpc_heapq.heappop.call_count, 10)
+
+        for i in range(10):
+            self.assertRaises(RpcTimeout, self.handler.complete_wait, "expiring-%s" % i)
+
+        self.assertEqual(len(self.handler._response_states), self.RPC_COUNT)
+        self.assertFalse(any(state.complete.is_set() for state in self.handler._response_states.values()))
+
+        # Ageing many times with nothing expired only looks at the earliest deadline
+        rpc_heapq.reset_mock()
+        start = time.time()
+        for i in range(1000):
+            self.handler._age_response_states()
+        log.info("Ageing %s RPCs 1000 times: %.3fs" % (self.RPC_COUNT, time.time() - start))
+
+        self.assertEqual(rpc_heapq.heappop.call_count, 0)
+        self.assertEqual(rpc_heapq.heapify.call_count, 0)
+
+    def test_completed_deadlines_compacted(self):
+        for i in range(100):
+            request_id = "request-%s" % i
+            self.handler.start_wait(request_id, 300)
+            self.transport.respond(request_id, None)
+            self.handler.complete_wait(request_id)
+
+        self.handler._age_response_states()
+        self.assertEqual(self.handler._deadlines, [])
+
+
+class Echo(object):
+    def __init__(self):
+        self.release = threading.Event()
+
+    def echo(self, value):
+        return value
+
+    def block(self):
+        self.release.wait()
+
+
+class EchoRpc(ServiceRpcInterface):
+    methods = ["echo", "block"]
+
+
+class TestRpcWorkerPool(SimpleTestCase):
+    def setUp(self):
+        super(TestRpcWorkerPool, self).setUp()
+
+        self.responses = Queue.Queue()
+        mock.patch(
+            "chroma_core.services.rpc._send_response",
+            side_effect=lambda pool, body, result: self.responses.put(result),
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.echo = Echo()
+
+    def _request(self, method, *args):
+        return {
+            "request_id": str(uuid.uuid4()),
+            "method": method,
+            "args": args,
+            "kwargs": {},
+            "response_routing_key": "test.responses",
+        }
+
+    def test_results(self):
+        pool = RpcWorkerPool(EchoRpc(self.echo), 4, 16, None)
+        try:
+            requests = [self._request("echo", i) for i in range(1000)]
+            for request in requests:
+                pool.submit(request)
+
+            results = dict((r["request_id"], r["result"]) for r in [self.responses.get() for _ in requests])
+            self.assertEqual(results, dict((r["request_id"], r["args"][0]) for r in requests))
+
+            histogram = dict(pool.latency_histograms()["echo"])
+            self.assertEqual(sum(histogram.values()), 1000)
+        finally:
+            pool.stop()
+
+    def test_exception(self):
+        pool = RpcWorkerPool(EchoRpc(self.echo), 1, 1, None)
+        try:
+            pool.submit(self._request("echo"))
+            result = self.responses.get()
+            self.assertEqual(result["exception_type"], "TypeError")
+
+            # The worker survives to handle the next request
+            pool.submit(self._request("echo", "again"))
+            self.assertEqual(self.responses.get()["result"], "again")
+        finally:
+            pool.stop()
+
+    def test_back_pressure(self):
+        pool = RpcWorkerPool(EchoRpc(self.echo), 1, 1, None)
+        try:
+            # One request occupies the worker and one fills the queue...
+            pool.submit(self._request("block"))
+            pool.submit(self._request("echo", 1))
+
+            # ...so the next submit blocks until the worker is released
+            submitted = threading.Event()
+            submitter = threading.Thread(target=lambda: (pool.submit(self._request("echo", 2)), submitted.set()))
+            submitter.start()
+            self.assertFalse(submitted.wait(0.5))
+
+            self.echo.release.set()
+            self.assertTrue(submitted.wait(5))
+            submitter.join()
+            self.assertEqual(sorted(self.responses.get()["result"] for _ in range(3)), [None, 1, 2])
+        finally:
+            self.echo.release.set()
+            pool.stop()